@@ -0,0 +1,15 @@
+"""Large-file throughput and page cache footprint with and without --bulk-io."""
+import platform
+import tempfile
+from pathlib import Path
+
+from common import parse_args, report
+
+from encryptor.core.benchmark import BULK_SIZE, QUICK_BULK_SIZE, bench_bulk_io
+
+if __name__ == '__main__':
+    args = parse_args(__doc__)
+    # Under the current directory: /tmp is often tmpfs, which is all page cache
+    with tempfile.TemporaryDirectory(dir='.') as scratch:
+        results = bench_bulk_io(Path(scratch), QUICK_BULK_SIZE if args.quick else BULK_SIZE)
+    report({'python': platform.python_version(), 'results': results}, args)
@@ -0,0 +1,18 @@
+"""In-memory CryptoManager throughput for every cipher suite, chunk size and small records."""
+import platform
+
+from common import parse_args, report
+
+from encryptor.core.benchmark import DEFAULT_CHUNK_SIZES, bench_crypto, bench_records
+from encryptor.core.ciphers import SUITES
+
+if __name__ == '__main__':
+    args = parse_args(__doc__)
+    results = bench_crypto(
+        SUITES, DEFAULT_CHUNK_SIZES,
+        total_bytes=(8 if args.quick else 64) * 1024 * 1024,
+        repeat=1 if args.quick else 3,
+    )
+    results += bench_records(SUITES, count=10_000 if args.quick else 100_000,
+                             repeat=1 if args.quick else 3)
+    report({'python': platform.python_version(), 'results': results}, args)
@@ -0,0 +1,17 @@
+"""FileOperations throughput for many tiny files and a few huge ones."""
+import platform
+import tempfile
+from pathlib import Path
+
+from common import parse_args, report
+
+from encryptor.core.benchmark import DEFAULT_CHUNK_SIZES, PROFILES, QUICK_PROFILES, bench_files
+from encryptor.core.ciphers import SUITES
+
+if __name__ == '__main__':
+    args = parse_args(__doc__)
+    with tempfile.TemporaryDirectory() as scratch:
+        # None benchmarks adaptive chunk sizing
+        results = bench_files(Path(scratch), SUITES, list(DEFAULT_CHUNK_SIZES) + [None],
+                              QUICK_PROFILES if args.quick else PROFILES)
+    report({'python': platform.python_version(), 'results': results}, args)
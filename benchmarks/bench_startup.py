@@ -0,0 +1,114 @@
+"""CLI start-up latency, and which heavy modules each command imports.
+
+Every command runs in a fresh interpreter. A run fails (exit code 1) when a
+command imports a module listed in FORBIDDEN, or, with --baseline, when its
+median start-up time grows by more than --threshold.
+"""
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+
+# Modules a command must not load
+FORBIDDEN = {
+    'import': ('PyQt5', 'tqdm', 'sqlite3'),
+    '--help': ('PyQt5', 'tqdm', 'sqlite3'),
+    'generate-key': ('PyQt5', 'tqdm', 'sqlite3'),
+    'encrypt': ('PyQt5', 'sqlite3'),
+}
+WATCHED = ('PyQt5', 'tqdm', 'sqlite3', 'cryptography', 'concurrent.futures', 'mmap')
+
+_RUNNER = """
+import json, sys
+argv, watched = json.loads(sys.argv[1]), json.loads(sys.argv[2])
+sys.argv = ['file-encryptor'] + argv
+try:
+    from encryptor.cli.app import main
+    if argv:
+        main()
+except SystemExit:
+    pass
+finally:
+    print(json.dumps([name for name in watched if name in sys.modules]), file=sys.stderr)
+"""
+
+
+def _commands(scratch: Path) -> dict:
+    (scratch / 'plain.txt').write_text('hello')
+    return {
+        'import': [],
+        '--help': ['--help'],
+        'generate-key': ['generate-key', '-o', str(scratch / 'bench.key')],
+        'encrypt': ['encrypt', str(scratch / 'plain.txt'), '-o', str(scratch / 'out'),
+                    '-k', str(scratch / 'bench.key')],
+    }
+
+
+def run_command(argv: list) -> tuple:
+    """Run the CLI once; return (seconds, watched modules that were imported)."""
+    env = dict(os.environ, PYTHONPATH=str(ROOT))
+    start = time.perf_counter()
+    process = subprocess.run([sys.executable, '-c', _RUNNER, json.dumps(argv), json.dumps(WATCHED)],
+                             capture_output=True, text=True, env=env)
+    seconds = time.perf_counter() - start
+    return seconds, json.loads(process.stderr.strip().splitlines()[-1])
+
+
+def bench_startup(repeat: int) -> list:
+    results = []
+    with tempfile.TemporaryDirectory() as scratch:
+        for name, argv in _commands(Path(scratch)).items():
+            times, modules = [], []
+            for _ in range(repeat):
+                seconds, modules = run_command(argv)
+                times.append(seconds)
+            results.append({
+                'name': f"startup/{name}",
+                'seconds': statistics.median(times),
+                'modules': modules,
+                'forbidden': [module for module in modules if module in FORBIDDEN[name]],
+            })
+    return results
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--quick', action='store_true', help='Fewer repetitions')
+    parser.add_argument('-o', '--output', help='Write results as JSON to this file')
+    parser.add_argument('--baseline', help='Baseline JSON results to compare against')
+    parser.add_argument('--threshold', type=float, default=0.25,
+                        help='Allowed start-up time increase before failing (fraction)')
+    args = parser.parse_args()
+
+    results = {'python': platform.python_version(),
+               'results': bench_startup(3 if args.quick else 15)}
+    text = json.dumps(results, indent=2)
+    if args.output:
+        Path(args.output).write_text(text)
+    else:
+        print(text)
+
+    failed = False
+    for result in results['results']:
+        if result['forbidden']:
+            print(f"FORBIDDEN {result['name']} imported {', '.join(result['forbidden'])}",
+                  file=sys.stderr)
+            failed = True
+    if args.baseline:
+        baseline = {result['name']: result
+                    for result in json.loads(Path(args.baseline).read_text())['results']}
+        for result in results['results']:
+            reference = baseline.get(result['name'])
+            if reference and result['seconds'] > reference['seconds'] * (1 + args.threshold):
+                change = result['seconds'] / reference['seconds'] - 1
+                print(f"REGRESSION {result['name']}: {change:+.0%}", file=sys.stderr)
+                failed = True
+    sys.exit(1 if failed else 0)
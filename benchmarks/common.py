@@ -0,0 +1,35 @@
+"""Shared command-line handling for the benchmark scripts."""
+import argparse
+import json
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from encryptor.core.benchmark import DEFAULT_THRESHOLD, compare_results, load_results  # noqa: E402
+
+
+def parse_args(description: str) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=description)
+    parser.add_argument('--quick', action='store_true', help='Use small workloads')
+    parser.add_argument('-o', '--output', help='Write results as JSON to this file')
+    parser.add_argument('--baseline', help='Baseline JSON results to compare against')
+    parser.add_argument('--threshold', type=float, default=DEFAULT_THRESHOLD,
+                        help='Allowed throughput drop before failing (fraction)')
+    return parser.parse_args()
+
+
+def report(results: dict, args: argparse.Namespace) -> None:
+    """Print results, optionally save them, and exit 1 on regressions."""
+    text = json.dumps(results, indent=2)
+    if args.output:
+        Path(args.output).write_text(text)
+    else:
+        print(text)
+
+    if args.baseline:
+        regressions = compare_results(results, load_results(args.baseline), args.threshold)
+        for regression in regressions:
+            print(f"REGRESSION {regression['name']}: {regression['change']:+.0%}", file=sys.stderr)
+        if regressions:
+            sys.exit(1)
@@ -1,5 +1,14 @@
-from .cli.app import main as cli_main
-from .gui.main_window import run_gui as gui_main
-
 __version__ = "1.0.0"
-__all__ = ['cli_main', 'gui_main']
\ No newline at end of file
+__all__ = ['cli_main', 'gui_main']
+
+
+def __getattr__(name):
+    # Entry points are imported on first use so that importing the package
+    # (or running the CLI) never loads PyQt5
+    if name == 'cli_main':
+        from .cli.app import main
+        return main
+    if name == 'gui_main':
+        from .gui.main_window import run_gui
+        return run_gui
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
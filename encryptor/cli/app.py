@@ -2,14 +2,92 @@ import argparse
 from pathlib import Path
 import sys
 import os
-from typing import Optional
+import json
+from contextlib import contextmanager
+from typing import TYPE_CHECKING, Optional
+from ..core.ciphers import DEFAULT_CIPHER, SUITES
 from ..core.crypto import CryptoManager
-from ..core.file_ops import FileOperations
+from ..core.pipeline import EXECUTORS
+from ..core.streams import IO_MODES
 import logging
 from getpass import getpass
 
+# Heavier modules (tqdm, the file pipeline, benchmarks, the manifest) are
+# imported by the commands that use them, so scripts calling e.g.
+# generate-key thousands of times don't pay for them on every start.
+if TYPE_CHECKING:
+    from ..core.batch import RunSummary
+    from ..core.metrics import Metrics
+    from ..core.shard import Sharder
+
 logger = logging.getLogger(__name__)
 
+# Commands whose files share one chunk worker pool (--executor, --jobs)
+POOLED_COMMANDS = ('encrypt', 'decrypt', 'verify', 'rekey', 'watch')
+
+# Spelled out so the codecs are only imported when --compress is used
+COMPRESSION_CHOICES = ('auto', 'zstd', 'zlib', 'lzma')
+
+_SIZE_UNITS = {'': 1, 'k': 1024, 'm': 1024 ** 2, 'g': 1024 ** 3}
+
+
+def parse_size(value: str) -> int:
+    """Parse a byte size such as '512', '256K', '4M' or '1G'."""
+    value = value.strip().lower()
+    number, unit = value.rstrip('kmgib'), value[len(value.rstrip('kmgib')):]
+    unit = unit.replace('ib', '').replace('b', '')
+    if not number.isdigit() or unit not in _SIZE_UNITS:
+        raise argparse.ArgumentTypeError(f"invalid size {value!r}")
+    return int(number) * _SIZE_UNITS[unit]
+
+
+def parse_chunk_size(value: str) -> Optional[int]:
+    """Parse a --chunk-size value such as '256K', '4M' or 'auto' (None)."""
+    if value.strip().lower() == 'auto':
+        return None
+    size = parse_size(value)
+    if size == 0:
+        raise argparse.ArgumentTypeError(f"invalid chunk size {value!r}")
+    return size
+
+
+def _add_scan_arguments(parser: argparse.ArgumentParser) -> None:
+    """Options selecting which files inside directories are processed."""
+    parser.add_argument('--include', action='append', metavar='GLOB',
+                        help='Only process files matching this pattern (repeatable)')
+    parser.add_argument('--exclude', action='append', metavar='GLOB',
+                        help='Skip files and directories matching this pattern (repeatable)')
+    parser.add_argument('--min-size', type=parse_size, help='Skip files smaller than this, e.g. 1K')
+    parser.add_argument('--max-size', type=parse_size, help='Skip files larger than this, e.g. 2G')
+
+def _add_report_arguments(parser: argparse.ArgumentParser) -> None:
+    """Options controlling progress output and metrics."""
+    parser.add_argument('-q', '--quiet', action='store_true',
+                        help='No progress bar or summary (errors are still reported)')
+    parser.add_argument('--metrics-jsonl', metavar='PATH',
+                        help="Append JSON-lines events (one per file, then a summary) "
+                             "to PATH ('-' for stderr)")
+    parser.add_argument('--metrics-prom', metavar='PATH',
+                        help='Keep a Prometheus text-format metrics file at PATH')
+
+def _add_bulk_io_argument(parser: argparse.ArgumentParser) -> None:
+    parser.add_argument('--bulk-io', action='store_true',
+                        help="Keep inputs and outputs out of the page cache (Linux), so a large "
+                             "run does not evict other programs' data; combine with "
+                             "--io-mode direct to read inputs with O_DIRECT")
+
+
+def _add_shard_arguments(parser: argparse.ArgumentParser) -> None:
+    """Options splitting one run over several machines."""
+    parser.add_argument('--shard', metavar='K/N',
+                        help='Process only shard K of N (1 to N); files are split by a hash '
+                             'of their path, or by --plan')
+    parser.add_argument('--plan', metavar='FILE',
+                        help='Shard plan from the plan command, balancing bytes per shard')
+    parser.add_argument('--shard-summary', metavar='PATH',
+                        help="Write this run's totals as JSON, for the merge command")
+
+
 class FileEncryptorCLI:
     """Command-line interface for file encryption/decryption."""
     
@@ -27,26 +105,233 @@ class FileEncryptorCLI:
         
         # Encrypt command
         encrypt_parser = subparsers.add_parser('encrypt', help='Encrypt files')
-        encrypt_parser.add_argument('paths', nargs='+', help='Files or directories to encrypt')
+        encrypt_parser.add_argument('paths', nargs='+',
+                                  help="Files or directories to encrypt ('-' for stdin to stdout)")
         encrypt_parser.add_argument('-o', '--output', help='Output directory', default='encrypted')
         encrypt_parser.add_argument('-k', '--key', help='Encryption key file')
         encrypt_parser.add_argument('-r', '--recursive', action='store_true', 
                                   help='Process directories recursively')
         encrypt_parser.add_argument('--ext', help='File extensions to process (comma-separated)')
+        encrypt_parser.add_argument('--cipher', choices=sorted(SUITES), default=DEFAULT_CIPHER,
+                                  help='Cipher suite for new files (decryption detects it)')
+        encrypt_parser.add_argument('--no-envelope', action='store_true',
+                                  help='Encrypt directly under the key file, without per-file '
+                                       'data keys (readable by older versions, but rekeying '
+                                       'then re-encrypts every file)')
+        encrypt_parser.add_argument('--chunk-size', type=parse_chunk_size, default='auto',
+                                  help="Plaintext chunk size, e.g. 256K or 4M; 'auto' tunes it "
+                                       "per file (decryption never needs it)")
+        encrypt_parser.add_argument('-j', '--jobs', type=int, default=0,
+                                  help='Chunks to encrypt in parallel (0 = one per CPU core)')
+        encrypt_parser.add_argument('--executor', choices=EXECUTORS, default='thread',
+                                  help='Worker pool used for parallel chunks')
+        encrypt_parser.add_argument('-w', '--workers', type=int, default=0,
+                                  help='Files to process concurrently (0 = one per CPU core)')
+        encrypt_parser.add_argument('--io-mode', choices=IO_MODES, default='auto',
+                                  help='How input files are read (auto = readinto for regular files; '
+                                       'mmap only for inputs nothing modifies)')
+        encrypt_parser.add_argument('--incremental', action='store_true',
+                                  help='Skip files unchanged since the last run into this output '
+                                       'directory (tracked in a manifest there)')
+        encrypt_parser.add_argument('--prune', action='store_true',
+                                  help='With --incremental, delete outputs whose source was removed')
+        encrypt_parser.add_argument('--bundle', metavar='ARCHIVE',
+                                  help='Pack every input file into the single encrypted bundle '
+                                       'ARCHIVE (with an encrypted table of contents) instead '
+                                       'of writing one .enc file per input')
+        encrypt_parser.add_argument('--resume', action='store_true',
+                                  help='Continue an interrupted run: skip finished files and '
+                                       'resume partial ones from their last checkpoint')
+        encrypt_parser.add_argument('--compress', nargs='?', const='auto', metavar='CODEC',
+                                  choices=COMPRESSION_CHOICES,
+                                  help='Compress chunks before encrypting (zstd, zlib or lzma; '
+                                       'default zstd if installed, else zlib). Data that does '
+                                       'not compress is stored as is')
+        encrypt_parser.add_argument('--store', metavar='DIR',
+                                  help='Deduplicate into the chunk store DIR (created if '
+                                       'needed): each unique chunk is stored once and every '
+                                       'output is a small encrypted recipe')
+        _add_bulk_io_argument(encrypt_parser)
+        _add_scan_arguments(encrypt_parser)
+        _add_shard_arguments(encrypt_parser)
+        _add_report_arguments(encrypt_parser)
         
         # Decrypt command
         decrypt_parser = subparsers.add_parser('decrypt', help='Decrypt files')
-        decrypt_parser.add_argument('paths', nargs='+', help='Files or directories to decrypt')
+        decrypt_parser.add_argument('paths', nargs='+',
+                                  help="Files or directories to decrypt ('-' for stdin to stdout)")
         decrypt_parser.add_argument('-o', '--output', help='Output directory', default='decrypted')
         decrypt_parser.add_argument('-k', '--key', help='Encryption key file (required)')
         decrypt_parser.add_argument('-r', '--recursive', action='store_true', 
                                   help='Process directories recursively')
         decrypt_parser.add_argument('--ext', help='File extensions to process (comma-separated)')
+        decrypt_parser.add_argument('-j', '--jobs', type=int, default=0,
+                                  help='Chunks to decrypt in parallel (0 = one per CPU core)')
+        decrypt_parser.add_argument('--executor', choices=EXECUTORS, default='thread',
+                                  help='Worker pool used for parallel chunks')
+        decrypt_parser.add_argument('-w', '--workers', type=int, default=0,
+                                  help='Files to process concurrently (0 = one per CPU core)')
+        decrypt_parser.add_argument('--io-mode', choices=IO_MODES, default='auto',
+                                  help='How input files are read (auto = readinto for regular files; '
+                                       'mmap only for inputs nothing modifies)')
+        decrypt_parser.add_argument('--list', action='store_true',
+                                  help='List the files in a bundle instead of extracting them')
+        decrypt_parser.add_argument('--extract', action='append', metavar='NAME',
+                                  help='Extract only this file from a bundle (repeatable)')
+        decrypt_parser.add_argument('--resume', action='store_true',
+                                  help='Continue an interrupted run: skip finished files and '
+                                       'resume partial ones from their last checkpoint')
+        decrypt_parser.add_argument('--store', metavar='DIR',
+                                  help='Chunk store the recipes were written to (encrypt --store)')
+        _add_bulk_io_argument(decrypt_parser)
+        _add_scan_arguments(decrypt_parser)
+        _add_shard_arguments(decrypt_parser)
+        _add_report_arguments(decrypt_parser)
+        
+        # Verify command
+        verify_parser = subparsers.add_parser(
+            'verify', help='Check encrypted files for corruption without decrypting them to disk'
+        )
+        verify_parser.add_argument('paths', nargs='+', help='Files or directories to verify')
+        verify_parser.add_argument('-k', '--key', help='Encryption key file (required)')
+        verify_parser.add_argument('-r', '--recursive', action='store_true',
+                                  help='Process directories recursively')
+        verify_parser.add_argument('--ext', help='File extensions to process (comma-separated)')
+        verify_parser.add_argument('-j', '--jobs', type=int, default=0,
+                                  help='Chunks to verify in parallel (0 = one per CPU core)')
+        verify_parser.add_argument('--executor', choices=EXECUTORS, default='thread',
+                                  help='Worker pool used for parallel chunks')
+        verify_parser.add_argument('-w', '--workers', type=int, default=0,
+                                  help='Files to verify concurrently (0 = one per CPU core)')
+        verify_parser.add_argument('--io-mode', choices=IO_MODES, default='auto',
+                                  help='How input files are read (auto = readinto for regular files; '
+                                       'mmap only for inputs nothing modifies)')
+        verify_parser.add_argument('--report', metavar='PATH',
+                                  help="Write a JSON report of every file to PATH ('-' for stdout)")
+        _add_scan_arguments(verify_parser)
+        _add_shard_arguments(verify_parser)
+        _add_report_arguments(verify_parser)
+        
+        # Rekey command
+        rekey_parser = subparsers.add_parser(
+            'rekey', help='Move encrypted files to a new key without writing plaintext'
+        )
+        rekey_parser.add_argument('paths', nargs='+', help='Files or directories to rekey (in place)')
+        rekey_parser.add_argument('--old-key', required=True, help='Current key file')
+        rekey_parser.add_argument('--new-key', required=True, help='New key file')
+        rekey_parser.add_argument('-r', '--recursive', action='store_true',
+                                  help='Process directories recursively')
+        rekey_parser.add_argument('--ext', help='File extensions to process (comma-separated)')
+        rekey_parser.add_argument('--full', action='store_true',
+                                  help='Re-encrypt all data under new data keys instead of only '
+                                       'rewrapping them (use if the old key may have leaked)')
+        rekey_parser.add_argument('--cipher', choices=sorted(SUITES), default=DEFAULT_CIPHER,
+                                  help='Cipher suite for files that are re-encrypted')
+        rekey_parser.add_argument('--no-envelope', action='store_true',
+                                  help='Re-encrypt files directly under the new key, without '
+                                       'per-file data keys (readable by older versions)')
+        rekey_parser.add_argument('--store', metavar='DIR',
+                                  help='Chunk store the recipes being rekeyed belong to; its data '
+                                       'key is rewrapped too (recipes are refused without it)')
+        rekey_parser.add_argument('-j', '--jobs', type=int, default=0,
+                                  help='Chunks to re-encrypt in parallel (0 = one per CPU core)')
+        rekey_parser.add_argument('--executor', choices=EXECUTORS, default='thread',
+                                  help='Worker pool used for parallel chunks')
+        rekey_parser.add_argument('-w', '--workers', type=int, default=0,
+                                  help='Files to process concurrently (0 = one per CPU core)')
+        rekey_parser.add_argument('--io-mode', choices=IO_MODES, default='auto',
+                                  help='How input files are read (auto = readinto for regular files; '
+                                       'mmap only for inputs nothing modifies)')
+        _add_scan_arguments(rekey_parser)
+        _add_report_arguments(rekey_parser)
+        
+        # Watch command
+        watch_parser = subparsers.add_parser(
+            'watch', help='Keep running and encrypt files as they appear in directories'
+        )
+        watch_parser.add_argument('paths', nargs='+', help='Directories to watch')
+        watch_parser.add_argument('-o', '--output', help='Output directory', default='encrypted')
+        watch_parser.add_argument('-k', '--key', required=True, help='Encryption key file')
+        watch_parser.add_argument('-r', '--recursive', action='store_true',
+                                  help='Watch subdirectories too')
+        watch_parser.add_argument('--ext', help='File extensions to process (comma-separated)')
+        watch_parser.add_argument('--cipher', choices=sorted(SUITES), default=DEFAULT_CIPHER,
+                                  help='Cipher suite for new files (decryption detects it)')
+        watch_parser.add_argument('--no-envelope', action='store_true',
+                                  help='Encrypt directly under the key file, without per-file '
+                                       'data keys')
+        watch_parser.add_argument('--chunk-size', type=parse_chunk_size, default='auto',
+                                  help="Plaintext chunk size, e.g. 256K or 4M; 'auto' tunes it "
+                                       "per file")
+        watch_parser.add_argument('--compress', nargs='?', const='auto', metavar='CODEC',
+                                  choices=COMPRESSION_CHOICES,
+                                  help='Compress chunks before encrypting (zstd, zlib or lzma)')
+        watch_parser.add_argument('-j', '--jobs', type=int, default=0,
+                                  help='Chunks to encrypt in parallel (0 = one per CPU core)')
+        watch_parser.add_argument('--executor', choices=EXECUTORS, default='thread',
+                                  help='Worker pool used for parallel chunks')
+        watch_parser.add_argument('-w', '--workers', type=int, default=0,
+                                  help='Files to process concurrently (0 = one per CPU core)')
+        watch_parser.add_argument('--io-mode', choices=IO_MODES, default='auto',
+                                  help='How input files are read (auto = readinto for regular files; '
+                                       'mmap only for inputs nothing modifies)')
+        watch_parser.add_argument('--settle', type=float, default=2.0, metavar='SECONDS',
+                                  help='Wait until a file has not changed for this long '
+                                       'before encrypting it')
+        watch_parser.add_argument('--poll', nargs='?', type=float, const=5.0, metavar='SECONDS',
+                                  help='Rescan the directories every SECONDS instead of using '
+                                       'filesystem events (automatic without watchdog)')
+        _add_scan_arguments(watch_parser)
+        _add_report_arguments(watch_parser)
+        
+        # Plan command
+        plan_parser = subparsers.add_parser(
+            'plan', help='Split files into size-balanced shards for --shard/--plan'
+        )
+        plan_parser.add_argument('paths', nargs='+',
+                                 help='Files or directories, as they will be given to each node')
+        plan_parser.add_argument('-n', '--shards', type=int, required=True,
+                                 help='Number of shards (nodes)')
+        plan_parser.add_argument('-o', '--output', required=True, help='Plan file to write')
+        plan_parser.add_argument('-r', '--recursive', action='store_true',
+                                 help='Process directories recursively')
+        plan_parser.add_argument('--ext', help='File extensions to process (comma-separated)')
+        _add_scan_arguments(plan_parser)
+        
+        # Merge command
+        merge_parser = subparsers.add_parser(
+            'merge', help='Combine the --shard-summary files of a sharded run'
+        )
+        merge_parser.add_argument('summaries', nargs='+', help='Per-shard summary files')
+        merge_parser.add_argument('-o', '--output', help='Write the merged summary as JSON')
+        
+        # Store statistics command
+        store_parser = subparsers.add_parser(
+            'store-stats', help='Show the deduplication statistics of a chunk store'
+        )
+        store_parser.add_argument('store', help='Chunk store directory')
+        store_parser.add_argument('--json', action='store_true', help='Print the statistics as JSON')
         
         # Key generation command
         key_parser = subparsers.add_parser('generate-key', help='Generate a new encryption key')
         key_parser.add_argument('-o', '--output', help='Output key file', default='encryption.key')
         
+        # Benchmark command
+        bench_parser = subparsers.add_parser('bench', help='Measure encryption throughput')
+        bench_parser.add_argument('--quick', action='store_true',
+                                  help='Use small workloads (smoke test)')
+        bench_parser.add_argument('--cipher', action='append', choices=sorted(SUITES),
+                                  help='Cipher suite to benchmark (repeatable, default all)')
+        bench_parser.add_argument('--chunk-size', action='append', type=int,
+                                  help='Chunk size in bytes (repeatable)')
+        bench_parser.add_argument('-j', '--jobs', type=int, default=0,
+                                  help='Workers for file benchmarks (0 = one per CPU core)')
+        bench_parser.add_argument('-o', '--output', help='Write results as JSON to this file')
+        bench_parser.add_argument('--baseline', help='Baseline JSON results to compare against')
+        bench_parser.add_argument('--threshold', type=float,
+                                  help='Allowed throughput drop before failing '
+                                       '(fraction, default 0.10)')
+        
         return parser
     
     def run(self):
@@ -54,16 +339,46 @@ class FileEncryptorCLI:
         args = self.parser.parse_args()
         
         try:
-            if args.command == 'generate-key':
-                self._generate_key(args)
-            elif args.command == 'encrypt':
-                self._encrypt(args)
-            elif args.command == 'decrypt':
-                self._decrypt(args)
+            with self._worker_pool(args):
+                self._dispatch(args)
         except Exception as e:
             logger.error(f"Error: {str(e)}")
             sys.exit(1)
     
+    @contextmanager
+    def _worker_pool(self, args):
+        """Share one chunk worker pool between all the files of a run."""
+        if args.command not in POOLED_COMMANDS:
+            yield
+            return
+        from ..core.pipeline import worker_pool
+        with worker_pool(args.executor, args.jobs) as pool:
+            args.executor = pool
+            yield
+    
+    def _dispatch(self, args):
+        """Execute the command selected by ``args``."""
+        if args.command == 'generate-key':
+            self._generate_key(args)
+        elif args.command == 'encrypt':
+            self._encrypt(args)
+        elif args.command == 'decrypt':
+            self._decrypt(args)
+        elif args.command == 'verify':
+            self._verify(args)
+        elif args.command == 'rekey':
+            self._rekey(args)
+        elif args.command == 'watch':
+            self._watch(args)
+        elif args.command == 'plan':
+            self._plan(args)
+        elif args.command == 'merge':
+            self._merge(args)
+        elif args.command == 'store-stats':
+            self._store_stats(args)
+        elif args.command == 'bench':
+            self._bench(args)
+    
     def _generate_key(self, args):
         """Handle key generation command."""
         crypto = CryptoManager()
@@ -73,86 +388,554 @@ class FileEncryptorCLI:
     
     def _encrypt(self, args):
         """Handle encryption command."""
+        from ..core.file_ops import FileOperations
+        
+        if args.compress is not None:
+            from ..core.compression import DEFAULT_CODEC, get_codec
+            args.compress = DEFAULT_CODEC if args.compress == 'auto' else args.compress
+            get_codec(args.compress)
+        
+        if self._is_pipe(args):
+            if not args.key:
+                raise ValueError("Encrypting stdin requires a key file. Use -k/--key option.")
+            if args.incremental or args.resume or args.bundle or args.shard or args.store:
+                raise ValueError("--incremental, --resume, --bundle, --shard and --store "
+                                 "cannot be used with stdin")
+            crypto = CryptoManager.load_key(args.key, args.cipher, not args.no_envelope)
+            size = self._process_stream(args, crypto, 'encrypt')
+            if not args.quiet:
+                print(f"Encryption complete. {size} bytes", file=sys.stderr)
+            return
+        
         # Load or create key
+        if args.shard and not args.key:
+            raise ValueError("Sharded runs need a key file shared by every node. "
+                             "Use -k/--key option.")
+        if args.store and not args.key:
+            raise ValueError("A chunk store needs the same key file on every run. "
+                             "Use -k/--key option.")
         if args.key:
-            crypto = CryptoManager.load_key(args.key)
+            crypto = CryptoManager.load_key(args.key, args.cipher, not args.no_envelope)
         else:
-            crypto = CryptoManager()
+            crypto = CryptoManager(cipher=args.cipher, envelope=not args.no_envelope)
             key_path = Path(args.output) / 'encryption.key'
             crypto.save_key(key_path)
             print(f"New key generated and saved to {key_path}")
         
         # Process files
         extensions = args.ext.split(',') if args.ext else None
-        processed_files = 0
-        
-        for path in args.paths:
-            path = Path(path)
-            if path.is_file():
-                self._process_single_file(path, args.output, crypto.encrypt_data, '.enc')
-                processed_files += 1
-            elif path.is_dir():
-                processed_files += self._process_directory(
-                    path, args.output, crypto.encrypt_data, '.enc', 
-                    args.recursive, extensions
-                )
-        
-        print(f"\nEncryption complete. {processed_files} files processed.")
+        
+        if args.bundle:
+            if args.incremental or args.resume or args.shard or args.store:
+                raise ValueError("--incremental, --resume, --shard and --store cannot be "
+                                 "used with --bundle")
+            self._create_bundle(args, crypto, extensions)
+            if not args.key:
+                print(f"IMPORTANT: Your encryption key is at {key_path}")
+            return
+        
+        if args.store:
+            if args.incremental:
+                raise ValueError("--incremental cannot be used with --store")
+            self._encrypt_to_store(args, crypto, extensions)
+            return
+        
+        manifest = None
+        if args.incremental:
+            from ..core.manifest import Manifest, new_hasher
+            manifest = Manifest.for_output(args.output, crypto.key, {
+                'cipher': args.cipher, 'compression': args.compress,
+                'chunk_size': args.chunk_size, 'envelope': not args.no_envelope,
+            })
+        metrics = self._open_metrics(args, 'encrypt')
+        
+        def encrypt_file(input_path, output_path, jobs):
+            if args.resume and self._completed(input_path, output_path):
+                return False
+            if manifest is None:
+                FileOperations.encrypt_file(input_path, output_path, crypto, args.chunk_size,
+                                            jobs=jobs, executor=args.executor, progress=False,
+                                            io_mode=args.io_mode, compression=args.compress,
+                                            resume=args.resume, metrics=metrics,
+                                            bulk_io=args.bulk_io)
+                return True
+            if manifest.is_current(input_path, output_path):
+                return False
+            source_stat = Path(input_path).stat()
+            source_hash, output_hash = new_hasher(), new_hasher()
+            FileOperations.encrypt_file(input_path, output_path, crypto, args.chunk_size,
+                                        jobs=jobs, executor=args.executor, progress=False,
+                                        io_mode=args.io_mode, source_hasher=source_hash,
+                                        output_hasher=output_hash, compression=args.compress,
+                                        resume=args.resume, metrics=metrics,
+                                        bulk_io=args.bulk_io)
+            manifest.record(input_path, output_path, source_hash.hexdigest(),
+                            output_hash.hexdigest(), source_stat)
+            return True
+        
+        try:
+            summary = self._process_paths(args, encrypt_file, 'encrypt', extensions, metrics)
+            if manifest is not None and args.prune:
+                for output in manifest.prune():
+                    print(f"Removed {output}")
+        finally:
+            if manifest is not None:
+                manifest.close()
+        
+        if not args.quiet:
+            print(f"\nEncryption complete. {summary}")
         if not args.key:
             print(f"IMPORTANT: Your encryption key is at {key_path}")
+        self._check_errors(summary)
     
     def _decrypt(self, args):
         """Handle decryption command."""
+        from ..core.file_ops import FileOperations
+        
         if not args.key:
             raise ValueError("Decryption requires a key file. Use -k/--key option.")
         
         crypto = CryptoManager.load_key(args.key)
+        if self._is_pipe(args):
+            if args.resume or args.shard or args.store:
+                raise ValueError("--resume, --shard and --store cannot be used with stdin")
+            size = self._process_stream(args, crypto, 'decrypt')
+            if not args.quiet:
+                print(f"Decryption complete. {size} bytes", file=sys.stderr)
+            return
+        
+        from ..core.bundle import is_bundle
+        if len(args.paths) == 1 and is_bundle(args.paths[0]):
+            if args.shard:
+                raise ValueError("--shard cannot be used with a bundle")
+            self._open_bundle(args, crypto)
+            return
+        if args.list or args.extract:
+            raise ValueError("--list and --extract need a single bundle file")
+        
+        extensions = ['.enc'] if not args.ext else args.ext.split(',')
+        metrics = self._open_metrics(args, 'decrypt')
+        store = None
+        if args.store:
+            from ..core.chunkstore import ChunkStore
+            store = ChunkStore(args.store, crypto, metrics=metrics)
+        
+        def decrypt_file(input_path, output_path, jobs):
+            if args.resume and self._completed(input_path, output_path):
+                return False
+            if store is not None:
+                store.restore_file(input_path, output_path, jobs)
+                return True
+            FileOperations.decrypt_file(input_path, output_path, crypto, jobs=jobs,
+                                        executor=args.executor, progress=False,
+                                        io_mode=args.io_mode, resume=args.resume,
+                                        metrics=metrics, bulk_io=args.bulk_io)
+        
+        try:
+            summary = self._process_paths(args, decrypt_file, 'decrypt', extensions, metrics)
+        finally:
+            if store is not None:
+                store.close()
+        
+        if not args.quiet:
+            print(f"\nDecryption complete. {summary}")
+        self._check_errors(summary)
+    
+    def _verify(self, args):
+        """Handle verify command."""
+        from ..core.verify import OK, STATUSES, build_report, find_encrypted, verify_files
+        
+        if not args.key:
+            raise ValueError("Verification requires a key file. Use -k/--key option.")
+        crypto = CryptoManager.load_key(args.key)
         extensions = ['.enc'] if not args.ext else args.ext.split(',')
-        processed_files = 0
-        
-        for path in args.paths:
-            path = Path(path)
-            if path.is_file():
-                self._process_single_file(path, args.output, crypto.decrypt_data, '')
-                processed_files += 1
-            elif path.is_dir():
-                processed_files += self._process_directory(
-                    path, args.output, crypto.decrypt_data, '', 
-                    args.recursive, extensions
-                )
-        
-        print(f"\nDecryption complete. {processed_files} files processed.")
-    
-    def _process_single_file(self, input_path: Path, output_dir: str, 
-                           process_func, suffix: str) -> None:
-        """Process a single file with the given function."""
-        output_path = FileOperations.create_output_path(
-            input_path, output_dir, suffix
+        sharder = self._sharder(args)
+        files = find_encrypted(args.paths, args.recursive, extensions, shard=sharder,
+                               include=args.include, exclude=args.exclude,
+                               min_size=args.min_size, max_size=args.max_size)
+        metrics = self._open_metrics(args, 'verify')
+        try:
+            results, summary = verify_files(files, crypto, workers=args.workers, jobs=args.jobs,
+                                            executor=args.executor, io_mode=args.io_mode,
+                                            metrics=metrics)
+            metrics.set('fenc_wall_seconds', summary.wall_time)
+            report = build_report(results, summary)
+            metrics.emit('summary', operation='verify', **report['summary'])
+        finally:
+            metrics.close()
+        
+        failures = [result for result in results if not result.ok]
+        if args.shard_summary:
+            from ..core.shard import write_summary
+            write_summary(args.shard_summary, 'verify', sharder, dict(
+                report['summary'],
+                errors=[{'path': result.path, 'error': f"{result.status}: {result.error}"}
+                        for result in failures]
+            ))
+        if args.report == '-':
+            print(json.dumps(report, indent=2))
+        elif args.report:
+            Path(args.report).write_text(json.dumps(report, indent=2))
+        if not args.quiet and args.report != '-':
+            for result in failures:
+                print(f"{result.status.upper()} {result.path}: {result.error}")
+            totals = report['summary']
+            counts = ', '.join(f"{totals[status]} {status}" for status in STATUSES
+                               if totals[status] or status == OK)
+            print(f"\nVerified {totals['files']} files, {totals['bytes']} bytes in "
+                  f"{summary.wall_time:.2f}s: {counts}")
+        if failures:
+            raise RuntimeError(f"{len(failures)} files failed verification")
+    
+    def _rekey(self, args):
+        """Handle rekey command."""
+        from ..core.rekey import REENCRYPTED, REWRAPPED, rekey_files
+        from ..core.verify import find_encrypted
+        
+        if not args.full and args.no_envelope:
+            raise ValueError("--no-envelope needs --full (rewrapping keeps data keys)")
+        old_crypto = CryptoManager.load_key(args.old_key)
+        new_crypto = CryptoManager.load_key(args.new_key, args.cipher,
+                                            envelope=not args.no_envelope)
+        if old_crypto.key == new_crypto.key:
+            raise ValueError("The old and new keys are the same")
+        stores = []
+        if args.store:
+            from ..core.chunkstore import rewrap_store
+            store_id, rewrapped = rewrap_store(args.store, old_crypto, new_crypto)
+            stores.append(store_id)
+            if not args.quiet:
+                print(f"Chunk store {args.store}: "
+                      f"{'rewrapped' if rewrapped else 'already on the new key'}")
+        extensions = ['.enc'] if not args.ext else args.ext.split(',')
+        files = find_encrypted(args.paths, args.recursive, extensions,
+                               include=args.include, exclude=args.exclude,
+                               min_size=args.min_size, max_size=args.max_size)
+        metrics = self._open_metrics(args, 'rekey')
+        try:
+            counts, summary = rekey_files(files, old_crypto, new_crypto, full=args.full,
+                                          workers=args.workers, jobs=args.jobs,
+                                          executor=args.executor, io_mode=args.io_mode,
+                                          metrics=metrics, stores=stores)
+            metrics.set('fenc_wall_seconds', summary.wall_time)
+            metrics.emit('summary', operation='rekey', **counts, **summary.as_dict())
+        finally:
+            metrics.close()
+        
+        if not args.quiet:
+            print(f"\nRekey complete. {counts[REWRAPPED]} rewrapped, "
+                  f"{counts[REENCRYPTED]} re-encrypted, {summary.skipped} already on the new key, "
+                  f"{len(summary.errors)} errors in {summary.wall_time:.2f}s")
+        self._check_errors(summary)
+    
+    def _watch(self, args):
+        """Handle watch command."""
+        import signal
+        import threading
+        from ..core.file_ops import FileOperations
+        from ..core.scanner import ScanFilter
+        from ..core.watch import Watcher
+        
+        if args.compress is not None:
+            from ..core.compression import DEFAULT_CODEC, get_codec
+            args.compress = DEFAULT_CODEC if args.compress == 'auto' else args.compress
+            get_codec(args.compress)
+        crypto = CryptoManager.load_key(args.key, args.cipher, not args.no_envelope)
+        extensions = args.ext.split(',') if args.ext else None
+        scan_filter = ScanFilter(extensions, args.include, args.exclude,
+                                 args.min_size, args.max_size)
+        watcher = Watcher(args.paths, args.output, args.recursive, scan_filter,
+                          settle=args.settle, polling=args.poll is not None,
+                          poll_interval=args.poll or 5.0)
+        
+        def encrypt_file(input_path, output_path, jobs):
+            # Files touched without changing (or seen again at start-up) are done
+            if self._completed(input_path, output_path):
+                return False
+            FileOperations.encrypt_file(input_path, output_path, crypto, args.chunk_size,
+                                        jobs=jobs, executor=args.executor, progress=False,
+                                        io_mode=args.io_mode, compression=args.compress,
+                                        metrics=metrics)
+            if not args.quiet:
+                print(f"Encrypted {input_path} -> {output_path}")
+            return True
+        
+        def request_stop(signum, frame):
+            # stop() takes a queue lock the interrupted main thread may hold
+            threading.Thread(target=watcher.stop).start()
+        
+        previous = {sig: signal.signal(sig, request_stop)
+                    for sig in (signal.SIGINT, signal.SIGTERM)}
+        metrics = self._open_metrics(args, 'watch', progress=False)
+        try:
+            summary = watcher.run(encrypt_file, workers=args.workers, chunk_jobs=args.jobs,
+                                  metrics=metrics)
+            metrics.set('fenc_wall_seconds', summary.wall_time)
+            metrics.emit('summary', operation='watch', **summary.as_dict())
+        finally:
+            metrics.close()
+            for sig, handler in previous.items():
+                signal.signal(sig, handler)
+        
+        if not args.quiet:
+            print(f"\nStopped watching. {summary}")
+        self._check_errors(summary)
+    
+    def _plan(self, args):
+        """Handle plan command."""
+        from ..core.shard import build_plan, write_plan
+        
+        extensions = args.ext.split(',') if args.ext else None
+        entries, totals = build_plan(args.paths, args.shards, args.recursive, extensions,
+                                     include=args.include, exclude=args.exclude,
+                                     min_size=args.min_size, max_size=args.max_size)
+        write_plan(args.output, entries, totals)
+        counts = [0] * args.shards
+        for _, shard, _ in entries:
+            counts[shard - 1] += 1
+        for shard, (files, size) in enumerate(zip(counts, totals), 1):
+            print(f"Shard {shard}/{args.shards}: {files} files, {size} bytes")
+        print(f"Plan for {len(entries)} files saved to {args.output}")
+    
+    def _merge(self, args):
+        """Handle merge command."""
+        from ..core.shard import merge_summaries
+        
+        merged = merge_summaries(args.summaries)
+        if args.output:
+            Path(args.output).write_text(json.dumps(merged, indent=2))
+        summary = merged['summary']
+        errors = summary.get('errors', [])
+        print(f"{merged['operation'].capitalize()}: {len(merged['completed'])} of "
+              f"{merged['shards']} shards, {summary.get('files', 0)} files, "
+              f"{summary.get('bytes', 0)} bytes, {len(errors)} errors, "
+              f"slowest shard {summary.get('wall_time', 0.0):.2f}s")
+        for error in errors:
+            print(f"FAILED {error['path']}: {error['error']}")
+        if merged['missing']:
+            raise RuntimeError(f"Missing shards: {', '.join(map(str, merged['missing']))}")
+        if errors:
+            raise RuntimeError(f"{len(errors)} files failed")
+    
+    def _encrypt_to_store(self, args, crypto: CryptoManager, extensions: Optional[list]) -> None:
+        """Deduplicate every input file into a chunk store (encrypt --store)."""
+        from ..core.chunkstore import ChunkStore
+        
+        metrics = self._open_metrics(args, 'encrypt')
+        store = ChunkStore(args.store, crypto, args.compress, metrics)
+        before = store.stats()
+        
+        def store_file(input_path, output_path, jobs):
+            if args.resume and self._completed(input_path, output_path):
+                return False
+            store.store_file(input_path, output_path, jobs)
+            return True
+        
+        try:
+            summary = self._process_paths(args, store_file, 'encrypt', extensions, metrics)
+            after = store.stats()
+        finally:
+            store.close()
+        
+        if not args.quiet:
+            print(f"\nEncryption complete. {summary}")
+            added = after.unique_bytes - before.unique_bytes
+            print(f"Stored {after.chunks - before.chunks} new chunks ({added} bytes), "
+                  f"{after.logical_bytes - before.logical_bytes - added} bytes deduplicated")
+            print(f"Store {args.store}: {after}")
+        self._check_errors(summary)
+    
+    def _store_stats(self, args):
+        """Handle store-stats command."""
+        from ..core.chunkstore import read_stats
+        
+        stats = read_stats(args.store)
+        if args.json:
+            print(json.dumps(stats.as_dict(), indent=2))
+        else:
+            print(stats)
+    
+    def _create_bundle(self, args, crypto: CryptoManager, extensions: Optional[list]) -> None:
+        """Pack every input file into one bundle (encrypt --bundle)."""
+        from tqdm import tqdm
+        from ..core.bundle import create_bundle, plan_members
+        
+        members = list(plan_members(args.paths, args.recursive, extensions,
+                                    include=args.include, exclude=args.exclude,
+                                    min_size=args.min_size, max_size=args.max_size))
+        metrics = self._open_metrics(args, 'encrypt', progress=False)
+        try:
+            with tqdm(unit='B', unit_scale=True, desc=f"Bundling {len(members)} files",
+                      disable=True if args.quiet else None) as pbar:
+                entries = create_bundle(members, args.bundle, crypto, args.chunk_size,
+                                        jobs=args.jobs, executor=args.executor,
+                                        compression=args.compress, on_progress=pbar.update,
+                                        metrics=metrics)
+            size = sum(entry.size for entry in entries)
+            metrics.inc('fenc_files_total', len(entries), status='ok')
+            metrics.inc('fenc_bytes_total', size, direction='in')
+            metrics.emit('summary', operation='bundle', files=len(entries), bytes=size,
+                         output_bytes=Path(args.bundle).stat().st_size)
+        finally:
+            metrics.close()
+        if not args.quiet:
+            print(f"\nBundle complete. {len(entries)} files, {size} bytes -> "
+                  f"{Path(args.bundle).stat().st_size} bytes in {args.bundle}")
+    
+    def _open_bundle(self, args, crypto: CryptoManager) -> None:
+        """List or extract a bundle (decrypt on a bundle file)."""
+        from ..core.bundle import Bundle
+        
+        with Bundle(args.paths[0], crypto) as bundle:
+            if args.list:
+                for entry in bundle.entries:
+                    print(f"{entry.size:>14}  {entry.name}")
+                return
+            extracted = bundle.extract_all(args.output, args.extract)
+        if not args.quiet:
+            print(f"Extracted {len(extracted)} files to {args.output}")
+    
+    def _bench(self, args):
+        """Handle benchmark command."""
+        from ..core.benchmark import DEFAULT_THRESHOLD, compare_results, load_results, run_benchmarks
+        
+        threshold = DEFAULT_THRESHOLD if args.threshold is None else args.threshold
+        results = run_benchmarks(args.cipher, args.chunk_size, args.quick, args.jobs)
+        
+        for result in results['results']:
+            rate = f"{result['mb_per_s']:10.1f} MB/s"
+            if 'files_per_s' in result:
+                rate += f" {result['files_per_s']:10.1f} files/s"
+            if result.get('cached_bytes') is not None:
+                rate += f" {result['cached_bytes'] / 1e6:10.1f} MB cached"
+            print(f"{result['name']:<50} {rate}")
+        
+        if args.output:
+            Path(args.output).write_text(json.dumps(results, indent=2))
+            print(f"\nResults written to {args.output}")
+        
+        if args.baseline:
+            regressions = compare_results(results, load_results(args.baseline), threshold)
+            for regression in regressions:
+                print(f"REGRESSION {regression['name']}: {regression['mb_per_s']:.1f} MB/s "
+                      f"vs {regression['baseline_mb_per_s']:.1f} MB/s "
+                      f"({regression['change']:+.0%})")
+            if regressions:
+                raise RuntimeError(f"{len(regressions)} benchmarks regressed "
+                                   f"by more than {threshold:.0%}")
+            print(f"No regressions against {args.baseline}")
+    
+    @staticmethod
+    def _completed(input_path: Path, output_path: Path) -> bool:
+        """True if an earlier run finished ``output_path`` after ``input_path`` last changed.
+        
+        Outputs are renamed into place only once complete, so existing means finished.
+        """
+        try:
+            return Path(output_path).stat().st_mtime_ns >= Path(input_path).stat().st_mtime_ns
+        except OSError:
+            return False
+    
+    @staticmethod
+    def _sharder(args) -> Optional['Sharder']:
+        """The Sharder selected by --shard and --plan, or None."""
+        if not args.shard:
+            if args.plan:
+                raise ValueError("--plan needs --shard K/N")
+            return None
+        from ..core.shard import Sharder
+        return Sharder.parse(args.shard, args.plan)
+    
+    @staticmethod
+    def _is_pipe(args) -> bool:
+        """True if the command reads stdin and writes stdout."""
+        if '-' not in args.paths:
+            return False
+        if len(args.paths) > 1:
+            raise ValueError("'-' (stdin) cannot be combined with other paths")
+        return True
+    
+    def _process_stream(self, args, crypto: CryptoManager, operation: str) -> int:
+        """Encrypt or decrypt stdin to stdout; return the plaintext size."""
+        from tqdm import tqdm
+        from ..core.file_ops import FileOperations
+        
+        stdin, stdout = sys.stdin.buffer, sys.stdout.buffer
+        # stdout carries the data, so the progress bar only shows on a terminal
+        metrics = self._open_metrics(args, operation, progress=False)
+        try:
+            with tqdm(unit='B', unit_scale=True, desc=f"{operation.capitalize()}ing stdin",
+                      file=sys.stderr, disable=True if args.quiet else None) as pbar:
+                if operation == 'encrypt':
+                    size = FileOperations.encrypt_stream(
+                        stdin, stdout, crypto, args.chunk_size, jobs=args.jobs,
+                        executor=args.executor, io_mode=args.io_mode, on_progress=pbar.update,
+                        compression=args.compress, metrics=metrics
+                    )
+                else:
+                    size = FileOperations.decrypt_stream(
+                        stdin, stdout, crypto, jobs=args.jobs, executor=args.executor,
+                        io_mode=args.io_mode, on_progress=pbar.update, metrics=metrics
+                    )
+            stdout.flush()
+            metrics.inc('fenc_bytes_total', size, direction='in' if operation == 'encrypt' else 'out')
+            metrics.emit('summary', operation=operation, bytes=size)
+        finally:
+            metrics.close()
+        return size
+    
+    @staticmethod
+    def _open_metrics(args, operation: str, progress: bool = True) -> 'Metrics':
+        """Metrics with the sinks selected by --quiet, --metrics-jsonl and --metrics-prom."""
+        from ..core.metrics import (NULL_METRICS, JsonLinesSink, Metrics, ProgressSink,
+                                    PrometheusSink)
+        
+        sinks = []
+        if progress and not args.quiet:
+            sinks.append(ProgressSink(operation.capitalize()))
+        if args.metrics_jsonl == '-':
+            sinks.append(JsonLinesSink(sys.stderr))
+        elif args.metrics_jsonl:
+            sinks.append(JsonLinesSink.open(args.metrics_jsonl))
+        if args.metrics_prom:
+            sinks.append(PrometheusSink(args.metrics_prom))
+        return Metrics(sinks) if sinks else NULL_METRICS
+    
+    def _process_paths(self, args, file_func, operation: str,
+                       extensions: Optional[list], metrics: 'Metrics') -> 'RunSummary':
+        """Run every file under ``args.paths`` through the batch scheduler."""
+        from ..core.batch import BatchScheduler
+        from ..core.file_ops import FileOperations
+        
+        sharder = self._sharder(args)
+        tasks = FileOperations.plan_tasks(
+            args.paths, args.output, operation, args.recursive, extensions, shard=sharder,
+            include=args.include, exclude=args.exclude,
+            min_size=args.min_size, max_size=args.max_size
         )
-        print(f"Processing {input_path} -> {output_path}")
-        FileOperations.process_file(input_path, output_path, process_func)
-    
-    def _process_directory(self, directory: Path, output_dir: str, 
-                         process_func, suffix: str, 
-                         recursive: bool, extensions: list) -> int:
-        """Process all files in a directory matching criteria."""
-        processed_count = 0
-        output_dir = Path(output_dir) / directory.name
-        
-        for file_path in FileOperations.find_files(
-            directory, recursive, extensions
-        ):
-            output_path = FileOperations.create_output_path(
-                file_path, output_dir, suffix
-            )
-            print(f"Processing {file_path} -> {output_path}")
-            FileOperations.process_file(file_path, output_path, process_func)
-            processed_count += 1
-        
-        return processed_count
+        try:
+            scheduler = BatchScheduler(file_func, workers=args.workers, chunk_jobs=args.jobs,
+                                       metrics=metrics)
+            summary = scheduler.run(tasks)
+            metrics.set('fenc_wall_seconds', summary.wall_time)
+            metrics.emit('summary', operation=operation, **summary.as_dict())
+        finally:
+            metrics.close()
+        if args.shard_summary:
+            from ..core.shard import write_summary
+            write_summary(args.shard_summary, operation, sharder, summary.as_dict())
+        return summary
+    
+    def _check_errors(self, summary: 'RunSummary') -> None:
+        """Report failed files and fail the command if there were any."""
+        for path, error in summary.errors:
+            print(f"FAILED {path}: {error}")
+        if summary.errors:
+            raise RuntimeError(f"{len(summary.errors)} files failed")
 
 def main():
     """Entry point for command-line interface."""
+    logging.basicConfig(level=logging.INFO)
     cli = FileEncryptorCLI()
     cli.run()
 
@@ -0,0 +1,255 @@
+"""asyncio API for embedding the encryptor in async services.
+
+Every cipher call is handed to an executor, so the event loop only ever
+does I/O. Streams keep up to ``2 * jobs`` chunks being encrypted or
+decrypted while the next chunk is read and the previous one is written.
+Memory therefore stays bounded per stream, and hundreds of streams can run
+concurrently on one loop.
+
+Readers need a coroutine ``read(n)`` (e.g. ``asyncio.StreamReader``).
+Writers need ``write(data)``, which may be a coroutine (e.g. aiofiles); if
+they have a ``drain()`` coroutine (``asyncio.StreamWriter``), it is awaited
+after every write.
+"""
+from collections import deque
+from concurrent.futures import Executor
+from functools import partial
+from pathlib import Path
+from typing import Optional, Union
+import asyncio
+import inspect
+from .chunking import chunk_sizer
+from .container import (FLAG_UNINDEXED, FOOTER_SIZE, FRAME_LEN_SIZE, HEADER_SIZE,
+                        INDEX_ENTRY_SIZE, MAGIC, ContainerWriter, TruncatedError,
+                        check_trailer, encode_meta, frame_length, is_container,
+                        legacy_token_size, parse_header)
+from .compression import codec_for, get_codec, pack_chunk, unpack_chunk
+from .crypto import CryptoManager
+from .file_ops import FileOperations
+from .pipeline import in_flight_limit
+
+
+async def _read_up_to(reader, size: int) -> bytes:
+    """Read ``size`` bytes, or fewer only at end of stream."""
+    parts, remaining = [], size
+    while remaining:
+        data = await reader.read(remaining)
+        if not data:
+            break
+        parts.append(data)
+        remaining -= len(data)
+    return b"".join(parts)
+
+
+async def _read_exact(reader, size: int) -> bytes:
+    data = await _read_up_to(reader, size)
+    if len(data) != size:
+        raise TruncatedError("Unexpected end of file - encrypted file is truncated")
+    return data
+
+
+async def _write(writer, data: bytes) -> None:
+    if not data:
+        return
+    result = writer.write(data)
+    if inspect.isawaitable(result):
+        await result
+    drain = getattr(writer, 'drain', None)
+    if drain is not None:
+        await drain()
+
+
+class _Sink:
+    """Collects what ContainerWriter writes until it is flushed to the async writer."""
+
+    def __init__(self):
+        self._parts = []
+
+    def write(self, data: bytes) -> None:
+        self._parts.append(bytes(data))
+
+    def take(self) -> bytes:
+        data, self._parts = b"".join(self._parts), []
+        return data
+
+
+async def encrypt_stream(reader, writer, crypto: CryptoManager,
+                         chunk_size: Optional[int] = None, jobs: int = 1,
+                         executor: Optional[Executor] = None,
+                         compression: Optional[str] = None) -> int:
+    """
+    Encrypt everything from ``reader`` into a container written to ``writer``.
+
+    The output is a streamed (unindexed) container, like
+    ``FileOperations.encrypt_stream`` produces for input of unknown length.
+
+    Args:
+        reader: Async reader of the plaintext
+        writer: Async or sync writer for the container
+        crypto: CryptoManager holding the key
+        chunk_size: Plaintext bytes per chunk, or None to tune it
+        jobs: Chunks encrypted concurrently (0 for one per core)
+        executor: Executor for the cipher work (None for the loop's default)
+        compression: Codec name from compression.CODECS, or None
+
+    Returns:
+        Number of plaintext bytes encrypted
+    """
+    loop = asyncio.get_running_loop()
+    data_key = crypto.new_data_key()
+    suite = crypto.get_suite(crypto.cipher.id, data_key)
+    codec = get_codec(compression)
+    sizer = chunk_sizer(chunk_size, 0)
+    sink = _Sink()
+    container = ContainerWriter(sink, suite.id, sizer.max_size, FLAG_UNINDEXED, encode_meta({
+        **({'compression': compression} if codec else {}),
+        **({'data_key': data_key} if data_key else {}),
+    }))
+
+    def encrypt_chunk(data: bytes, number: int, last: bool) -> bytes:
+        payload = data if codec is None else pack_chunk(codec, data)
+        return suite.encrypt_chunk(payload, number, last)
+
+    await _write(writer, sink.take())
+
+    pending = deque()
+    limit = in_flight_limit(jobs)
+    total = number = 0
+
+    async def write_oldest() -> None:
+        future, plain_len = pending.popleft()
+        container.write_chunk(await future, plain_len)
+        await _write(writer, sink.take())
+
+    try:
+        data = await _read_up_to(reader, sizer.next_size())
+        while True:
+            # One chunk of lookahead tells whether this one is the last
+            following = await _read_up_to(reader, sizer.next_size()) if data else b""
+            last = not following
+            pending.append((
+                loop.run_in_executor(executor, encrypt_chunk, data, number, last),
+                len(data),
+            ))
+            total += len(data)
+            number += 1
+            if len(pending) >= limit:
+                await write_oldest()
+            if last:
+                break
+            data = following
+        while pending:
+            await write_oldest()
+    finally:
+        for future, _ in pending:
+            future.cancel()
+
+    container.close()
+    await _write(writer, sink.take())
+    return total
+
+
+async def decrypt_stream(reader, writer, crypto: CryptoManager, jobs: int = 1,
+                         executor: Optional[Executor] = None) -> int:
+    """
+    Decrypt a container (or legacy token stream) from ``reader`` into ``writer``.
+
+    Args:
+        reader: Async reader of the encrypted data
+        writer: Async or sync writer for the plaintext
+        crypto: CryptoManager holding the key
+        jobs: Chunks decrypted concurrently (0 for one per core)
+        executor: Executor for the cipher work (None for the loop's default)
+
+    Returns:
+        Number of plaintext bytes written
+    """
+    loop = asyncio.get_running_loop()
+    limit = in_flight_limit(jobs)
+    pending = deque()
+    written = 0
+
+    async def write_oldest() -> None:
+        nonlocal written
+        chunk = await pending.popleft()
+        await _write(writer, chunk)
+        written += len(chunk)
+
+    prefix = await _read_up_to(reader, len(MAGIC))
+    try:
+        if not is_container(prefix):
+            token_size = legacy_token_size()
+            token = prefix + await _read_up_to(reader, token_size - len(prefix))
+            while token:
+                pending.append(loop.run_in_executor(executor, crypto.decrypt_data, token))
+                if len(pending) >= limit:
+                    await write_oldest()
+                token = await _read_up_to(reader, token_size)
+            while pending:
+                await write_oldest()
+            return written
+
+        header, meta_len = parse_header(
+            prefix + await _read_exact(reader, HEADER_SIZE - len(prefix))
+        )
+        header = header._replace(meta=await _read_exact(reader, meta_len))
+        suite = crypto.suite_for(header)
+        codec = codec_for(header)
+
+        def decrypt_chunk(token: bytes, number: int, last: bool) -> bytes:
+            chunk = suite.decrypt_chunk(token, number, last)
+            return chunk if codec is None else unpack_chunk(codec, chunk, header.chunk_size)
+
+        decrypt = partial(loop.run_in_executor, executor, decrypt_chunk)
+
+        offsets = []
+        position = HEADER_SIZE + meta_len
+        number = 0
+        token = None
+        while True:
+            length = frame_length(await _read_exact(reader, FRAME_LEN_SIZE))
+            if token is not None:
+                pending.append(decrypt(token, number - 1, length == 0))
+                if len(pending) >= limit:
+                    await write_oldest()
+            if length == 0:
+                break
+            if header.indexed:
+                offsets.append(position)
+            token = await _read_exact(reader, length)
+            position += FRAME_LEN_SIZE + length
+            number += 1
+
+        index_data = await _read_exact(reader, len(offsets) * INDEX_ENTRY_SIZE)
+        check_trailer(position, offsets, index_data, await _read_exact(reader, FOOTER_SIZE))
+        while pending:
+            await write_oldest()
+        if suite.binds_position and not number:
+            raise TruncatedError("Encrypted file has no chunks - it is truncated")
+        return written
+    finally:
+        for future in pending:
+            future.cancel()
+
+
+async def encrypt_file(input_path: Union[str, Path], output_path: Union[str, Path],
+                       crypto: CryptoManager, chunk_size: Optional[int] = None,
+                       jobs: int = 1, executor: Optional[Executor] = None,
+                       io_mode: str = 'auto', compression: Optional[str] = None) -> None:
+    """Run ``FileOperations.encrypt_file`` in ``executor`` without blocking the loop."""
+    loop = asyncio.get_running_loop()
+    await loop.run_in_executor(executor, partial(
+        FileOperations.encrypt_file, input_path, output_path, crypto, chunk_size,
+        jobs=jobs, progress=False, io_mode=io_mode, compression=compression
+    ))
+
+
+async def decrypt_file(input_path: Union[str, Path], output_path: Union[str, Path],
+                       crypto: CryptoManager, jobs: int = 1,
+                       executor: Optional[Executor] = None, io_mode: str = 'auto') -> None:
+    """Run ``FileOperations.decrypt_file`` in ``executor`` without blocking the loop."""
+    loop = asyncio.get_running_loop()
+    await loop.run_in_executor(executor, partial(
+        FileOperations.decrypt_file, input_path, output_path, crypto,
+        jobs=jobs, progress=False, io_mode=io_mode
+    ))
@@ -0,0 +1,228 @@
+"""Concurrent processing of many files through a bounded work queue."""
+from pathlib import Path
+from typing import Callable, Iterable, List, Optional, Tuple
+import logging
+import queue
+import threading
+import time
+from .metrics import NULL_METRICS, Metrics
+from .pipeline import resolve_jobs
+
+logger = logging.getLogger(__name__)
+
+# Files below this size are grouped into one queue item to amortize overhead
+SMALL_FILE_SIZE = 1024 * 1024
+# Files at or above this size have their chunks spread across workers
+LARGE_FILE_SIZE = 64 * 1024 * 1024
+BATCH_FILES = 256
+BATCH_BYTES = 16 * 1024 * 1024
+
+Task = Tuple[Path, Optional[Path]]
+
+
+class RunSummary:
+    """Thread-safe totals for one batch run."""
+
+    def __init__(self):
+        self.files = 0
+        self.bytes = 0
+        self.output_bytes = 0
+        self.skipped = 0
+        self.errors: List[Tuple[Path, str]] = []
+        self.wall_time = 0.0
+        self._lock = threading.Lock()
+
+    def record(self, path: Path, size: int, output_size: int = 0) -> None:
+        """Record a successfully processed file (``output_size``: bytes written)."""
+        with self._lock:
+            self.files += 1
+            self.bytes += size
+            self.output_bytes += output_size
+
+    def record_skip(self, path: Path) -> None:
+        """Record a file that was already up to date."""
+        with self._lock:
+            self.skipped += 1
+
+    def record_error(self, path: Path, error: Exception) -> None:
+        """Record a file that failed to process."""
+        with self._lock:
+            self.errors.append((path, str(error)))
+
+    def as_dict(self) -> dict:
+        """Return the summary as a JSON-serializable dict."""
+        return {
+            'files': self.files,
+            'bytes': self.bytes,
+            'output_bytes': self.output_bytes,
+            'skipped': self.skipped,
+            'errors': [{'path': str(path), 'error': error} for path, error in self.errors],
+            'wall_time': self.wall_time,
+        }
+
+    def __str__(self) -> str:
+        rate = self.bytes / self.wall_time / 1e6 if self.wall_time else 0.0
+        skipped = f", {self.skipped} unchanged skipped" if self.skipped else ""
+        output = f" -> {self.output_bytes} bytes" if self.output_bytes else ""
+        return (f"{self.files} files processed{skipped}, {self.bytes} bytes{output}, "
+                f"{len(self.errors)} errors in {self.wall_time:.2f}s ({rate:.1f} MB/s)")
+
+
+class BatchScheduler:
+    """
+    Feeds (input, output) tasks to a pool of worker threads.
+
+    The queue between the caller and the workers is bounded, so a huge
+    directory tree is consumed only as fast as it is processed. Small files
+    travel through the queue in batches; large files are handed to
+    ``file_func`` with a share of ``chunk_jobs`` so their chunks are split
+    across cores. ``chunk_jobs`` is one budget for all large files at once,
+    not per file: a large file gets ``chunk_jobs`` divided by the large files
+    in progress, capped by what the others have not already taken, and at
+    least 1. Cipher threads for large files therefore stay below
+    ``chunk_jobs`` plus one per further large file, instead of growing to
+    ``workers * chunk_jobs``.
+    """
+
+    def __init__(self, file_func: Callable[[Path, Path, int], None],
+                 workers: int = 0, chunk_jobs: int = 0,
+                 on_file: Optional[Callable[[Path, int, Optional[Exception]], None]] = None,
+                 metrics: Optional[Metrics] = None, batch_files: int = BATCH_FILES):
+        """
+        Args:
+            file_func: Called as ``file_func(input_path, output_path, jobs)``;
+                returning False records the file as skipped. ``output_path``
+                is None for tasks that write nothing (e.g. verification)
+            workers: Number of files processed concurrently (0 for one per core)
+            chunk_jobs: Chunk-level threads shared by the large files in
+                progress (0 for one per core)
+            on_file: Optional callback ``(input_path, size, error)`` after each file
+            metrics: Receives file counts, sizes, latencies, queue depth and
+                one 'file' event per file
+            batch_files: Most small files grouped into one queue item (1 hands
+                out every file as soon as it arrives, e.g. for a watcher)
+        """
+        self.file_func = file_func
+        self.workers = resolve_jobs(workers)
+        self.chunk_jobs = resolve_jobs(chunk_jobs)
+        self.on_file = on_file
+        self.metrics = metrics or NULL_METRICS
+        self.batch_files = max(1, batch_files)
+        self._budget_lock = threading.Lock()
+        self._large_files = 0
+        self._reserved = 0
+
+    def run(self, tasks: Iterable[Task]) -> RunSummary:
+        """Process every task and return the run summary."""
+        summary = RunSummary()
+        work = queue.Queue(maxsize=2 * self.workers)
+        threads = [
+            threading.Thread(target=self._worker, args=(work, summary), daemon=True)
+            for _ in range(self.workers)
+        ]
+
+        start = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        try:
+            for batch in self._batches(tasks, summary):
+                work.put(batch)
+                self.metrics.set('fenc_queue_depth', work.qsize())
+        finally:
+            for _ in threads:
+                work.put(None)
+            for thread in threads:
+                thread.join()
+        summary.wall_time = time.perf_counter() - start
+        return summary
+
+    def _batches(self, tasks: Iterable[Task], summary: RunSummary):
+        """Group small tasks together; yield lists of ``(input, output, size)``."""
+        batch, batch_bytes = [], 0
+        for input_path, output_path in tasks:
+            try:
+                size = Path(input_path).stat().st_size
+            except OSError as e:
+                self._finish(summary, input_path, 0, e)
+                continue
+
+            if size >= SMALL_FILE_SIZE:
+                yield [(input_path, output_path, size)]
+                continue
+            batch.append((input_path, output_path, size))
+            batch_bytes += size
+            if len(batch) >= self.batch_files or batch_bytes >= BATCH_BYTES:
+                yield batch
+                batch, batch_bytes = [], 0
+        if batch:
+            yield batch
+
+    def _worker(self, work: queue.Queue, summary: RunSummary) -> None:
+        while True:
+            batch = work.get()
+            if batch is None:
+                return
+            for input_path, output_path, size in batch:
+                large = size >= LARGE_FILE_SIZE
+                jobs = self._reserve() if large else 1
+                start = time.perf_counter() if self.metrics.enabled else 0.0
+                try:
+                    done = self.file_func(input_path, output_path, jobs)
+                except Exception as e:
+                    logger.error(f"Failed to process {input_path}: {e}")
+                    self._finish(summary, input_path, size, e, start=start)
+                    continue
+                finally:
+                    if large:
+                        self._release(jobs)
+                if done is False:
+                    summary.record_skip(input_path)
+                    self._report(input_path, 'skipped', 0, 0, start, None)
+                    if self.on_file is not None:
+                        self.on_file(input_path, 0, None)
+                else:
+                    try:
+                        output_size = Path(output_path).stat().st_size if output_path else 0
+                    except OSError:
+                        output_size = 0
+                    self._finish(summary, input_path, size, None, output_size, start)
+
+    def _reserve(self) -> int:
+        """Take a large file's share of the chunk_jobs budget."""
+        with self._budget_lock:
+            self._large_files += 1
+            jobs = max(1, min(self.chunk_jobs // self._large_files,
+                              self.chunk_jobs - self._reserved))
+            self._reserved += jobs
+            return jobs
+
+    def _release(self, jobs: int) -> None:
+        with self._budget_lock:
+            self._large_files -= 1
+            self._reserved -= jobs
+
+    def _finish(self, summary: RunSummary, path: Path, size: int,
+                error: Optional[Exception], output_size: int = 0,
+                start: Optional[float] = None) -> None:
+        if error is None:
+            summary.record(path, size, output_size)
+        else:
+            summary.record_error(path, error)
+        self._report(path, 'ok' if error is None else 'error', size, output_size, start, error)
+        if self.on_file is not None:
+            self.on_file(path, size, error)
+
+    def _report(self, path: Path, status: str, size: int, output_size: int,
+                start: Optional[float], error: Optional[Exception]) -> None:
+        metrics = self.metrics
+        if not metrics.enabled:
+            return
+        seconds = time.perf_counter() - start if start else 0.0
+        metrics.inc('fenc_files_total', status=status)
+        if status == 'ok':
+            metrics.inc('fenc_bytes_total', size, direction='in')
+            metrics.inc('fenc_bytes_total', output_size, direction='out')
+            metrics.observe('fenc_file_seconds', seconds)
+        metrics.emit('file', path=str(path), status=status, bytes=size,
+                     output_bytes=output_size, seconds=seconds,
+                     **({'error': str(error)} if error is not None else {}))
@@ -0,0 +1,342 @@
+"""Throughput benchmarks for the crypto primitives and the file pipeline.
+
+Results are plain dicts that serialize to JSON, keyed by a stable ``name``
+such as ``file/encrypt/aes-256-gcm/64KiB/large``, so a run can be compared
+against a stored baseline with compare_results().
+"""
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional
+import ctypes
+import ctypes.util
+import json
+import mmap
+import os
+import platform
+import sys
+import tempfile
+import time
+from .batch import BatchScheduler
+from .ciphers import SUITES
+from .crypto import CryptoManager
+from .file_ops import FileOperations
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+DEFAULT_CHUNK_SIZES = (16 * 1024, 64 * 1024, 1024 * 1024)
+DEFAULT_THRESHOLD = 0.10
+
+# Workload profiles: (number of files, size of each file)
+PROFILES = {
+    'tiny': (2000, 2 * 1024),
+    'large': (1, 256 * 1024 * 1024),
+}
+QUICK_PROFILES = {
+    'tiny': (200, 2 * 1024),
+    'large': (1, 16 * 1024 * 1024),
+}
+
+# Input size for the bulk I/O benchmark, and the modes it compares:
+# (io_mode, bulk_io)
+BULK_SIZE = 256 * 1024 * 1024
+QUICK_BULK_SIZE = 32 * 1024 * 1024
+BULK_MODES = {
+    'default': ('auto', False),
+    'bulk': ('auto', True),
+    'direct': ('direct', True),
+}
+
+
+def _size_label(size: Optional[int]) -> str:
+    if size is None:
+        return "auto"
+    if size >= 1024 * 1024 and size % (1024 * 1024) == 0:
+        return f"{size // (1024 * 1024)}MiB"
+    if size % 1024:
+        return f"{size}B"
+    return f"{size // 1024}KiB"
+
+
+def peak_rss_kb() -> Optional[int]:
+    """Peak resident set size of this process so far, in KiB (None if unknown)."""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # macOS reports bytes, Linux reports KiB
+    return peak // 1024 if sys.platform == 'darwin' else peak
+
+
+def cached_bytes(path) -> Optional[int]:
+    """Bytes of ``path`` currently in the page cache (Linux only, else None)."""
+    if not sys.platform.startswith('linux'):
+        return None
+    size = os.path.getsize(path)
+    if size == 0:
+        return 0
+    libc = ctypes.CDLL(ctypes.util.find_library('c'), use_errno=True)
+    pages = -(-size // mmap.PAGESIZE)
+    vector = (ctypes.c_ubyte * pages)()
+    with open(path, 'rb') as f:
+        # A private mapping is writable, which ctypes needs to take its address
+        mapping = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_COPY)
+        anchor = ctypes.c_char.from_buffer(mapping)
+        try:
+            failed = libc.mincore(ctypes.c_void_p(ctypes.addressof(anchor)),
+                                  ctypes.c_size_t(size), vector)
+        finally:
+            del anchor
+            mapping.close()
+    if failed:
+        return None
+    return min(size, sum(page & 1 for page in vector) * mmap.PAGESIZE)
+
+
+def _evict(path: Path) -> None:
+    """Drop ``path`` from the page cache so the next read starts cold."""
+    with open(path, 'rb') as f:
+        os.fsync(f.fileno())
+        if hasattr(os, 'posix_fadvise'):
+            os.posix_fadvise(f.fileno(), 0, 0, os.POSIX_FADV_DONTNEED)
+
+
+def _best_of(repeat: int, func) -> float:
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def _result(name: str, seconds: float, total_bytes: int, files: int = 0) -> dict:
+    result = {
+        'name': name,
+        'seconds': seconds,
+        'bytes': total_bytes,
+        'mb_per_s': total_bytes / seconds / 1e6 if seconds else 0.0,
+        'peak_rss_kb': peak_rss_kb(),
+    }
+    if files:
+        result['files_per_s'] = files / seconds if seconds else 0.0
+    return result
+
+
+def bench_crypto(ciphers: Iterable[str], chunk_sizes: Iterable[int],
+                 total_bytes: int = 64 * 1024 * 1024, repeat: int = 3) -> List[dict]:
+    """Measure CryptoManager chunk and token encryption throughput in memory."""
+    results = []
+    for chunk_size in chunk_sizes:
+        chunk = os.urandom(chunk_size)
+        count = max(1, total_bytes // chunk_size)
+        label = _size_label(chunk_size)
+
+        for cipher in ciphers:
+            crypto = CryptoManager(cipher=cipher)
+            tokens = [crypto.encrypt_chunk(chunk, number) for number in range(count)]
+            seconds = _best_of(repeat, lambda: [
+                crypto.encrypt_chunk(chunk, number) for number in range(count)
+            ])
+            results.append(_result(f"crypto/encrypt/{cipher}/{label}", seconds, count * chunk_size))
+            seconds = _best_of(repeat, lambda: [
+                crypto.decrypt_chunk(token, number) for number, token in enumerate(tokens)
+            ])
+            results.append(_result(f"crypto/decrypt/{cipher}/{label}", seconds, count * chunk_size))
+
+        # Base64 Fernet tokens from encrypt_data/decrypt_data
+        crypto = CryptoManager()
+        tokens = [crypto.encrypt_data(chunk) for _ in range(count)]
+        seconds = _best_of(repeat, lambda: [crypto.encrypt_data(chunk) for _ in range(count)])
+        results.append(_result(f"crypto/encrypt_data/fernet-token/{label}", seconds, count * chunk_size))
+        seconds = _best_of(repeat, lambda: [crypto.decrypt_data(token) for token in tokens])
+        results.append(_result(f"crypto/decrypt_data/fernet-token/{label}", seconds, count * chunk_size))
+    return results
+
+
+def bench_records(ciphers: Iterable[str], record_size: int = 256, count: int = 100_000,
+                  repeat: int = 3) -> List[dict]:
+    """Measure small-record throughput of encrypt_batch against encrypt_data."""
+    batch = [os.urandom(record_size) for _ in range(count)]
+    label = _size_label(record_size)
+    results = []
+
+    def add(name: str, seconds: float) -> None:
+        result = _result(name, seconds, count * record_size)
+        result['records_per_s'] = count / seconds if seconds else 0.0
+        results.append(result)
+
+    for cipher in ciphers:
+        crypto = CryptoManager(cipher=cipher)
+        tokens = crypto.encrypt_batch(batch)
+        add(f"records/encrypt_batch/{cipher}/{label}",
+            _best_of(repeat, lambda: crypto.encrypt_batch(batch)))
+        add(f"records/decrypt_batch/{cipher}/{label}",
+            _best_of(repeat, lambda: crypto.decrypt_batch(tokens)))
+
+    # One encrypt_data call per record, as before batching existed
+    crypto = CryptoManager()
+    add(f"records/encrypt_data/fernet-token/{label}",
+        _best_of(repeat, lambda: [crypto.encrypt_data(record) for record in batch]))
+    return results
+
+
+def _make_profile(directory: Path, files: int, size: int) -> List[Path]:
+    directory.mkdir(parents=True, exist_ok=True)
+    block = os.urandom(min(size, 1024 * 1024))
+    paths = []
+    for number in range(files):
+        path = directory / f"file{number:06d}.bin"
+        with open(path, 'wb') as handle:
+            remaining = size
+            while remaining > 0:
+                handle.write(block[:remaining])
+                remaining -= len(block)
+        paths.append(path)
+    return paths
+
+
+def bench_files(workdir: Path, ciphers: Iterable[str], chunk_sizes: Iterable[int],
+                profiles: Dict[str, tuple] = None, jobs: int = 0,
+                repeat: int = 1) -> List[dict]:
+    """
+    Measure FileOperations encrypt/decrypt throughput for each workload profile.
+
+    A chunk size of None measures adaptive chunk sizing.
+    """
+    profiles = profiles or PROFILES
+    results = []
+    for profile, (files, size) in profiles.items():
+        sources = _make_profile(workdir / profile / 'plain', files, size)
+        total = files * size
+
+        for cipher in ciphers:
+            crypto = CryptoManager(cipher=cipher)
+            for chunk_size in chunk_sizes:
+                label = f"{cipher}/{_size_label(chunk_size)}/{profile}"
+                encrypted = workdir / profile / 'enc'
+                decrypted = workdir / profile / 'dec'
+
+                def encrypt_one(src, dst, file_jobs):
+                    FileOperations.encrypt_file(src, dst, crypto, chunk_size,
+                                                jobs=file_jobs, progress=False)
+
+                def decrypt_one(src, dst, file_jobs):
+                    FileOperations.decrypt_file(src, dst, crypto, jobs=file_jobs, progress=False)
+
+                enc_tasks = [(src, encrypted / (src.name + '.enc')) for src in sources]
+                dec_tasks = [(dst, decrypted / src.name) for src, dst in enc_tasks]
+                scheduler = BatchScheduler(encrypt_one, workers=jobs, chunk_jobs=jobs)
+                seconds = _best_of(repeat, lambda: scheduler.run(enc_tasks))
+                results.append(_result(f"file/encrypt/{label}", seconds, total, files))
+
+                scheduler = BatchScheduler(decrypt_one, workers=jobs, chunk_jobs=jobs)
+                seconds = _best_of(repeat, lambda: scheduler.run(dec_tasks))
+                results.append(_result(f"file/decrypt/{label}", seconds, total, files))
+    return results
+
+
+def bench_bulk_io(workdir: Path, size: int = BULK_SIZE, jobs: int = 0,
+                  modes: Dict[str, tuple] = None) -> List[dict]:
+    """
+    Measure one large file's throughput and page cache footprint per I/O mode.
+
+    Each run starts with the input out of the cache. ``cached_bytes`` is how
+    much of the input and output the run left in the page cache; 'bulk' and
+    'direct' should leave almost none, 'default' up to twice the file size.
+    """
+    modes = modes or BULK_MODES
+    workdir.mkdir(parents=True, exist_ok=True)
+    source = _make_profile(workdir / 'bulk', 1, size)[0]
+    encrypted = workdir / 'bulk' / 'file.enc'
+    decrypted = workdir / 'bulk' / 'file.out'
+    crypto = CryptoManager()
+    label = _size_label(size)
+    results = []
+    for mode, (io_mode, bulk_io) in modes.items():
+        for operation, src, dst in (('encrypt', source, encrypted),
+                                    ('decrypt', encrypted, decrypted)):
+            _evict(src)
+            start = time.perf_counter()
+            if operation == 'encrypt':
+                FileOperations.encrypt_file(src, dst, crypto, jobs=jobs, progress=False,
+                                            io_mode=io_mode, bulk_io=bulk_io)
+            else:
+                FileOperations.decrypt_file(src, dst, crypto, jobs=jobs, progress=False,
+                                            io_mode=io_mode, bulk_io=bulk_io)
+            result = _result(f"bulkio/{operation}/{mode}/{label}",
+                             time.perf_counter() - start, size)
+            cached = [cached_bytes(src), cached_bytes(dst)]
+            result['cached_bytes'] = None if None in cached else sum(cached)
+            results.append(result)
+    return results
+
+
+def run_benchmarks(ciphers: Iterable[str] = None, chunk_sizes: Iterable[int] = None,
+                   quick: bool = False, jobs: int = 0,
+                   workdir: Optional[Path] = None) -> dict:
+    """
+    Run the crypto and file benchmarks.
+
+    Args:
+        ciphers: Cipher suite names (all suites by default)
+        chunk_sizes: Chunk sizes in bytes
+        quick: Use small workloads, e.g. for CI smoke runs
+        jobs: Workers for the file benchmarks (0 for one per core)
+        workdir: Scratch directory (a temporary directory by default)
+
+    Returns:
+        JSON-serializable dict with environment info and a ``results`` list
+    """
+    ciphers = list(ciphers or SUITES)
+    chunk_sizes = list(chunk_sizes or DEFAULT_CHUNK_SIZES)
+    profiles = QUICK_PROFILES if quick else PROFILES
+
+    with tempfile.TemporaryDirectory(dir=workdir) as scratch:
+        results = bench_crypto(ciphers, chunk_sizes,
+                               total_bytes=(8 if quick else 64) * 1024 * 1024,
+                               repeat=1 if quick else 3)
+        results += bench_records(ciphers, count=10_000 if quick else 100_000,
+                                 repeat=1 if quick else 3)
+        # None benchmarks adaptive chunk sizing
+        results += bench_files(Path(scratch), ciphers, chunk_sizes + [None], profiles, jobs)
+        results += bench_bulk_io(Path(scratch), QUICK_BULK_SIZE if quick else BULK_SIZE, jobs)
+
+    return {
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+        'quick': quick,
+        'results': results,
+    }
+
+
+def compare_results(current: dict, baseline: dict,
+                    threshold: float = DEFAULT_THRESHOLD) -> List[dict]:
+    """
+    Compare a run against a baseline run.
+
+    Returns one entry per benchmark whose throughput dropped by more than
+    ``threshold`` (a fraction, 0.10 = 10%). Benchmarks missing from either
+    run are ignored.
+    """
+    baseline_by_name = {result['name']: result for result in baseline.get('results', [])}
+    regressions = []
+    for result in current.get('results', []):
+        reference = baseline_by_name.get(result['name'])
+        if not reference or not reference['mb_per_s']:
+            continue
+        change = result['mb_per_s'] / reference['mb_per_s'] - 1
+        if change < -threshold:
+            regressions.append({
+                'name': result['name'],
+                'baseline_mb_per_s': reference['mb_per_s'],
+                'mb_per_s': result['mb_per_s'],
+                'change': change,
+            })
+    return regressions
+
+
+def load_results(path) -> dict:
+    """Load a JSON results file written by ``file-encryptor bench``."""
+    return json.loads(Path(path).read_text())
@@ -0,0 +1,282 @@
+"""Encrypted bundles: many files packed into one container.
+
+A bundle is an ordinary indexed container (header metadata
+``{"bundle": 1}``) whose plaintext is every member's contents back to back,
+followed by a JSON table of contents and a fixed-size trailer::
+
+    data...  | toc (JSON) | toc_len(8) | "FBTC"
+
+The table of contents is encrypted with everything else. Reading it only
+decrypts the last chunk or two, and a member is read through
+EncryptedFileReader, so listing a bundle or extracting one file decrypts
+only the chunks involved, never the whole bundle.
+"""
+from pathlib import Path, PurePosixPath
+from typing import BinaryIO, Callable, Iterable, Iterator, List, NamedTuple, Optional, Tuple, Union
+import json
+import logging
+import os
+import struct
+from .checkpoint import AtomicOutput
+from .container import ContainerError, ContainerReader, is_container
+from .crypto import CryptoManager
+from .file_ops import FileOperations, iter_inputs
+from .metrics import Metrics
+from .reader import EncryptedFileReader
+
+logger = logging.getLogger(__name__)
+
+BUNDLE_VERSION = 1
+TOC_MAGIC = b'FBTC'
+_TRAILER = struct.Struct('>Q4s')
+# Bytes copied at a time when extracting
+COPY_SIZE = 1024 * 1024
+
+
+class BundleEntry(NamedTuple):
+    """One member of a bundle."""
+    name: str
+    offset: int
+    size: int
+    mode: int
+    mtime: float
+
+
+def plan_members(paths: Iterable[Union[str, Path]], recursive: bool = False,
+                 extensions: List[str] = None, **filters) -> Iterator[Tuple[Path, str]]:
+    """
+    Name the members of a bundle, laid out like FileOperations.plan_tasks.
+
+    Files are stored under their name, and directories under their own name
+    followed by the path relative to them.
+
+    Yields:
+        ``(input_path, member_name)`` tuples; names use '/' separators
+    """
+    for file_path, root in iter_inputs(paths, recursive, extensions, **filters):
+        if root is None:
+            yield file_path, file_path.name
+        else:
+            yield file_path, (PurePosixPath(root.name)
+                              / file_path.relative_to(root).as_posix()).as_posix()
+
+
+class _BundleSource:
+    """File-like reader over every member followed by the table of contents."""
+
+    def __init__(self, members: Iterable[Tuple[Path, str]]):
+        self._members = iter(members)
+        self._current: Optional[BinaryIO] = None
+        self._tail: Optional[memoryview] = None
+        self._offset = 0
+        self.entries: List[BundleEntry] = []
+
+    def _next_member(self) -> bool:
+        """Open the next member; return False once they are all read."""
+        for path, name in self._members:
+            try:
+                stream = open(path, 'rb')
+                stat = os.fstat(stream.fileno())
+            except OSError as e:
+                raise ValueError(f"Cannot add {path} to the bundle: {e}") from e
+            self._current = stream
+            self.entries.append(BundleEntry(name, self._offset, 0, stat.st_mode & 0o777,
+                                            stat.st_mtime))
+            return True
+        return False
+
+    def _finish_toc(self) -> None:
+        toc = json.dumps({
+            'version': BUNDLE_VERSION,
+            'files': [entry._asdict() for entry in self.entries],
+        }, separators=(',', ':')).encode()
+        self._tail = memoryview(toc + _TRAILER.pack(len(toc), TOC_MAGIC))
+
+    def read(self, size: int = -1) -> bytes:
+        parts = []
+        while size:
+            if self._tail is not None:
+                part = bytes(self._tail[:size] if size > 0 else self._tail)
+                self._tail = self._tail[len(part):]
+                parts.append(part)
+                break
+            if self._current is None and not self._next_member():
+                self._finish_toc()
+                continue
+            data = self._current.read(size if size > 0 else COPY_SIZE)
+            if not data:
+                self._current.close()
+                self._current = None
+                continue
+            entry = self.entries[-1]
+            self.entries[-1] = entry._replace(size=entry.size + len(data))
+            self._offset += len(data)
+            parts.append(data)
+            if size > 0:
+                size -= len(data)
+        return b"".join(parts)
+
+    def close(self) -> None:
+        if self._current is not None:
+            self._current.close()
+            self._current = None
+
+
+def create_bundle(members: Iterable[Tuple[Path, str]], output_path: Union[str, Path],
+                  crypto: CryptoManager, chunk_size: Optional[int] = None, jobs: int = 1,
+                  executor: str = 'thread', compression: Optional[str] = None,
+                  on_progress: Optional[Callable[[int], None]] = None,
+                  metrics: Optional[Metrics] = None) -> List[BundleEntry]:
+    """
+    Stream files into one encrypted bundle.
+
+    Args:
+        members: ``(input_path, member_name)`` pairs, e.g. from plan_members
+        output_path: Bundle file to write (atomically)
+        crypto: CryptoManager holding the key
+        chunk_size: Plaintext bytes per chunk, or None to tune it
+        jobs: Number of chunks encrypted concurrently (0 for one per core)
+        executor: 'thread' or 'process' worker pool
+        compression: Codec name from compression.CODECS, or None
+        on_progress: Called with the plaintext length of each chunk written
+        metrics: Receives per-stage timings and the chunk count
+
+    Returns:
+        The bundle's table of contents
+    """
+    members = list(members)
+    names = set()
+    for _, name in members:
+        if name in names:
+            raise ValueError(f"Two files would be stored as {name!r}")
+        names.add(name)
+    # Only an estimate: it picks the chunk size and preallocates the output
+    estimate = 0
+    for path, _ in members:
+        try:
+            estimate += Path(path).stat().st_size
+        except OSError:
+            pass
+
+    source = _BundleSource(members)
+    try:
+        with AtomicOutput(output_path) as output:
+            FileOperations.encrypt_stream(
+                source, output.file, crypto, chunk_size, jobs=jobs, executor=executor,
+                io_mode='buffered', total_size=estimate, on_progress=on_progress,
+                compression=compression, metadata={'bundle': BUNDLE_VERSION}, metrics=metrics
+            )
+    finally:
+        source.close()
+    return source.entries
+
+
+def is_bundle(path: Union[str, Path]) -> bool:
+    """True if ``path`` is a bundle (judged from its container header)."""
+    try:
+        with open(path, 'rb') as f:
+            if not is_container(f.read(4)):
+                return False
+            f.seek(0)
+            return 'bundle' in ContainerReader(f).header.metadata
+    except (OSError, ContainerError):
+        return False
+
+
+def _safe_destination(directory: Path, name: str) -> Path:
+    """Resolve a member name under ``directory``, refusing names that escape it."""
+    parts = PurePosixPath(name).parts
+    if not parts or PurePosixPath(name).is_absolute() or '..' in parts or '\\' in name:
+        raise ValueError(f"Refusing to extract unsafe member name {name!r}")
+    return directory.joinpath(*parts)
+
+
+class Bundle:
+    """Read access to a bundle: list it, read members, extract them."""
+
+    def __init__(self, path: Union[str, Path], crypto: CryptoManager):
+        """
+        Args:
+            path: Bundle file
+            crypto: CryptoManager holding the key
+        """
+        self.path = Path(path)
+        self._reader = EncryptedFileReader(path, crypto)
+        try:
+            self.entries = self._read_toc()
+        except BaseException:
+            self._reader.close()
+            raise
+        self._by_name = {entry.name: entry for entry in self.entries}
+
+    def _read_toc(self) -> List[BundleEntry]:
+        reader = self._reader
+        if reader.size < _TRAILER.size:
+            raise ContainerError("Not a bundle - no table of contents")
+        reader.seek(-_TRAILER.size, os.SEEK_END)
+        toc_len, magic = _TRAILER.unpack(reader.read(_TRAILER.size))
+        if magic != TOC_MAGIC or toc_len > reader.size - _TRAILER.size:
+            raise ContainerError("Not a bundle - no table of contents")
+        reader.seek(reader.size - _TRAILER.size - toc_len)
+        try:
+            toc = json.loads(reader.read(toc_len))
+            return [BundleEntry(**entry) for entry in toc['files']]
+        except (ValueError, KeyError, TypeError) as e:
+            raise ContainerError("Bundle table of contents is corrupt") from e
+
+    def __enter__(self) -> 'Bundle':
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+    def close(self) -> None:
+        self._reader.close()
+
+    def names(self) -> List[str]:
+        return [entry.name for entry in self.entries]
+
+    def get(self, name: str) -> BundleEntry:
+        entry = self._by_name.get(name)
+        if entry is None:
+            raise KeyError(f"{name!r} is not in the bundle")
+        return entry
+
+    def _copy(self, entry: BundleEntry, outfile: BinaryIO) -> None:
+        self._reader.seek(entry.offset)
+        remaining = entry.size
+        while remaining:
+            data = self._reader.read(min(remaining, COPY_SIZE))
+            if not data:
+                raise ContainerError(f"Bundle ends inside {entry.name!r}")
+            outfile.write(data)
+            remaining -= len(data)
+
+    def read(self, name: str) -> bytes:
+        """Return one member's contents, decrypting only the chunks it spans."""
+        entry = self.get(name)
+        self._reader.seek(entry.offset)
+        data = self._reader.read(entry.size)
+        if len(data) != entry.size:
+            raise ContainerError(f"Bundle ends inside {name!r}")
+        return data
+
+    def extract(self, name: str, directory: Union[str, Path]) -> Path:
+        """Write one member under ``directory``, restoring its mode and mtime."""
+        entry = self.get(name)
+        destination = _safe_destination(Path(directory), entry.name)
+        with AtomicOutput(destination) as output:
+            self._copy(entry, output.file)
+        os.chmod(destination, entry.mode)
+        os.utime(destination, (entry.mtime, entry.mtime))
+        return destination
+
+    def extract_all(self, directory: Union[str, Path],
+                    names: Optional[Iterable[str]] = None) -> List[Path]:
+        """Extract every member (or just ``names``) in bundle order."""
+        wanted = set(names) if names is not None else None
+        if wanted is not None:
+            for name in wanted:
+                self.get(name)
+        return [self.extract(entry.name, directory) for entry in self.entries
+                if wanted is None or entry.name in wanted]
@@ -0,0 +1,173 @@
+"""Crash-safe output files with resumable checkpoints.
+
+Outputs are written to ``<name>.part`` next to the final path and renamed
+over it only once they are complete and synced, so an interrupted run never
+leaves a truncated file that looks valid.
+
+Long writes also save a checkpoint (``<name>.part.json``) every
+CHECKPOINT_INTERVAL bytes. The output is synced first, and the checkpoint
+only describes chunks written before that point, so after a crash a resumed
+run continues from the last checkpoint and redoes at most one interval of
+work. A checkpoint is only reused if its identity (source file, size, mtime,
+key, options) matches the new run exactly; otherwise the file starts over.
+"""
+from pathlib import Path
+from typing import Optional, Union
+import json
+import os
+from .crypto import key_fingerprint
+
+# Bytes of input processed between two checkpoints
+CHECKPOINT_INTERVAL = 64 * 1024 * 1024
+PARTIAL_SUFFIX = '.part'
+CHECKPOINT_SUFFIX = '.part.json'
+CHECKPOINT_VERSION = 1
+
+
+def partial_path(output_path: Union[str, Path]) -> Path:
+    """Where ``output_path`` is written until it is complete."""
+    output_path = Path(output_path)
+    return output_path.with_name(output_path.name + PARTIAL_SUFFIX)
+
+
+def checkpoint_path(output_path: Union[str, Path]) -> Path:
+    """Where the checkpoint for ``output_path`` is kept."""
+    output_path = Path(output_path)
+    return output_path.with_name(output_path.name + CHECKPOINT_SUFFIX)
+
+
+def source_identity(operation: str, input_path: Union[str, Path], key: bytes, **options) -> dict:
+    """
+    Describe a run so a checkpoint is only resumed by an identical one.
+
+    Args:
+        operation: 'encrypt' or 'decrypt'
+        input_path: Source file; its size and mtime are included
+        key: Key bytes; only a digest is stored
+        options: Settings that change the output (cipher, chunk size, ...)
+    """
+    stat = Path(input_path).stat()
+    return {
+        'version': CHECKPOINT_VERSION,
+        'operation': operation,
+        'source': str(Path(input_path).resolve()),
+        'size': stat.st_size,
+        'mtime_ns': stat.st_mtime_ns,
+        'key': key_fingerprint(key, b'fenc-checkpoint'),
+        **options,
+    }
+
+
+def _fsync_directory(path: Path) -> None:
+    try:
+        fd = os.open(path, os.O_RDONLY)
+    except OSError:
+        return  # Not supported (e.g. Windows)
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
+
+
+class AtomicOutput:
+    """
+    Context manager for one output file.
+
+    ``file`` is the open ``.part`` file. ``state`` is the checkpoint being
+    resumed (None for a fresh start); the partial file has been truncated to
+    the checkpoint's ``position`` and ``file`` is positioned there. On a clean
+    exit the file is synced and renamed into place and the checkpoint is
+    removed. On an error the partial file is kept if a checkpoint refers to
+    it, so a later run can resume, and removed otherwise.
+    """
+
+    def __init__(self, output_path: Union[str, Path], identity: Optional[dict] = None,
+                 resume: bool = False, interval: int = CHECKPOINT_INTERVAL):
+        """
+        Args:
+            output_path: Final path of the output
+            identity: What a checkpoint must match to be resumed (see
+                source_identity); None disables checkpoints
+            resume: Continue from a matching checkpoint if there is one
+            interval: Input bytes between checkpoints
+        """
+        self.output_path = Path(output_path)
+        self.partial_path = partial_path(output_path)
+        self.checkpoint_path = checkpoint_path(output_path)
+        self.identity = identity
+        self.resume = resume
+        self.interval = interval
+        self.state: Optional[dict] = None
+        self.file = None
+        self._since_checkpoint = 0
+        self._checkpointed = False
+
+    def __enter__(self) -> 'AtomicOutput':
+        self.output_path.parent.mkdir(parents=True, exist_ok=True)
+        if self.resume and self.identity is not None:
+            self.state = self._load()
+        if self.state is not None:
+            self.file = open(self.partial_path, 'r+b')
+            self.file.truncate(self.state['position'])
+            self.file.seek(self.state['position'])
+            self._checkpointed = True
+        else:
+            self.checkpoint_path.unlink(missing_ok=True)
+            self.file = open(self.partial_path, 'wb')
+        return self
+
+    def _load(self) -> Optional[dict]:
+        try:
+            saved = json.loads(self.checkpoint_path.read_text())
+            size = self.partial_path.stat().st_size
+        except (OSError, ValueError):
+            return None
+        if (not isinstance(saved, dict) or saved.get('identity') != self.identity
+                or not isinstance(saved.get('state'), dict)
+                or saved['state'].get('position', size + 1) > size):
+            return None
+        return saved['state']
+
+    def advance(self, size: int) -> None:
+        """Count ``size`` more input bytes towards the next checkpoint."""
+        self._since_checkpoint += size
+
+    @property
+    def due(self) -> bool:
+        """True when a checkpoint should be saved before the next write."""
+        return self.identity is not None and self._since_checkpoint >= self.interval
+
+    def save(self, state: dict) -> None:
+        """
+        Sync the output and record ``state`` as the point to resume from.
+
+        ``state['position']`` must be the output size the state describes;
+        anything written after it is discarded on resume.
+        """
+        self.file.flush()
+        os.fsync(self.file.fileno())
+        temporary = self.checkpoint_path.with_name(self.checkpoint_path.name + '.tmp')
+        with open(temporary, 'w') as f:
+            json.dump({'identity': self.identity, 'state': state}, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temporary, self.checkpoint_path)
+        self._since_checkpoint = 0
+        self._checkpointed = True
+
+    def __exit__(self, exc_type, exc, traceback) -> None:
+        if exc_type is None:
+            try:
+                self.file.flush()
+                os.fsync(self.file.fileno())
+            finally:
+                self.file.close()
+            os.replace(self.partial_path, self.output_path)
+            self.checkpoint_path.unlink(missing_ok=True)
+            _fsync_directory(self.output_path.parent)
+            return
+        self.file.close()
+        if not self._checkpointed:
+            self.partial_path.unlink(missing_ok=True)
@@ -0,0 +1,128 @@
+"""Chunk size selection for the file pipeline.
+
+Every chunk's plaintext length is stored in the container index, so the
+chunk size can change from one chunk to the next without the decrypting
+side knowing anything about how it was chosen.
+"""
+from typing import Callable, Optional
+import time
+
+MIN_CHUNK_SIZE = 16 * 1024
+MAX_CHUNK_SIZE = 4 * 1024 * 1024
+# Adaptive runs never start above this; larger sizes must prove themselves
+INITIAL_MAX_CHUNK_SIZE = 1024 * 1024
+# Aim for at least this many chunks per file so they can be spread over cores
+TARGET_CHUNKS = 64
+# Keep a larger chunk size only if it is at least this much faster
+MIN_GAIN = 1.05
+# Bytes measured before each tuning decision (at least WINDOW_CHUNKS chunks)
+WINDOW_BYTES = 32 * 1024 * 1024
+WINDOW_CHUNKS = 4
+
+
+def _round_down_pow2(value: int) -> int:
+    return 1 << (max(value, 1).bit_length() - 1)
+
+
+class ChunkSizer:
+    """Hands out a fixed chunk size."""
+
+    def __init__(self, size: int):
+        if not 0 < size <= 0xFFFFFFFF:
+            raise ValueError(f"Invalid chunk size {size}")
+        self.size = size
+
+    @property
+    def max_size(self) -> int:
+        """Upper bound of any size this sizer returns."""
+        return self.size
+
+    def next_size(self) -> int:
+        """Size of the next chunk to read."""
+        return self.size
+
+
+class AdaptiveChunkSizer(ChunkSizer):
+    """
+    Tunes the chunk size while a file is being processed.
+
+    The reader asks for a size before every chunk, so the time between two
+    calls is how long the pipeline took to accept a chunk. After each
+    measurement window the size is doubled for as long as throughput keeps
+    improving by MIN_GAIN; the first window that does not improve reverts to
+    the previous size, which is then kept for the rest of the file.
+    """
+
+    def __init__(self, size: int, max_size: int = MAX_CHUNK_SIZE,
+                 clock: Callable[[], float] = time.perf_counter):
+        super().__init__(size)
+        self._max_size = max(max_size, size)
+        self._clock = clock
+        self._best_rate: Optional[float] = None
+        self._settled = size >= self._max_size
+        self._last_call: Optional[float] = None
+        self._window_bytes = 0
+        self._window_chunks = 0
+        self._window_time = 0.0
+
+    @property
+    def max_size(self) -> int:
+        return self._max_size
+
+    def next_size(self) -> int:
+        now = self._clock()
+        if self._last_call is not None and not self._settled:
+            self._window_time += now - self._last_call
+            self._window_bytes += self.size
+            self._window_chunks += 1
+            if self._window_bytes >= WINDOW_BYTES and self._window_chunks >= WINDOW_CHUNKS:
+                self._tune()
+        self._last_call = now
+        return self.size
+
+    def _tune(self) -> None:
+        rate = self._window_bytes / self._window_time if self._window_time else float('inf')
+        self._window_bytes = self._window_chunks = 0
+        self._window_time = 0.0
+
+        if self._best_rate is None or rate >= self._best_rate * MIN_GAIN:
+            self._best_rate = rate
+            if self.size * 2 <= self._max_size:
+                self.size *= 2
+            else:
+                self._settled = True
+        else:
+            self.size //= 2
+            self._settled = True
+
+
+def initial_chunk_size(file_size: int, block_size: int = 4096) -> int:
+    """
+    Starting chunk size for a file.
+
+    Small files become a single chunk; larger files start with about
+    TARGET_CHUNKS chunks, rounded to a power of two and to whole filesystem
+    blocks, between MIN_CHUNK_SIZE and INITIAL_MAX_CHUNK_SIZE.
+    """
+    floor = max(MIN_CHUNK_SIZE, block_size)
+    size = _round_down_pow2(file_size // TARGET_CHUNKS)
+    size = min(max(size, floor), max(INITIAL_MAX_CHUNK_SIZE, floor))
+    return size - size % block_size if block_size and size > block_size else size
+
+
+def chunk_sizer(chunk_size: Optional[int], file_size: int,
+                block_size: int = 4096) -> ChunkSizer:
+    """
+    Build the sizer for one file.
+
+    Args:
+        chunk_size: Fixed chunk size in bytes, or None for adaptive sizing
+        file_size: Size of the input (0 if unknown, e.g. a pipe)
+        block_size: Preferred I/O size of the filesystem (``st_blksize``)
+    """
+    if chunk_size:
+        return ChunkSizer(chunk_size)
+    size = initial_chunk_size(file_size, block_size)
+    if file_size and file_size <= size:
+        return ChunkSizer(size)
+    return AdaptiveChunkSizer(size)
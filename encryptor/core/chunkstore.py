@@ -0,0 +1,503 @@
+"""Content-addressed chunk store with deduplication across files.
+
+In store mode a file's plaintext is cut into chunks at content-defined
+boundaries, so an insertion only changes the chunks around it. Each chunk
+is named by a keyed hash of its contents (HMAC-SHA256). A chunk already in
+the store costs no cipher work and no storage; a new one is encrypted once
+and written to ``chunks/<2 hex>/<64 hex>``. The file itself becomes a small
+recipe: an ordinary encrypted container (header metadata ``{"recipe": 1}``)
+listing the chunk ids and sizes.
+
+Boundaries are found at C speed: a regular expression finds a few keyed
+anchor bytes, and an anchor ends a chunk when the CRC32 of the window
+before it (seeded with a keyed value) has its low BOUNDARY_BITS bits clear.
+The anchors, the seed and the chunk names all derive from the store's data
+key, so chunk sizes and names reveal nothing to someone without the key
+beyond the sizes themselves.
+
+The store directory holds ``store.json`` (settings and the data key,
+wrapped under the key file like a file's data key), the chunks, and
+``index.db``, a SQLite index of every chunk with running totals for the
+dedup statistics.
+"""
+from pathlib import Path
+from typing import BinaryIO, Dict, Iterator, List, NamedTuple, Optional, Tuple, Union
+import hashlib
+import hmac
+import io
+import json
+import logging
+import os
+import re
+import sqlite3
+import struct
+import threading
+import uuid
+import zlib
+from cryptography.hazmat.primitives import hashes
+from cryptography.hazmat.primitives.kdf.hkdf import HKDF
+from .checkpoint import AtomicOutput
+from .ciphers import DATA_KEY_SIZE, SUITES_BY_ID, WrongKeyError
+from .compression import get_codec, pack_chunk, unpack_chunk
+from .container import ContainerError, ContainerReader, is_container
+from .crypto import CryptoManager
+from .file_ops import FileOperations
+from .metrics import NULL_METRICS, Metrics
+from .pipeline import ordered_map
+from .reader import EncryptedFileReader
+
+logger = logging.getLogger(__name__)
+
+STORE_FORMAT = 'file-encryptor-store'
+STORE_VERSION = 1
+RECIPE_VERSION = 1
+STORE_FILE = 'store.json'
+INDEX_FILE = 'index.db'
+CHUNKS_DIR = 'chunks'
+
+MIN_CHUNK = 16 * 1024
+MAX_CHUNK = 256 * 1024
+# Anchors occur about once per 128 bytes of random data, and one in
+# 2 ** BOUNDARY_BITS ends a chunk: about MIN_CHUNK + 64 KiB on average
+ANCHORS = 2
+BOUNDARY_BITS = 9
+# Bytes before an anchor that decide whether it is a boundary
+WINDOW = 32
+# Input read at a time while chunking
+READ_SIZE = 4 * 1024 * 1024
+# Index rows written before the index commits
+COMMIT_EVERY = 500
+
+_ENTRY = struct.Struct('>32sI')
+# Recipe entries decrypted at a time while a recipe is read
+RECIPE_READ_ENTRIES = 4096
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS chunks (
+    id BLOB PRIMARY KEY,
+    size INTEGER NOT NULL,
+    stored_size INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS totals (
+    name TEXT PRIMARY KEY,
+    value INTEGER NOT NULL
+);
+"""
+
+
+def _derive(data_key: bytes, purpose: bytes) -> bytes:
+    return HKDF(algorithm=hashes.SHA256(), length=32, salt=None,
+                info=b"file-encryptor/store/" + purpose).derive(data_key)
+
+
+class ContentChunker:
+    """Splits a stream at content-defined boundaries."""
+
+    def __init__(self, anchors: bytes, seed: int, min_size: int = MIN_CHUNK,
+                 max_size: int = MAX_CHUNK, bits: int = BOUNDARY_BITS):
+        """
+        Args:
+            anchors: Byte values that may end a chunk
+            seed: Initial CRC32 value for the boundary test
+            min_size: Smallest chunk (except a file's last one)
+            max_size: Largest chunk; data without boundaries is cut here
+            bits: Low CRC bits that must be zero at a boundary
+        """
+        if not WINDOW <= min_size <= max_size:
+            raise ValueError(f"Chunk sizes must satisfy {WINDOW} <= min_size <= max_size")
+        self._anchors = re.compile(b'[' + b''.join(re.escape(bytes([a])) for a in anchors) + b']')
+        self._seed = seed
+        self._mask = (1 << bits) - 1
+        self.min_size = min_size
+        self.max_size = max_size
+
+    def _boundary(self, buffer: bytes, view: memoryview, pos: int, final: bool) -> Optional[int]:
+        """End of the chunk starting at ``pos``, or None if more data is needed."""
+        size = len(buffer)
+        if pos >= size:
+            return None
+        limit = min(pos + self.max_size, size)
+        crc, seed, mask = zlib.crc32, self._seed, self._mask
+        for match in self._anchors.finditer(buffer, pos + self.min_size - 1, limit):
+            end = match.end()
+            if not crc(view[end - WINDOW:end], seed) & mask:
+                return end
+        if limit < pos + self.max_size and not final:
+            return None
+        return limit
+
+    def split(self, stream: BinaryIO, read_size: int = READ_SIZE) -> Iterator[bytes]:
+        """Yield the chunks of everything left in ``stream``."""
+        buffer, pos = b"", 0
+        while True:
+            block = stream.read(read_size)
+            final = not block
+            buffer = buffer[pos:] + block if block else buffer[pos:]
+            view, pos = memoryview(buffer), 0
+            while True:
+                end = self._boundary(buffer, view, pos, final)
+                if end is None:
+                    break
+                yield buffer[pos:end]
+                pos = end
+            view.release()
+            if final:
+                return
+
+    def split_bytes(self, data: bytes) -> List[bytes]:
+        """Return the chunks of ``data``."""
+        return list(self.split(io.BytesIO(data)))
+
+
+class StoreStats(NamedTuple):
+    """Running totals of a chunk store."""
+    files: int
+    logical_bytes: int
+    chunks: int
+    unique_bytes: int
+    stored_bytes: int
+
+    @property
+    def dedup_ratio(self) -> float:
+        """Plaintext bytes stored per unique plaintext byte kept."""
+        return self.logical_bytes / self.unique_bytes if self.unique_bytes else 1.0
+
+    @property
+    def saved_bytes(self) -> int:
+        """Plaintext bytes that deduplication kept from being stored again."""
+        return self.logical_bytes - self.unique_bytes
+
+    def as_dict(self) -> dict:
+        return dict(self._asdict(), dedup_ratio=self.dedup_ratio, saved_bytes=self.saved_bytes)
+
+    def __str__(self) -> str:
+        return (f"{self.files} files, {self.logical_bytes} bytes in {self.chunks} unique "
+                f"chunks of {self.unique_bytes} bytes ({self.stored_bytes} stored): "
+                f"dedup ratio {self.dedup_ratio:.2f}x, {self.saved_bytes} bytes saved")
+
+
+def read_stats(root: Union[str, Path]) -> StoreStats:
+    """Read a store's statistics from its index (no key needed)."""
+    path = Path(root) / INDEX_FILE
+    if not path.exists():
+        raise ValueError(f"{root} is not a chunk store")
+    db = sqlite3.connect(str(path))
+    try:
+        return _stats(db)
+    finally:
+        db.close()
+
+
+def _stats(db: sqlite3.Connection) -> StoreStats:
+    totals = dict(db.execute("SELECT name, value FROM totals"))
+    chunks, unique, stored = db.execute(
+        "SELECT COUNT(*), COALESCE(SUM(size), 0), COALESCE(SUM(stored_size), 0) FROM chunks"
+    ).fetchone()
+    return StoreStats(totals.get('files', 0), totals.get('logical_bytes', 0),
+                      chunks, unique, stored)
+
+
+class _EntryStream:
+    """Read-only stream over packed recipe entries, produced as they are read."""
+
+    def __init__(self, entries: Iterator[bytes]):
+        self._entries = entries
+        self._buffer = b""
+
+    def read(self, size: int = -1) -> bytes:
+        parts, have = [self._buffer], len(self._buffer)
+        while size is None or size < 0 or have < size:
+            entry = next(self._entries, None)
+            if entry is None:
+                break
+            parts.append(entry)
+            have += len(entry)
+        data = b"".join(parts)
+        if size is None or size < 0:
+            size = len(data)
+        self._buffer = data[size:]
+        return data[:size]
+
+
+def _read_settings(root: Union[str, Path]) -> dict:
+    path = Path(root) / STORE_FILE
+    try:
+        settings = json.loads(path.read_text())
+    except (OSError, ValueError):
+        settings = None
+    if not isinstance(settings, dict) or settings.get('format') != STORE_FORMAT:
+        raise ValueError(f"{root} is not a chunk store")
+    return settings
+
+
+def _write_settings(path: Path, settings: dict) -> None:
+    with AtomicOutput(path) as output:
+        output.file.write(json.dumps(settings, indent=2).encode())
+
+
+def rewrap_store(root: Union[str, Path], old_crypto: CryptoManager,
+                 new_crypto: CryptoManager) -> Tuple[str, bool]:
+    """
+    Move a chunk store to a new key file by rewrapping its data key.
+
+    Chunks are encrypted under the store's data key, so only ``store.json``
+    is rewritten (atomically). Recipes are ordinary containers and are
+    rekeyed like any other file.
+
+    Args:
+        root: Store directory
+        old_crypto: CryptoManager holding the current key
+        new_crypto: CryptoManager holding the new key
+
+    Returns:
+        The store ID, and False if the new key already unwraps the data key
+
+    Raises:
+        WrongKeyError: Neither key unwraps the data key
+    """
+    settings = _read_settings(root)
+    cipher_id = settings['cipher']
+    try:
+        data_key = old_crypto.unwrap_key(settings['data_key'], cipher_id)
+    except WrongKeyError:
+        # Already rotated, e.g. by an earlier run that was interrupted
+        new_crypto.unwrap_key(settings['data_key'], cipher_id)
+        return settings['id'], False
+    settings['data_key'] = new_crypto.wrap_key(data_key, cipher_id)
+    _write_settings(Path(root) / STORE_FILE, settings)
+    return settings['id'], True
+
+
+def is_recipe(path: Union[str, Path]) -> bool:
+    """True if ``path`` is a chunk store recipe (judged from its container header)."""
+    try:
+        with open(path, 'rb') as f:
+            if not is_container(f.read(4)):
+                return False
+            f.seek(0)
+            return 'recipe' in ContainerReader(f).header.metadata
+    except (OSError, ValueError):
+        return False
+
+
+class ChunkStore:
+    """
+    A directory of encrypted, deduplicated chunks shared by many files.
+
+    Thread-safe: the workers of a batch run store files concurrently.
+    """
+
+    def __init__(self, root: Union[str, Path], crypto: CryptoManager,
+                 compression: Optional[str] = None, metrics: Optional[Metrics] = None):
+        """
+        Open a store, creating it if ``root`` holds none yet.
+
+        Args:
+            root: Store directory
+            crypto: CryptoManager holding the key; a new store uses its cipher
+            compression: Codec for the chunks of a new store (an existing
+                store keeps the one it was created with)
+            metrics: Receives ``fenc_store_chunks_total{status}`` counts
+        """
+        self.root = Path(root)
+        self.crypto = crypto
+        self.metrics = metrics or NULL_METRICS
+        settings = self._open_settings(compression)
+        self.id = settings['id']
+        self.cipher_id = settings['cipher']
+        self.compression = settings['compression']
+        if compression is not None and compression != self.compression:
+            raise ValueError(f"{root} was created with compression {self.compression!r}")
+        self._codec = get_codec(self.compression)
+        data_key = crypto.unwrap_key(settings['data_key'], self.cipher_id)
+        self._suite = SUITES_BY_ID[self.cipher_id](data_key)
+        self._id_key = _derive(data_key, b"chunk-id")
+        boundary = _derive(data_key, b"chunk-boundary")
+        anchors = bytes(1 + byte % 254 for byte in boundary[:ANCHORS])
+        self.chunker = ContentChunker(anchors, int.from_bytes(boundary[-4:], 'big'))
+        self._lock = threading.Lock()
+        self._pending = 0
+        self._db = sqlite3.connect(str(self.root / INDEX_FILE), check_same_thread=False,
+                                   timeout=60)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.executescript(_SCHEMA)
+        self._db.commit()
+
+    def _open_settings(self, compression: Optional[str]) -> dict:
+        path = self.root / STORE_FILE
+        if path.exists():
+            return _read_settings(self.root)
+        get_codec(compression)
+        cipher_id = self.crypto.cipher.id
+        settings = {
+            'format': STORE_FORMAT,
+            'version': STORE_VERSION,
+            'id': uuid.uuid4().hex,
+            'cipher': cipher_id,
+            'compression': compression,
+            'data_key': self.crypto.wrap_key(os.urandom(DATA_KEY_SIZE), cipher_id),
+        }
+        (self.root / CHUNKS_DIR).mkdir(parents=True, exist_ok=True)
+        _write_settings(path, settings)
+        return settings
+
+    def chunk_id(self, data: bytes) -> bytes:
+        """Keyed content hash naming a chunk."""
+        return hmac.new(self._id_key, data, hashlib.sha256).digest()
+
+    def chunk_path(self, chunk_id: bytes) -> Path:
+        name = chunk_id.hex()
+        return self.root / CHUNKS_DIR / name[:2] / name
+
+    def _known(self, chunk_id: bytes) -> bool:
+        with self._lock:
+            row = self._db.execute("SELECT 1 FROM chunks WHERE id = ?", (chunk_id,)).fetchone()
+        # A chunk lost after a crash is written again
+        return row is not None and self.chunk_path(chunk_id).exists()
+
+    def put(self, data: bytes) -> Tuple[bytes, bool]:
+        """
+        Store one chunk unless the store already has it.
+
+        Returns:
+            The chunk id, and whether the chunk was new
+        """
+        chunk_id = self.chunk_id(data)
+        if self._known(chunk_id):
+            self.metrics.inc('fenc_store_chunks_total', status='duplicate')
+            return chunk_id, False
+        payload = pack_chunk(self._codec, data) if self._codec is not None else data
+        token = self._suite.encrypt_chunk(payload)
+        path = self.chunk_path(chunk_id)
+        path.parent.mkdir(exist_ok=True)
+        temporary = path.with_name(f"{path.name}.{threading.get_ident()}.tmp")
+        with open(temporary, 'wb') as f:
+            f.write(token)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temporary, path)
+        with self._lock:
+            self._db.execute("INSERT OR REPLACE INTO chunks VALUES (?, ?, ?)",
+                             (chunk_id, len(data), len(token)))
+            self._pending += 1
+            if self._pending >= COMMIT_EVERY:
+                self._db.commit()
+                self._pending = 0
+        self.metrics.inc('fenc_store_chunks_total', status='new')
+        return chunk_id, True
+
+    def get(self, chunk_id: bytes, size: int) -> bytes:
+        """Read, decrypt and check one chunk of ``size`` plaintext bytes."""
+        try:
+            token = self.chunk_path(chunk_id).read_bytes()
+        except FileNotFoundError:
+            raise ContainerError(f"Chunk {chunk_id.hex()} is missing from the store") from None
+        payload = self._suite.decrypt_chunk(token)
+        data = unpack_chunk(self._codec, payload, size) if self._codec is not None else payload
+        if len(data) != size or not hmac.compare_digest(self.chunk_id(data), chunk_id):
+            raise ContainerError(f"Chunk {chunk_id.hex()} does not match its id")
+        return data
+
+    def store_stream(self, infile: BinaryIO, outfile: BinaryIO, jobs: int = 1) -> int:
+        """
+        Store a stream's chunks and write its encrypted recipe to ``outfile``.
+
+        Recipe entries are encrypted as the chunks are stored, so memory does
+        not grow with the size of the input.
+
+        Args:
+            infile: Binary input stream
+            outfile: Binary output stream for the recipe container
+            jobs: Chunks hashed and encrypted concurrently (threads)
+
+        Returns:
+            Number of plaintext bytes stored
+        """
+        size = 0
+
+        def entries() -> Iterator[bytes]:
+            nonlocal size
+            for chunk_id, length in ordered_map(self._put_chunk, self.chunker.split(infile),
+                                                jobs, 'thread'):
+                size += length
+                yield _ENTRY.pack(chunk_id, length)
+
+        try:
+            remaining = max(os.fstat(infile.fileno()).st_size - infile.tell(), 0)
+        except (AttributeError, OSError, ValueError):
+            remaining = 0
+        # At most one entry per MIN_CHUNK; only used to size the recipe's chunks
+        estimate = (remaining // self.chunker.min_size + 1) * _ENTRY.size
+        FileOperations.encrypt_stream(_EntryStream(entries()), outfile, self.crypto,
+                                      total_size=estimate,
+                                      metadata={'recipe': RECIPE_VERSION, 'store': self.id})
+        with self._lock:
+            for name, value in (('files', 1), ('logical_bytes', size)):
+                self._db.execute("INSERT INTO totals VALUES (?, ?) ON CONFLICT(name) "
+                                 "DO UPDATE SET value = value + excluded.value", (name, value))
+                self._pending += 1
+            if self._pending >= COMMIT_EVERY:
+                self._db.commit()
+                self._pending = 0
+        return size
+
+    def _put_chunk(self, data: bytes) -> Tuple[bytes, int]:
+        return self.put(data)[0], len(data)
+
+    def store_file(self, input_path: Union[str, Path], output_path: Union[str, Path],
+                   jobs: int = 1) -> int:
+        """Store a file; its recipe replaces ``output_path`` atomically."""
+        with open(input_path, 'rb') as infile, AtomicOutput(output_path) as output:
+            return self.store_stream(infile, output.file, jobs)
+
+    def read_recipe(self, path: Union[str, Path]) -> Iterator[Tuple[bytes, int]]:
+        """Yield the ``(chunk id, size)`` entries of a recipe file as it is decrypted."""
+        with EncryptedFileReader(path, self.crypto) as reader:
+            while True:
+                block = reader.read(RECIPE_READ_ENTRIES * _ENTRY.size)
+                if len(block) % _ENTRY.size:
+                    raise ContainerError(
+                        "Recipe is damaged - its length is not a whole number of entries")
+                if not block:
+                    return
+                yield from _ENTRY.iter_unpack(block)
+
+    def restore_file(self, recipe_path: Union[str, Path], output_path: Union[str, Path],
+                     jobs: int = 1) -> int:
+        """
+        Rebuild a file from its recipe.
+
+        Returns:
+            Number of plaintext bytes written
+        """
+        with open(recipe_path, 'rb') as f:
+            meta = ContainerReader(f).header.metadata
+        if meta.get('store') != self.id:
+            raise ContainerError(f"{recipe_path} belongs to another chunk store")
+        written = 0
+        with AtomicOutput(output_path) as output:
+            for data in ordered_map(self._get_entry, self.read_recipe(recipe_path), jobs,
+                                    'thread'):
+                output.file.write(data)
+                written += len(data)
+        return written
+
+    def _get_entry(self, entry: Tuple[bytes, int]) -> bytes:
+        return self.get(*entry)
+
+    def stats(self) -> StoreStats:
+        """Current totals, including this session's uncommitted rows."""
+        with self._lock:
+            return _stats(self._db)
+
+    def close(self) -> None:
+        """Commit the index and close it."""
+        with self._lock:
+            self._db.commit()
+            self._db.close()
+
+    def __enter__(self) -> 'ChunkStore':
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
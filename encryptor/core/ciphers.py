@@ -0,0 +1,307 @@
+"""Cipher suites used to encrypt the chunks of a container file.
+
+Every suite is built from the same 32-byte master key (the decoded Fernet key
+stored in the key file). AEAD suites derive their own subkey with HKDF, so
+one key file works with every suite. The suite ID is stored in the container
+header, which lets decryption pick the right suite on its own.
+
+Every suite binds each chunk to its position: the chunk number and a
+"last chunk" flag are authenticated with it, so reordered, duplicated or
+truncated chunks fail to decrypt. AEAD suites pass them as associated data,
+the Fernet suite encrypts them as a prefix of each chunk's plaintext. The
+original Fernet suite (ID 0) did neither; it is kept, under the name
+``fernet-legacy``, only to read containers written with it.
+
+With envelope encryption a file's chunks are encrypted under a random
+per-file data key instead, and KeyWrapper stores that key in the header
+wrapped under the master key. Changing the master key then only means
+rewrapping the data key.
+
+Records (small in-memory blobs, see ``encryptor.core.records``) are
+encrypted like a file consisting of one chunk, but each token starts with a
+short header (the suite ID and key salt) because there is no container
+header to hold them.
+"""
+from cryptography.exceptions import InvalidSignature, InvalidTag
+from cryptography.hazmat.primitives import hashes, padding
+from cryptography.hazmat.primitives.ciphers import Cipher, algorithms, modes
+from cryptography.hazmat.primitives.ciphers.aead import AESGCM, ChaCha20Poly1305
+from cryptography.hazmat.primitives.hmac import HMAC
+from cryptography.hazmat.primitives.kdf.hkdf import HKDF
+from typing import Dict, List, Sequence, Type
+import base64
+import binascii
+import os
+import struct
+import time
+
+_POSITION = struct.Struct(">QB")
+# Records are authenticated as the last (and only) chunk 0
+_RECORD_POSITION = _POSITION.pack(0, True)
+DATA_KEY_SIZE = 32
+
+
+class WrongKeyError(ValueError):
+    """Raised when a file's data key cannot be unwrapped with the given key."""
+
+
+class RecordError(ValueError):
+    """Raised when a record token does not decrypt; ``index`` is its position in the batch."""
+
+    def __init__(self, index: int):
+        super().__init__(f"Record {index} failed to decrypt - invalid key or corrupted data")
+        self.index = index
+
+
+class CipherSuite:
+    """Base class for chunk cipher suites."""
+
+    id: int = -1
+    name: str = ""
+    binds_position: bool = False
+
+    def __init__(self, master_key: bytes):
+        self.master_key = master_key
+
+    def __reduce__(self):
+        # Rebuild from the master key so suites can be sent to worker processes
+        return self.__class__, (self.master_key,)
+
+    def ciphertext_size(self, plain_len: int) -> int:
+        """Size of the ciphertext produced for ``plain_len`` bytes of plaintext."""
+        raise NotImplementedError
+
+    def encrypt_chunk(self, data: bytes, number: int = 0, last: bool = True) -> bytes:
+        """Encrypt chunk ``number`` of a file."""
+        raise NotImplementedError
+
+    def decrypt_chunk(self, token: bytes, number: int = 0, last: bool = True) -> bytes:
+        """Decrypt chunk ``number`` of a file; raise ValueError if it does not authenticate."""
+        raise NotImplementedError
+
+    def verify_chunk(self, token: bytes, number: int = 0, last: bool = True) -> None:
+        """
+        Authenticate chunk ``number`` without keeping its plaintext.
+
+        Raises ValueError like decrypt_chunk. Suites whose MAC can be checked
+        on its own override this to skip decryption.
+        """
+        self.decrypt_chunk(token, number, last)
+
+    def encrypt_records(self, records: Sequence[bytes], header: bytes) -> List[bytes]:
+        """Encrypt independent records into tokens that each start with ``header``."""
+        return [header + self.encrypt_chunk(record) for record in records]
+
+    def decrypt_records(self, tokens: Sequence[bytes], header_size: int) -> List[bytes]:
+        """Decrypt tokens from encrypt_records; raise RecordError for the first bad one."""
+        records = []
+        for index, token in enumerate(tokens):
+            try:
+                records.append(self.decrypt_chunk(token[header_size:]))
+            except ValueError as e:
+                raise RecordError(index) from e
+        return records
+
+
+class FernetSuite(CipherSuite):
+    """
+    Fernet (AES-128-CBC + HMAC-SHA256) without the base64 layer.
+
+    Each chunk is a standard Fernet token in raw binary form. This suite does
+    not bind chunks to their position; new files use PositionalFernetSuite.
+    """
+
+    id = 0
+    name = 'fernet-legacy'
+
+    def __init__(self, master_key: bytes):
+        super().__init__(master_key)
+        self._signing_key = master_key[:16]
+        self._encryption_key = master_key[16:]
+
+    def ciphertext_size(self, plain_len: int) -> int:
+        return 57 + (plain_len // 16 + 1) * 16
+
+    def encrypt_chunk(self, data: bytes, number: int = 0, last: bool = True) -> bytes:
+        return self._encrypt(b"", data)
+
+    def _encrypt(self, prefix: bytes, data: bytes) -> bytes:
+        iv = os.urandom(16)
+        # The prefix and PKCS7 padding are fed straight to the cipher to avoid copying data
+        pad = 16 - (len(prefix) + len(data)) % 16
+        encryptor = Cipher(algorithms.AES(self._encryption_key), modes.CBC(iv)).encryptor()
+        ciphertext = (encryptor.update(prefix) + encryptor.update(data)
+                      + encryptor.update(bytes([pad]) * pad) + encryptor.finalize())
+
+        token = b"\x80" + struct.pack(">Q", int(time.time())) + iv + ciphertext
+        mac = HMAC(self._signing_key, hashes.SHA256())
+        mac.update(token)
+        return token + mac.finalize()
+
+    def _check_mac(self, token: bytes) -> None:
+        if len(token) < 73 or token[0] != 0x80 or (len(token) - 57) % 16:
+            raise InvalidSignature("malformed token")
+        mac = HMAC(self._signing_key, hashes.SHA256())
+        mac.update(token[:-32])
+        mac.verify(bytes(token[-32:]))
+
+    def decrypt_chunk(self, token: bytes, number: int = 0, last: bool = True) -> bytes:
+        try:
+            self._check_mac(token)
+            decryptor = Cipher(
+                algorithms.AES(self._encryption_key), modes.CBC(bytes(token[9:25]))
+            ).decryptor()
+            padded = decryptor.update(token[25:-32]) + decryptor.finalize()
+            unpadder = padding.PKCS7(algorithms.AES.block_size).unpadder()
+            return unpadder.update(padded) + unpadder.finalize()
+        except (InvalidSignature, ValueError) as e:
+            raise ValueError("Decryption failed - invalid key or corrupted data") from e
+
+    def verify_chunk(self, token: bytes, number: int = 0, last: bool = True) -> None:
+        # Encrypt-then-MAC: the HMAC covers the whole token, so AES is not needed
+        try:
+            self._check_mac(token)
+        except InvalidSignature as e:
+            raise ValueError("Decryption failed - invalid key or corrupted data") from e
+
+
+class PositionalFernetSuite(FernetSuite):
+    """
+    Fernet tokens whose plaintext starts with the chunk's position.
+
+    The chunk number and "last chunk" flag (9 bytes) are encrypted in front
+    of the data, so the token's HMAC covers them and decryption checks them
+    against the position the chunk was read from.
+    """
+
+    id = 3
+    name = 'fernet'
+    binds_position = True
+
+    def ciphertext_size(self, plain_len: int) -> int:
+        return super().ciphertext_size(_POSITION.size + plain_len)
+
+    def encrypt_chunk(self, data: bytes, number: int = 0, last: bool = True) -> bytes:
+        return self._encrypt(_POSITION.pack(number, last), data)
+
+    def decrypt_chunk(self, token: bytes, number: int = 0, last: bool = True) -> bytes:
+        plaintext = super().decrypt_chunk(token)
+        if plaintext[:_POSITION.size] != _POSITION.pack(number, last):
+            raise ValueError("Decryption failed - chunk is out of place")
+        return plaintext[_POSITION.size:]
+
+    def verify_chunk(self, token: bytes, number: int = 0, last: bool = True) -> None:
+        super().verify_chunk(token)
+        # The position fits in the first AES block, so only that block is decrypted
+        decryptor = Cipher(
+            algorithms.AES(self._encryption_key), modes.CBC(bytes(token[9:25]))
+        ).decryptor()
+        if decryptor.update(token[25:41])[:_POSITION.size] != _POSITION.pack(number, last):
+            raise ValueError("Decryption failed - chunk is out of place")
+
+
+class _AEADSuite(CipherSuite):
+    """AEAD suite with a random 96-bit nonce stored in front of each chunk."""
+
+    binds_position = True
+    _aead_class = None
+
+    def __init__(self, master_key: bytes):
+        super().__init__(master_key)
+        subkey = HKDF(
+            algorithm=hashes.SHA256(), length=32, salt=None,
+            info=b"file-encryptor/" + self.name.encode(),
+        ).derive(master_key)
+        self._aead = self._aead_class(subkey)
+
+    def ciphertext_size(self, plain_len: int) -> int:
+        return plain_len + 28
+
+    def encrypt_chunk(self, data: bytes, number: int = 0, last: bool = True) -> bytes:
+        nonce = os.urandom(12)
+        return nonce + self._aead.encrypt(nonce, data, _POSITION.pack(number, last))
+
+    def decrypt_chunk(self, token: bytes, number: int = 0, last: bool = True) -> bytes:
+        try:
+            return self._aead.decrypt(token[:12], token[12:], _POSITION.pack(number, last))
+        except (InvalidTag, ValueError) as e:
+            raise ValueError("Decryption failed - invalid key or corrupted data") from e
+
+    def encrypt_records(self, records: Sequence[bytes], header: bytes) -> List[bytes]:
+        count = len(records)
+        start = len(header)
+        step = start + 12
+        # All nonces from one urandom call, each slot led by the header
+        heads = bytearray(os.urandom(step * count))
+        for i, value in enumerate(header):
+            heads[i::step] = bytes([value]) * count
+        heads = bytes(heads)
+        encrypt = self._aead.encrypt
+        tokens = []
+        append = tokens.append
+        for offset, record in zip(range(0, step * count, step), records):
+            append(heads[offset:offset + step]
+                   + encrypt(heads[offset + start:offset + step], record, _RECORD_POSITION))
+        return tokens
+
+    def decrypt_records(self, tokens: Sequence[bytes], header_size: int) -> List[bytes]:
+        decrypt = self._aead.decrypt
+        body = header_size + 12
+        records = []
+        append = records.append
+        try:
+            for token in tokens:
+                append(decrypt(token[header_size:body], token[body:], _RECORD_POSITION))
+        except (InvalidTag, ValueError) as e:
+            raise RecordError(len(records)) from e
+        return records
+
+
+class AESGCMSuite(_AEADSuite):
+    """AES-256-GCM; hardware accelerated on CPUs with AES-NI/ARMv8 crypto."""
+
+    id = 1
+    name = 'aes-256-gcm'
+    _aead_class = AESGCM
+
+
+class ChaCha20Poly1305Suite(_AEADSuite):
+    """ChaCha20-Poly1305; fast on CPUs without AES instructions."""
+
+    id = 2
+    name = 'chacha20-poly1305'
+    _aead_class = ChaCha20Poly1305
+
+
+# Suites new files can be written with; FernetSuite is only read
+SUITES: Dict[str, Type[CipherSuite]] = {
+    suite.name: suite for suite in (PositionalFernetSuite, AESGCMSuite, ChaCha20Poly1305Suite)
+}
+SUITES_BY_ID: Dict[int, Type[CipherSuite]] = {
+    suite.id: suite for suite in (FernetSuite, *SUITES.values())
+}
+DEFAULT_CIPHER = AESGCMSuite.name
+
+
+class KeyWrapper:
+    """Wraps per-file data keys under a master key (AES-256-GCM, HKDF subkey)."""
+
+    def __init__(self, master_key: bytes):
+        self._aead = AESGCM(HKDF(
+            algorithm=hashes.SHA256(), length=32, salt=None, info=b"file-encryptor/key-wrap",
+        ).derive(master_key))
+
+    def wrap(self, data_key: bytes, cipher_id: int) -> str:
+        """Wrap ``data_key`` for a file using suite ``cipher_id``; returns base64 text."""
+        nonce = os.urandom(12)
+        wrapped = nonce + self._aead.encrypt(nonce, data_key, bytes([cipher_id]))
+        return base64.b64encode(wrapped).decode('ascii')
+
+    def unwrap(self, wrapped: str, cipher_id: int) -> bytes:
+        """Recover a data key; raise WrongKeyError if this is the wrong master key."""
+        try:
+            data = base64.b64decode(wrapped, validate=True)
+            return self._aead.decrypt(data[:12], data[12:], bytes([cipher_id]))
+        except (binascii.Error, InvalidTag, TypeError, ValueError) as e:
+            raise WrongKeyError("Cannot unwrap the file's data key - "
+                                "invalid key or corrupted header") from e
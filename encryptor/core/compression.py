@@ -0,0 +1,151 @@
+"""Optional per-chunk compression applied before encryption.
+
+The codec is named in the container metadata (``{"compression": name}``).
+Every chunk's plaintext then starts with one marker byte: STORED chunks
+hold the original bytes, COMPRESSED chunks hold codec output. A chunk is
+stored whenever compressing it does not pay off, so already-compressed or
+random data costs one byte per chunk and, thanks to a quick trial on a
+sample, very little CPU. Chunks stay independent, so parallel processing
+and random access work as without compression.
+
+zlib and lzma come with Python; zstd is used when the ``zstandard``
+package is installed. Codec modules are imported the first time a codec
+is used, so loading this module (and the file pipeline) stays cheap.
+"""
+from importlib import import_module
+from importlib.util import find_spec
+from typing import Dict, Optional
+
+STORED = 0
+COMPRESSED = 1
+# Compress only if the output is at most this fraction of the input
+MAX_RATIO = 0.9
+# Bytes compressed as a trial before committing to a whole chunk
+SAMPLE_SIZE = 4096
+
+
+class Codec:
+    """Base class for chunk compression codecs."""
+
+    name: str = ""
+    # Module implementing the codec, imported on first use
+    module: str = ""
+    _lib = None
+
+    @property
+    def lib(self):
+        if self._lib is None:
+            self._lib = import_module(self.module)
+        return self._lib
+
+    def compress(self, data) -> bytes:
+        raise NotImplementedError
+
+    def decompress(self, data, max_size: int) -> bytes:
+        """Decompress ``data``, refusing output larger than ``max_size``."""
+        raise NotImplementedError
+
+
+class ZlibCodec(Codec):
+    name = 'zlib'
+    module = 'zlib'
+    level = 6
+
+    def compress(self, data) -> bytes:
+        return self.lib.compress(data, self.level)
+
+    def decompress(self, data, max_size: int) -> bytes:
+        decompressor = self.lib.decompressobj()
+        result = decompressor.decompress(data, max_size)
+        if decompressor.unconsumed_tail or not decompressor.eof:
+            raise ValueError("Compressed chunk is corrupt or larger than the chunk size")
+        return result
+
+
+class LzmaCodec(Codec):
+    name = 'lzma'
+    module = 'lzma'
+    preset = 6
+
+    def compress(self, data) -> bytes:
+        lzma = self.lib
+        return lzma.compress(data, format=lzma.FORMAT_XZ, preset=self.preset)
+
+    def decompress(self, data, max_size: int) -> bytes:
+        lzma = self.lib
+        decompressor = lzma.LZMADecompressor()
+        try:
+            result = decompressor.decompress(data, max_size)
+        except lzma.LZMAError as e:
+            raise ValueError(f"Compressed chunk is corrupt: {e}") from e
+        if not decompressor.eof:
+            raise ValueError("Compressed chunk is corrupt or larger than the chunk size")
+        return result
+
+
+class ZstdCodec(Codec):
+    name = 'zstd'
+    module = 'zstandard'
+    level = 3
+
+    def compress(self, data) -> bytes:
+        return self.lib.ZstdCompressor(level=self.level).compress(data)
+
+    def decompress(self, data, max_size: int) -> bytes:
+        zstandard = self.lib
+        try:
+            return zstandard.ZstdDecompressor().decompress(data, max_output_size=max_size)
+        except zstandard.ZstdError as e:
+            raise ValueError(f"Compressed chunk is corrupt: {e}") from e
+
+
+CODECS: Dict[str, Codec] = {codec.name: codec for codec in (
+    ZlibCodec(), LzmaCodec(), *((ZstdCodec(),) if find_spec('zstandard') is not None else ())
+)}
+DEFAULT_CODEC = 'zstd' if 'zstd' in CODECS else 'zlib'
+
+
+def get_codec(name: Optional[str]) -> Optional[Codec]:
+    """Return the codec called ``name`` (None for no compression)."""
+    if name is None:
+        return None
+    codec = CODECS.get(name)
+    if codec is None:
+        raise ValueError(f"Compression {name!r} is not available, expected one of "
+                         f"{', '.join(CODECS)}")
+    return codec
+
+
+def codec_for(header) -> Optional[Codec]:
+    """Return the codec recorded in a ContainerHeader, if any."""
+    return get_codec(header.metadata.get('compression'))
+
+
+def worth_compressing(codec: Codec, data) -> bool:
+    """Cheap check on a sample whether ``data`` is likely to compress."""
+    if len(data) <= SAMPLE_SIZE:
+        return True
+    middle = len(data) // 2
+    sample = data[middle:middle + SAMPLE_SIZE]
+    return len(codec.compress(sample)) <= len(sample) * MAX_RATIO
+
+
+def pack_chunk(codec: Codec, data) -> bytes:
+    """Marker byte plus either the compressed or the original chunk."""
+    if data and worth_compressing(codec, data):
+        compressed = codec.compress(data)
+        if len(compressed) <= len(data) * MAX_RATIO:
+            return bytes((COMPRESSED,)) + compressed
+    return bytes((STORED,)) + bytes(data)
+
+
+def unpack_chunk(codec: Codec, payload, max_size: int) -> bytes:
+    """Reverse pack_chunk; ``max_size`` bounds the decompressed size."""
+    if not payload:
+        raise ValueError("Compressed chunk is missing its marker byte")
+    marker, body = payload[0], payload[1:]
+    if marker == STORED:
+        return bytes(body)
+    if marker == COMPRESSED:
+        return codec.decompress(body, max_size)
+    raise ValueError(f"Unknown chunk marker {marker}")
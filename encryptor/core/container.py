@@ -0,0 +1,325 @@
+"""Versioned binary container for encrypted files.
+
+An ``.enc`` file is laid out as::
+
+    header   MAGIC(4) | version(1) | cipher(1) | flags(2) | chunk_size(4) | meta_len(2) | meta
+    frames   length(4) | ciphertext                      (one per chunk)
+    end      length(4) == 0
+    index    offset(8) | plain_len(4)                    (one per chunk)
+    footer   index_offset(8) | chunk_count(4) | END_MAGIC(4)
+
+All integers are big-endian. ``chunk_size`` is the largest plaintext chunk
+in the file; chunks may be smaller, and each one's plaintext length is kept
+in the index. Every chunk is an independently authenticated
+ciphertext, so the trailing index lets any chunk be decrypted by offset
+without touching the chunks before it. The footer has a fixed size and can
+always be found by seeking to the end of the file.
+
+Streams of unknown length (e.g. stdin) are written with FLAG_UNINDEXED: the
+index is left empty (chunk_count 0), so neither side has to keep one entry
+per chunk in memory. Such files can only be read sequentially.
+"""
+import json
+import struct
+from typing import BinaryIO, Callable, Iterator, List, NamedTuple, Optional, Tuple
+
+MAGIC = b"FENC"
+END_MAGIC = b"FEND"
+VERSION = 1
+
+# Header flags
+FLAG_UNINDEXED = 0x0001
+
+_HEADER = struct.Struct(">4sBBHIH")
+_FRAME_LEN = struct.Struct(">I")
+_INDEX_ENTRY = struct.Struct(">QI")
+_FOOTER = struct.Struct(">QI4s")
+
+# Legacy files are plain Fernet tokens written back to back, one per chunk.
+LEGACY_CHUNK_SIZE = 64 * 1024
+LEGACY_TOKEN_PREFIX = b"gAAAAA"
+
+
+class ContainerError(ValueError):
+    """Raised when an encrypted file is malformed or truncated."""
+
+
+class TruncatedError(ContainerError):
+    """Raised when an encrypted file ends before its structure is complete."""
+
+
+class ContainerHeader(NamedTuple):
+    version: int
+    cipher: int
+    flags: int
+    chunk_size: int
+    meta: bytes
+
+    @property
+    def size(self) -> int:
+        """Number of bytes the header occupies on disk."""
+        return _HEADER.size + len(self.meta)
+
+    @property
+    def metadata(self) -> dict:
+        """The ``meta`` bytes decoded (see encode_meta)."""
+        if not self.meta:
+            return {}
+        try:
+            return json.loads(bytes(self.meta))
+        except ValueError as e:
+            raise ContainerError("Container metadata is corrupt") from e
+
+    @property
+    def indexed(self) -> bool:
+        """False for streamed containers written without a chunk index."""
+        return not self.flags & FLAG_UNINDEXED
+
+
+# Sizes of the fixed-size parts, for readers that do their own I/O (e.g. asyncio)
+HEADER_SIZE = _HEADER.size
+FRAME_LEN_SIZE = _FRAME_LEN.size
+INDEX_ENTRY_SIZE = _INDEX_ENTRY.size
+FOOTER_SIZE = _FOOTER.size
+
+
+def encode_meta(values: dict) -> bytes:
+    """Encode header metadata (a JSON object; empty when there is nothing to say)."""
+    if not values:
+        return b""
+    return json.dumps(values, sort_keys=True, separators=(',', ':')).encode()
+
+
+def parse_header(data: bytes) -> Tuple[ContainerHeader, int]:
+    """
+    Parse the fixed HEADER_SIZE part of a header.
+
+    Returns the header (with empty ``meta``) and the number of meta bytes
+    that follow it.
+    """
+    magic, version, cipher, flags, chunk_size, meta_len = _HEADER.unpack(data)
+    if magic != MAGIC:
+        raise ContainerError("Not an encrypted container file")
+    if version != VERSION:
+        raise ContainerError(f"Unsupported container version {version}")
+    return ContainerHeader(version, cipher, flags, chunk_size, b""), meta_len
+
+
+def frame_length(data: bytes) -> int:
+    """Decode a frame's length prefix (0 marks the end of the frames)."""
+    return _FRAME_LEN.unpack(data)[0]
+
+
+def check_trailer(end_offset: int, offsets: List[int], index_data: bytes,
+                  footer: bytes) -> List[Tuple[int, int]]:
+    """
+    Validate the index and footer read after the end marker.
+
+    Args:
+        end_offset: Offset of the end marker
+        offsets: Offsets of the frames actually read (empty for unindexed files)
+        index_data: The ``len(offsets)`` index entries
+        footer: The FOOTER_SIZE footer bytes
+
+    Returns:
+        The index as ``(offset, plain_len)`` pairs
+    """
+    index = list(_INDEX_ENTRY.iter_unpack(index_data))
+    if _FOOTER.unpack(footer) != (end_offset + _FRAME_LEN.size, len(offsets), END_MAGIC):
+        raise ContainerError("Chunk index does not match the file contents")
+    if [offset for offset, _ in index] != offsets:
+        raise ContainerError("Chunk index does not match the file contents")
+    return index
+
+
+def _read_exact(stream: BinaryIO, size: int) -> bytes:
+    """Read exactly ``size`` bytes or raise ContainerError."""
+    data = stream.read(size)
+    if len(data) != size:
+        raise TruncatedError("Unexpected end of file - encrypted file is truncated")
+    return data
+
+
+def is_container(prefix: bytes) -> bool:
+    """Return True if ``prefix`` starts with the container magic."""
+    return prefix[:len(MAGIC)] == MAGIC
+
+
+def is_encrypted(prefix: bytes) -> bool:
+    """Return True if ``prefix`` starts like a container or a legacy token file."""
+    if is_container(prefix):
+        return True
+    prefix = bytes(prefix[:len(LEGACY_TOKEN_PREFIX)])
+    return bool(prefix) and LEGACY_TOKEN_PREFIX.startswith(prefix)
+
+
+class ContainerWriter:
+    """Writes length-prefixed chunks followed by the chunk index and footer.
+
+    The writer tracks its own position, so the output stream does not need to
+    be seekable.
+    """
+
+    def __init__(self, stream: BinaryIO, cipher: int, chunk_size: int,
+                 flags: int = 0, meta: bytes = b"", hasher=None,
+                 resume: Optional[Tuple[int, List[Tuple[int, int]]]] = None):
+        """
+        Args:
+            stream: Output stream
+            cipher: Cipher suite ID
+            chunk_size: Largest plaintext chunk size
+            flags: Header flags
+            meta: Extra header bytes
+            hasher: Optional hashlib object updated with every byte written
+            resume: ``(position, index)`` of a container already written up
+                to ``position`` with the same header; the header is not
+                written again and ``stream`` must be positioned there
+        """
+        self.stream = stream
+        self.hasher = hasher
+        self.header = ContainerHeader(VERSION, cipher, flags, chunk_size, meta)
+        self.index: List[Tuple[int, int]] = []
+        self.position = 0
+        if resume is not None:
+            self.position, index = resume
+            self.index = [tuple(entry) for entry in index]
+            return
+        self._write(_HEADER.pack(MAGIC, VERSION, cipher, flags, chunk_size, len(meta)))
+        self._write(meta)
+
+    def _write(self, data: bytes) -> None:
+        self.stream.write(data)
+        if self.hasher is not None:
+            self.hasher.update(data)
+        self.position += len(data)
+
+    def write_chunk(self, ciphertext: bytes, plain_len: int) -> None:
+        """Append one encrypted chunk and record it in the index."""
+        if not ciphertext:
+            raise ContainerError("Cannot write an empty chunk")
+        if self.header.indexed:
+            self.index.append((self.position, plain_len))
+        self._write(_FRAME_LEN.pack(len(ciphertext)))
+        self._write(ciphertext)
+
+    def close(self) -> None:
+        """Write the end marker, chunk index and footer."""
+        self._write(_FRAME_LEN.pack(0))
+        index_offset = self.position
+        self._write(b"".join(_INDEX_ENTRY.pack(*entry) for entry in self.index))
+        self._write(_FOOTER.pack(index_offset, len(self.index), END_MAGIC))
+
+
+class ContainerReader:
+    """Reads chunks from a container either sequentially or by index."""
+
+    def __init__(self, stream: BinaryIO):
+        self.stream = stream
+        self.header = self._read_header()
+        self._index: Optional[List[Tuple[int, int]]] = None
+        # Set once frames() has read the whole container
+        self.chunk_count: Optional[int] = None
+
+    def _read_header(self) -> ContainerHeader:
+        header, meta_len = parse_header(_read_exact(self.stream, HEADER_SIZE))
+        return header._replace(meta=_read_exact(self.stream, meta_len))
+
+    def frames(self) -> Iterator[bytes]:
+        """Yield each chunk's ciphertext in order, then validate the trailer.
+
+        Only reads forward, so it works on non-seekable streams.
+        """
+        indexed = self.header.indexed
+        offsets = []
+        count = 0
+        position = self.header.size
+        while True:
+            length = frame_length(_read_exact(self.stream, FRAME_LEN_SIZE))
+            if length == 0:
+                break
+            if indexed:
+                offsets.append(position)
+            count += 1
+            yield _read_exact(self.stream, length)
+            position += _FRAME_LEN.size + length
+
+        index_data = _read_exact(self.stream, len(offsets) * INDEX_ENTRY_SIZE)
+        footer = _read_exact(self.stream, FOOTER_SIZE)
+        self._index = check_trailer(position, offsets, index_data, footer)
+        self.chunk_count = count
+
+    def frames_until(self, end: int) -> Iterator[Tuple[int, bytes]]:
+        """Yield ``(offset, ciphertext)`` for the frames between the header and ``end``.
+
+        Used on a partially written container, which has no end marker or
+        index yet; the frames must end exactly at ``end``.
+        """
+        position = self.header.size
+        while position < end:
+            length = frame_length(_read_exact(self.stream, FRAME_LEN_SIZE))
+            if length == 0 or position + _FRAME_LEN.size + length > end:
+                raise ContainerError(f"Frame at offset {position} does not end before {end}")
+            yield position, _read_exact(self.stream, length)
+            position += _FRAME_LEN.size + length
+        if position != end:
+            raise ContainerError(f"Header does not end before {end}")
+
+    def _read_index_body(self, count: int) -> List[Tuple[int, int]]:
+        data = _read_exact(self.stream, count * _INDEX_ENTRY.size)
+        return list(_INDEX_ENTRY.iter_unpack(data))
+
+    @property
+    def index(self) -> List[Tuple[int, int]]:
+        """List of ``(offset, plain_len)`` pairs, loaded from the footer.
+        
+        Loading the index restores the stream position, so it can be used
+        before iterating over frames().
+        """
+        if self._index is None:
+            position = self.stream.tell()
+            self.stream.seek(-_FOOTER.size, 2)
+            index_offset, count, end_magic = _FOOTER.unpack(
+                _read_exact(self.stream, _FOOTER.size)
+            )
+            if end_magic != END_MAGIC:
+                raise TruncatedError("Missing chunk index - encrypted file is truncated")
+            self.stream.seek(index_offset)
+            self._index = self._read_index_body(count)
+            self.stream.seek(position)
+        return self._index
+
+    def read_frame(self, number: int) -> bytes:
+        """Return the ciphertext of chunk ``number`` using the index."""
+        if not self.header.indexed:
+            raise ContainerError("Streamed container has no chunk index")
+        offset, _ = self.index[number]
+        self.stream.seek(offset)
+        (length,) = _FRAME_LEN.unpack(_read_exact(self.stream, _FRAME_LEN.size))
+        return _read_exact(self.stream, length)
+
+
+def container_size(total_size: int, chunk_size: int,
+                   ciphertext_size: Callable[[int], int], meta_len: int = 0) -> int:
+    """Size of the container for a ``total_size`` byte input split into fixed chunks."""
+    full, rest = divmod(total_size, chunk_size)
+    chunks = full + (1 if rest or not full else 0)
+    size = _HEADER.size + meta_len + full * (_FRAME_LEN.size + ciphertext_size(chunk_size))
+    if rest or not full:
+        size += _FRAME_LEN.size + ciphertext_size(rest)
+    return size + _FRAME_LEN.size + chunks * _INDEX_ENTRY.size + _FOOTER.size
+
+
+def legacy_token_size(chunk_size: int = LEGACY_CHUNK_SIZE) -> int:
+    """Size of the base64 Fernet token produced for a full ``chunk_size`` chunk."""
+    raw = 1 + 8 + 16 + (chunk_size // 16 + 1) * 16 + 32
+    return (raw + 2) // 3 * 4
+
+
+def legacy_tokens(stream: BinaryIO, chunk_size: int = LEGACY_CHUNK_SIZE) -> Iterator[bytes]:
+    """Split a pre-container file of concatenated Fernet tokens into tokens."""
+    token_size = legacy_token_size(chunk_size)
+    while True:
+        token = stream.read(token_size)
+        if not token:
+            break
+        yield token
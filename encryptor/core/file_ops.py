@@ -1,17 +1,277 @@
 from pathlib import Path
-from typing import Union, List, Generator
-import shutil
-from tqdm import tqdm
+from collections import deque
+from contextlib import contextmanager
+from functools import partial
+from itertools import repeat
+from typing import (TYPE_CHECKING, BinaryIO, Callable, Iterable, Optional, Union, List, Generator,
+                    Iterator, Tuple)
+import base64
+import binascii
+import os
 import logging
+from .checkpoint import CHECKPOINT_INTERVAL, AtomicOutput, source_identity
+from .chunking import chunk_sizer
+from .compression import Codec, codec_for, get_codec, pack_chunk, unpack_chunk
+from .ciphers import CipherSuite, FernetSuite
+from .container import (FLAG_UNINDEXED, LEGACY_CHUNK_SIZE, MAGIC, ContainerError,
+                        ContainerReader, ContainerWriter, TruncatedError, container_size,
+                        encode_meta, is_container, is_encrypted, legacy_token_size,
+                        legacy_tokens)
+from .crypto import CryptoManager
+from .metrics import NULL_METRICS, Metrics
+from .pipeline import ExecutorLike, in_flight_limit, is_process_pool, ordered_map
+from .reader import DEFAULT_CACHE_CHUNKS, EncryptedFileReader
+from .scanner import ScanFilter, scan_files
+from .streams import PrefixedReader, limit_cache, map_stream, open_chunks, preallocate
+
+if TYPE_CHECKING:
+    from .shard import Sharder
 
 logger = logging.getLogger(__name__)
 
+# Chunk size for process_file; encryption picks its own unless told otherwise
+DEFAULT_CHUNK_SIZE = 64 * 1024
+ENCRYPTED_EXTENSION = '.enc'
+
+
+@contextmanager
+def _progress_bar(total: int, desc: str, enabled: bool) -> Iterator[Optional[Callable[[int], None]]]:
+    """Yield a tqdm bar's update function, or None without creating a bar at all."""
+    if not enabled:
+        # Even a disabled tqdm costs tens of microseconds per file
+        yield None
+        return
+    from tqdm import tqdm
+    with tqdm(total=total, unit='B', unit_scale=True, desc=desc) as pbar:
+        yield pbar.update
+
+
+def _recording_sizes(chunks: Iterable[bytes], sizes: deque) -> Iterator[bytes]:
+    """Pass chunks through, recording each chunk's length in ``sizes``."""
+    for chunk in chunks:
+        sizes.append(len(chunk))
+        yield chunk
+
+
+def _hashing(chunks: Iterable[bytes], hasher) -> Iterator[bytes]:
+    """Pass chunks through, feeding them to ``hasher`` in order."""
+    for chunk in chunks:
+        hasher.update(chunk)
+        yield chunk
+
+
+def _io_mode_for(io_mode: str, executor: ExecutorLike) -> str:
+    # memoryview chunks cannot be pickled for worker processes
+    return 'buffered' if is_process_pool(executor) else io_mode
+
+
+def _with_pacing(on_progress: Optional[Callable[[int], None]],
+                 pace: Optional[Callable[[], None]]) -> Optional[Callable[[int], None]]:
+    """Progress callback that also calls ``pace`` (from limit_cache) after each chunk."""
+    if pace is None:
+        return on_progress
+    
+    def update(size: int) -> None:
+        if on_progress is not None:
+            on_progress(size)
+        pace()
+    return update
+
+
+def _ring_size(jobs: int) -> int:
+    # Chunks alive at once: those in flight, one held by _numbered's
+    # lookahead, one being written and the one being read
+    return in_flight_limit(jobs) + 3
+
+
+def _numbered(items: Iterable[bytes], empty: bytes = None,
+              start: int = 0) -> Iterator[Tuple[int, bytes, bool]]:
+    """
+    Yield ``(number, item, last)`` using one item of lookahead.
+    
+    Numbers count from ``start``. If ``items`` is empty and ``empty`` is
+    given, yields ``(start, empty, True)``.
+    """
+    items = iter(items)
+    previous = next(items, empty)
+    if previous is None:
+        return
+    number = start
+    for item in items:
+        yield number, previous, False
+        previous = item
+        number += 1
+    yield number, previous, True
+
+
+def _peek_magic(infile: BinaryIO) -> Tuple[BinaryIO, bytes, bool, int]:
+    """
+    Read the first bytes of ``infile`` to tell containers from legacy files.
+    
+    Returns:
+        ``(stream to read from, prefix, seekable, start offset)``; the stream
+        yields the prefix again, by seeking back or by wrapping a pipe
+    """
+    seekable = infile.seekable() if hasattr(infile, 'seekable') else False
+    start = infile.tell() if seekable else 0
+    prefix = infile.read(len(MAGIC))
+    if seekable:
+        infile.seek(start)
+    else:
+        infile = PrefixedReader(prefix, infile)
+    return infile, prefix, seekable, start
+
+
+def _feed(hasher, stream: BinaryIO, size: int) -> None:
+    """Feed the next ``size`` bytes of ``stream`` to ``hasher``."""
+    while size:
+        block = stream.read(min(size, 1024 * 1024))
+        if not block:
+            raise ValueError("File is shorter than its checkpoint")
+        hasher.update(block)
+        size -= len(block)
+
+
+def _write_plaintext(chunks: Iterable[bytes], write: Callable[[bytes], object],
+                     checkpoint: Optional[AtomicOutput], first: int, position: int,
+                     on_progress: Optional[Callable[[int], None]]) -> Tuple[int, int]:
+    """Write decrypted chunks, checkpointing between them.
+    
+    Returns:
+        ``(bytes written, chunks written)``
+    """
+    written = 0
+    number = first
+    for chunk in chunks:
+        if checkpoint is not None and checkpoint.due:
+            checkpoint.save({'position': position + written, 'chunks': number})
+        write(chunk)
+        written += len(chunk)
+        number += 1
+        if checkpoint is not None:
+            checkpoint.advance(len(chunk))
+        if on_progress is not None:
+            on_progress(len(chunk))
+    return written, number - first
+
+
+def _cipher_stage(metrics: Metrics, func: Callable, executor: ExecutorLike,
+                  operation: str) -> Callable:
+    # Worker processes cannot report back into this process's metrics
+    if is_process_pool(executor):
+        return func
+    return metrics.timed(func, 'fenc_stage_seconds', operation=operation, stage='cipher')
+
+
+def _encrypt_numbered(suite: CipherSuite, codec: Optional[Codec],
+                      item: Tuple[int, bytes, bool]) -> Tuple[bytes, int]:
+    number, data, last = item
+    payload = data if codec is None else pack_chunk(codec, data)
+    return suite.encrypt_chunk(payload, number, last), len(data)
+
+
+def _decrypt_numbered(suite: CipherSuite, codec: Optional[Codec], max_size: int,
+                      item: Tuple[int, bytes, bool]) -> bytes:
+    number, token, last = item
+    chunk = suite.decrypt_chunk(token, number, last)
+    return chunk if codec is None else unpack_chunk(codec, chunk, max_size)
+
+
+def _committed_index(outfile: BinaryIO, position: int, suite: CipherSuite,
+                     codec: Optional[Codec], max_size: int) -> List[Tuple[int, int]]:
+    """
+    Rebuild the chunk index of a container written up to ``position``.
+
+    Checkpoints only store the position, so the index is recovered by walking
+    the committed frames. Each one is decrypted for its plaintext length,
+    which also rejects a partial output that was damaged or replaced.
+    """
+    outfile.seek(0)
+    reader = ContainerReader(outfile)
+    if reader.header.cipher != suite.id:
+        raise ContainerError("Partial output was written with a different cipher")
+    index = []
+    for number, (offset, token) in enumerate(reader.frames_until(position)):
+        chunk = _decrypt_numbered(suite, codec, max_size, (number, token, False))
+        index.append((offset, len(chunk)))
+    outfile.seek(position)
+    return index
+
+
+def _rekey_numbered(old: CipherSuite, new: CipherSuite,
+                    item: Tuple[int, Tuple[bytes, int], bool]) -> Tuple[bytes, int]:
+    # The payload is re-encrypted as it is, still compressed if it was
+    number, (token, plain_len), last = item
+    return new.encrypt_chunk(old.decrypt_chunk(token, number, last), number, last), plain_len
+
+
+def _rekey_legacy(old: CipherSuite, new: CipherSuite,
+                  item: Tuple[int, bytes, bool]) -> Tuple[bytes, int]:
+    number, token, last = item
+    data = old.decrypt_chunk(base64.urlsafe_b64decode(token)) if token else b""
+    return new.encrypt_chunk(data, number, last), len(data)
+
+
+def _verify_numbered(suite: CipherSuite, item: Tuple[int, bytes, bool]) -> bool:
+    number, token, last = item
+    try:
+        suite.verify_chunk(token, number, last)
+    except ValueError:
+        return False
+    return True
+
+
+def _verify_legacy(suite: CipherSuite, token: bytes) -> bool:
+    try:
+        suite.verify_chunk(base64.urlsafe_b64decode(token))
+    except (binascii.Error, ValueError):
+        return False
+    return True
+
+
+def iter_inputs(paths: Iterable[Union[str, Path]], recursive: bool = False,
+                extensions: List[str] = None, shard: Optional['Sharder'] = None,
+                **filters) -> Iterator[Tuple[Path, Optional[Path]]]:
+    """
+    Expand the files and directories given by the user into input files.
+
+    This is the one place that decides which files a run sees, so encryption,
+    verification, bundles and shard plans all agree.
+
+    Args:
+        paths: Files or directories given by the user
+        recursive: Whether to search directories recursively
+        extensions: File extensions to include in directories (None for all)
+        shard: Only yield the files of this shard (see ``encryptor.core.shard``)
+        **filters: Further find_files options (include, exclude, min_size,
+            max_size, workers) applied to directories
+
+    Yields:
+        ``(file_path, root)`` tuples, where ``root`` is the directory given by
+        the user that the file was found in, or None for a file given directly
+    """
+    for path in paths:
+        path = Path(path)
+        if path.is_file():
+            if shard is None or shard.owns(path):
+                yield path, None
+        elif path.is_dir():
+            for file_path in FileOperations.find_files(path, recursive, extensions, **filters):
+                if shard is None or shard.owns(file_path, path):
+                    yield file_path, path
+        else:
+            logger.warning(f"Skipping {path}: no such file or directory")
+
+
 class FileOperations:
     """Handles file system operations for encryption/decryption."""
     
     @staticmethod
     def process_file(input_path: Union[str, Path], output_path: Union[str, Path], 
-                    process_func, chunk_size: int = 64 * 1024) -> None:
+                    process_func, chunk_size: int = DEFAULT_CHUNK_SIZE,
+                    jobs: int = 1, executor: ExecutorLike = 'thread',
+                    progress: bool = True, io_mode: str = 'buffered',
+                    bulk_io: bool = False) -> None:
         """
         Process a file in chunks using the provided function.
         
@@ -20,54 +280,572 @@ class FileOperations:
             output_path: Path to output file
             process_func: Function to process data chunks
             chunk_size: Size of chunks to read/process (bytes)
+            jobs: Number of chunks processed concurrently (0 for one per core)
+            executor: 'thread' or 'process' worker pool, or a
+                pool shared by the run (see pipeline.worker_pool)
+            progress: Show a tqdm progress bar for this file
+            io_mode: 'buffered' passes ``bytes`` to process_func; 'readinto',
+                'mmap', 'direct' and 'auto' pass ``memoryview`` chunks
+            bulk_io: Keep both files out of the page cache (see
+                streams.CacheLimiter), for runs over more data than fits in memory
         """
         input_path = Path(input_path)
         output_path = Path(output_path)
         
-        # Create parent directory if it doesn't exist
-        output_path.parent.mkdir(parents=True, exist_ok=True)
-        
         # Get file size for progress bar
         total_size = input_path.stat().st_size
         
+        # The output only appears under its name once it is complete
+        with (
+            open(input_path, 'rb') as infile,
+            AtomicOutput(output_path) as output,
+            _progress_bar(total_size, f"Processing {input_path.name}", progress) as update,
+            limit_cache(infile, output.file, bulk_io) as pace
+        ):
+            outfile = output.file
+            update = _with_pacing(update, pace)
+            sizes = deque()
+            with open_chunks(infile, chunk_size, _io_mode_for(io_mode, executor),
+                             _ring_size(jobs)) as chunks:
+                chunks = _recording_sizes(chunks, sizes)
+                for processed_chunk in ordered_map(process_func, chunks, jobs, executor):
+                    outfile.write(processed_chunk)
+                    size = sizes.popleft()
+                    if update is not None:
+                        update(size)
+    
+    @staticmethod
+    def encrypt_file(input_path: Union[str, Path], output_path: Union[str, Path],
+                     crypto: CryptoManager, chunk_size: Optional[int] = None,
+                     jobs: int = 1, executor: ExecutorLike = 'thread',
+                     progress: bool = True, io_mode: str = 'auto',
+                     source_hasher=None, output_hasher=None,
+                     compression: Optional[str] = None, resume: bool = False,
+                     checkpoint_interval: int = CHECKPOINT_INTERVAL,
+                     metrics: Optional[Metrics] = None, bulk_io: bool = False) -> None:
+        """
+        Encrypt a file into the chunked container format.
+        
+        The output is written to a ``.part`` file that is renamed into place
+        once complete, with a checkpoint every ``checkpoint_interval`` bytes.
+        
+        Args:
+            input_path: Path to plaintext file
+            output_path: Path to encrypted output file
+            crypto: CryptoManager holding the key
+            chunk_size: Plaintext bytes per encrypted chunk, or None to pick
+                and tune it from the file size, filesystem block size and
+                measured throughput
+            jobs: Number of chunks encrypted concurrently (0 for one per core)
+            executor: 'thread' or 'process' worker pool, or a
+                pool shared by the run (see pipeline.worker_pool)
+            progress: Show a tqdm progress bar for this file
+            io_mode: Input mode, one of 'auto', 'buffered', 'readinto', 'mmap',
+                'direct'
+            source_hasher: Optional hashlib object fed the plaintext
+            output_hasher: Optional hashlib object fed the encrypted output
+            compression: Codec name from compression.CODECS, or None
+            resume: Continue an interrupted run from its last checkpoint
+            checkpoint_interval: Input bytes between checkpoints
+            metrics: Receives per-stage timings and chunk counts
+            bulk_io: Keep both files out of the page cache (see
+                streams.CacheLimiter); 'auto' input then means 'readinto'
+        """
+        input_path = Path(input_path)
+        output_path = Path(output_path)
+        total_size = input_path.stat().st_size
+        identity = source_identity('encrypt', input_path, crypto.key, cipher=crypto.cipher.name,
+                                   chunk_size=chunk_size, compression=compression)
+        
+        with (
+            open(input_path, 'rb') as infile,
+            AtomicOutput(output_path, identity, resume, checkpoint_interval) as output,
+            _progress_bar(total_size, f"Encrypting {input_path.name}", progress) as update,
+            limit_cache(infile, output.file, bulk_io) as pace
+        ):
+            FileOperations.encrypt_stream(
+                infile, output.file, crypto, chunk_size, jobs=jobs, executor=executor,
+                io_mode=_io_mode_for(io_mode, executor), total_size=total_size,
+                on_progress=_with_pacing(update, pace),
+                source_hasher=source_hasher, output_hasher=output_hasher,
+                compression=compression, checkpoint=output, metrics=metrics
+            )
+    
+    @staticmethod
+    def encrypt_stream(infile: BinaryIO, outfile: BinaryIO, crypto: CryptoManager,
+                       chunk_size: Optional[int] = None, jobs: int = 1,
+                       executor: ExecutorLike = 'thread', io_mode: str = 'auto',
+                       total_size: Optional[int] = None,
+                       on_progress: Optional[Callable[[int], None]] = None,
+                       source_hasher=None, output_hasher=None,
+                       compression: Optional[str] = None,
+                       checkpoint: Optional[AtomicOutput] = None,
+                       metrics: Optional[Metrics] = None,
+                       metadata: Optional[dict] = None) -> int:
+        """
+        Encrypt everything left in ``infile`` and write the container to ``outfile``.
+        
+        With ``total_size`` None (a pipe or other stream of unknown length) the
+        container is written without a chunk index, so memory stays bounded
+        however long the stream runs; neither stream needs to be seekable.
+        
+        Args:
+            infile: Binary input stream
+            outfile: Binary output stream, positioned at the start of a file
+                if ``total_size`` is given
+            crypto: CryptoManager holding the key
+            chunk_size: Plaintext bytes per encrypted chunk (None to tune it)
+            jobs: Number of chunks encrypted concurrently (0 for one per core)
+            executor: 'thread' or 'process' worker pool, or a
+                pool shared by the run (see pipeline.worker_pool)
+            io_mode: Input mode, one of 'auto', 'buffered', 'readinto', 'mmap',
+                'direct'
+            total_size: Input size in bytes, if known; an estimate is fine, as
+                it only picks the chunk size and preallocates the output
+            on_progress: Called with the plaintext length of each chunk written
+            source_hasher: Optional hashlib object fed the plaintext
+            output_hasher: Optional hashlib object fed the encrypted output
+            compression: Codec name from compression.CODECS, or None; chunks
+                that do not compress are stored as they are
+            checkpoint: AtomicOutput that ``outfile`` belongs to; it is resumed
+                from and saved to between chunks (needs ``total_size`` and a
+                seekable ``infile``)
+            metrics: Receives read/cipher/write timings and the chunk count
+            metadata: Extra entries for the container header metadata
+        
+        Returns:
+            Number of plaintext bytes encrypted, including resumed ones
+        """
+        try:
+            block_size = os.fstat(infile.fileno()).st_blksize
+        except (AttributeError, OSError, ValueError):
+            block_size = 4096
+        sizer = chunk_sizer(chunk_size, total_size or 0, block_size)
+        codec = get_codec(compression)
+        if checkpoint is not None and total_size is None:
+            raise ValueError("Checkpoints need the input size")
+        state = checkpoint.state if checkpoint is not None else None
+        # A resumed file keeps the data key already in its header
+        data_key = state.get('data_key') if state is not None else crypto.new_data_key()
+        suite = crypto.get_suite(crypto.cipher.id, data_key)
+        meta = encode_meta({**(metadata or {}),
+                            **({'compression': compression} if codec else {}),
+                            **({'data_key': data_key} if data_key else {})})
+        preallocated = False
+        if total_size is not None:
+            # Adaptive sizes only grow, so the initial size bounds the output;
+            # compressed chunks are at most one marker byte larger
+            ciphertext_size = suite.ciphertext_size if codec is None else (
+                lambda plain_len: suite.ciphertext_size(plain_len + 1)
+            )
+            preallocated = preallocate(outfile, container_size(
+                total_size, sizer.size, ciphertext_size, len(meta)
+            ))
+        flags = 0 if total_size is not None else FLAG_UNINDEXED
+        resume = None
+        encrypted = 0
+        if state is not None:
+            if state['chunk_size'] != sizer.max_size:
+                raise ValueError("Checkpoint was written with a different chunk size")
+            # The committed prefix is neither read nor encrypted again, only hashed
+            if source_hasher is not None:
+                _feed(source_hasher, infile, state['done'])
+            else:
+                infile.seek(state['done'])
+            index = _committed_index(outfile, state['position'], suite, codec, sizer.max_size)
+            if sum(plain_len for _, plain_len in index) != state['done']:
+                raise ContainerError("Partial output does not match its checkpoint")
+            if output_hasher is not None:
+                outfile.seek(0)
+                _feed(output_hasher, outfile, state['position'])
+            resume = (state['position'], index)
+            encrypted = state['done']
+            if on_progress is not None:
+                on_progress(encrypted)
+        writer = ContainerWriter(outfile, suite.id, sizer.max_size, flags, meta,
+                                 hasher=output_hasher, resume=resume)
+        metrics = metrics or NULL_METRICS
+        encrypt = _cipher_stage(metrics, partial(_encrypt_numbered, suite, codec),
+                                executor, 'encrypt')
+        write_chunk = metrics.timed(writer.write_chunk, 'fenc_stage_seconds',
+                                    operation='encrypt', stage='write')
+        first = len(writer.index)
+        with open_chunks(infile, sizer, _io_mode_for(io_mode, executor),
+                         _ring_size(jobs)) as chunks:
+            chunks = metrics.timed_iter(chunks, 'fenc_stage_seconds',
+                                        operation='encrypt', stage='read')
+            if source_hasher is not None:
+                chunks = _hashing(chunks, source_hasher)
+            # Empty files still get one (empty) final chunk so AEAD suites
+            # can tell them apart from truncated files
+            numbered = _numbered(chunks, empty=b"", start=first)
+            count = 0
+            for ciphertext, plain_len in ordered_map(encrypt, numbered, jobs, executor):
+                # Saved before writing, so the final chunk is never checkpointed
+                if checkpoint is not None and checkpoint.due:
+                    checkpoint.save({'position': writer.position, 'done': encrypted,
+                                     'chunk_size': sizer.max_size, 'data_key': data_key})
+                write_chunk(ciphertext, plain_len)
+                count += 1
+                encrypted += plain_len
+                if checkpoint is not None:
+                    checkpoint.advance(plain_len)
+                if on_progress is not None:
+                    on_progress(plain_len)
+        writer.close()
+        if preallocated:
+            outfile.truncate(writer.position)
+        metrics.inc('fenc_chunks_total', count, operation='encrypt')
+        return encrypted
+    
+    @staticmethod
+    def decrypt_file(input_path: Union[str, Path], output_path: Union[str, Path],
+                     crypto: CryptoManager, jobs: int = 1,
+                     executor: ExecutorLike = 'thread', progress: bool = True,
+                     io_mode: str = 'auto', resume: bool = False,
+                     checkpoint_interval: int = CHECKPOINT_INTERVAL,
+                     metrics: Optional[Metrics] = None, bulk_io: bool = False) -> None:
+        """
+        Decrypt a container file, or a legacy file of concatenated Fernet tokens.
+        
+        Like encrypt_file, the output is written atomically with checkpoints.
+        
+        Args:
+            input_path: Path to encrypted file
+            output_path: Path to decrypted output file
+            crypto: CryptoManager holding the key
+            jobs: Number of chunks decrypted concurrently (0 for one per core)
+            executor: 'thread' or 'process' worker pool, or a
+                pool shared by the run (see pipeline.worker_pool)
+            progress: Show a tqdm progress bar for this file
+            io_mode: Input mode, one of 'auto', 'buffered', 'readinto', 'mmap',
+                'direct'
+            resume: Continue an interrupted run from its last checkpoint
+            checkpoint_interval: Output bytes between checkpoints
+            metrics: Receives per-stage timings and chunk counts
+            bulk_io: Keep both files out of the page cache (see
+                streams.CacheLimiter); 'auto' input then means 'readinto'
+        """
+        input_path = Path(input_path)
+        output_path = Path(output_path)
+        total_size = input_path.stat().st_size
+        identity = source_identity('decrypt', input_path, crypto.key)
+        
         with (
             open(input_path, 'rb') as infile,
-            open(output_path, 'wb') as outfile,
-            tqdm(total=total_size, unit='B', unit_scale=True, 
-                 desc=f"Processing {input_path.name}") as pbar
+            AtomicOutput(output_path, identity, resume, checkpoint_interval) as output,
+            _progress_bar(total_size, f"Decrypting {input_path.name}", progress) as update,
+            limit_cache(infile, output.file, bulk_io) as pace
         ):
-            while True:
-                chunk = infile.read(chunk_size)
-                if not chunk:
-                    break
-                processed_chunk = process_func(chunk)
-                outfile.write(processed_chunk)
-                pbar.update(len(chunk))
+            FileOperations.decrypt_stream(infile, output.file, crypto, jobs=jobs,
+                                          executor=executor,
+                                          io_mode=_io_mode_for(io_mode, executor),
+                                          on_progress=_with_pacing(update, pace),
+                                          checkpoint=output, metrics=metrics)
+    
+    @staticmethod
+    def decrypt_stream(infile: BinaryIO, outfile: BinaryIO, crypto: CryptoManager,
+                       jobs: int = 1, executor: ExecutorLike = 'thread', io_mode: str = 'auto',
+                       on_progress: Optional[Callable[[int], None]] = None,
+                       checkpoint: Optional[AtomicOutput] = None,
+                       metrics: Optional[Metrics] = None) -> int:
+        """
+        Decrypt a container (or legacy token stream) read from ``infile``.
+        
+        Works on non-seekable streams such as stdin; seekable regular files
+        additionally get their output preallocated from the chunk index.
+        
+        Args:
+            infile: Binary input stream positioned at the container header
+            outfile: Binary output stream for the plaintext
+            crypto: CryptoManager holding the key
+            jobs: Number of chunks decrypted concurrently (0 for one per core)
+            executor: 'thread' or 'process' worker pool, or a
+                pool shared by the run (see pipeline.worker_pool)
+            io_mode: Input mode, one of 'auto', 'buffered', 'readinto', 'mmap',
+                'direct'
+            on_progress: Called with the length of each decrypted chunk
+            checkpoint: AtomicOutput that ``outfile`` belongs to; it is resumed
+                from and saved to between chunks (resuming needs a seekable
+                ``infile``; streamed containers always start over)
+            metrics: Receives read/cipher/write timings and the chunk count
+        
+        Returns:
+            Number of plaintext bytes written, including resumed ones
+        """
+        infile, prefix, seekable, start = _peek_magic(infile)
+        
+        state = checkpoint.state if checkpoint is not None else None
+        if state is not None and not seekable:
+            raise ValueError("Resuming needs a seekable input")
+        first = state['chunks'] if state is not None else 0
+        position = state['position'] if state is not None else 0
+        if position and on_progress is not None:
+            on_progress(position)
+        metrics = metrics or NULL_METRICS
+        write = metrics.timed(outfile.write, 'fenc_stage_seconds',
+                              operation='decrypt', stage='write')
+        
+        if not is_container(prefix):
+            if first:
+                infile.seek(start + first * legacy_token_size())
+            tokens = metrics.timed_iter(legacy_tokens(infile), 'fenc_stage_seconds',
+                                        operation='decrypt', stage='read')
+            decrypt = _cipher_stage(metrics, crypto.decrypt_data, executor, 'decrypt')
+            written, count = _write_plaintext(ordered_map(decrypt, tokens, jobs, executor),
+                                              write, checkpoint, first, position, on_progress)
+            metrics.inc('fenc_chunks_total', count, operation='decrypt')
+            return position + written
+        
+        with map_stream(infile, _io_mode_for(io_mode, executor)) as source:
+            reader = ContainerReader(source)
+            if 'recipe' in reader.header.metadata:
+                raise ContainerError("This is a chunk store recipe - restore it from its "
+                                     "chunk store (decrypt --store)")
+            suite = crypto.suite_for(reader.header)
+            if state is not None and not reader.header.indexed:
+                # Streamed containers can only be read from the start
+                outfile.seek(0)
+                outfile.truncate()
+                first = position = 0
+            preallocated = False
+            if seekable and reader.header.indexed:
+                preallocated = preallocate(
+                    outfile, sum(plain_len for _, plain_len in reader.index)
+                )
+            decrypt = _cipher_stage(metrics, partial(_decrypt_numbered, suite,
+                                                     codec_for(reader.header),
+                                                     reader.header.chunk_size),
+                                    executor, 'decrypt')
+            
+            if first:
+                # Jump straight to the first chunk not yet committed
+                frames = (reader.read_frame(n) for n in range(first, len(reader.index)))
+            else:
+                frames = reader.frames()
+            frames = metrics.timed_iter(frames, 'fenc_stage_seconds',
+                                        operation='decrypt', stage='read')
+            written, count = _write_plaintext(
+                ordered_map(decrypt, _numbered(frames, start=first), jobs, executor),
+                write, checkpoint, first, position, on_progress
+            )
+            metrics.inc('fenc_chunks_total', count, operation='decrypt')
+            if suite.binds_position and not first and not reader.chunk_count:
+                raise TruncatedError("Encrypted file has no chunks - it is truncated")
+            if preallocated:
+                outfile.truncate(written)
+        return position + written
+    
+    @staticmethod
+    def rekey_stream(infile: BinaryIO, outfile: BinaryIO, old_crypto: CryptoManager,
+                     new_crypto: CryptoManager, jobs: int = 1, executor: ExecutorLike = 'thread',
+                     io_mode: str = 'auto',
+                     on_progress: Optional[Callable[[int], None]] = None,
+                     metrics: Optional[Metrics] = None) -> int:
+        """
+        Re-encrypt a container (or legacy token file) under a new key in one pass.
+        
+        Each chunk is decrypted with ``old_crypto`` and encrypted again with
+        ``new_crypto``'s cipher suite (under a new data key when it uses
+        envelope encryption) in memory; plaintext is never written. Chunk
+        layout, compression and header metadata are kept, so compressed
+        chunks are not decompressed. Legacy files become containers.
+        
+        Args:
+            infile: Binary input stream positioned at the start of the file
+            outfile: Binary output stream for the new container
+            old_crypto: CryptoManager holding the current key
+            new_crypto: CryptoManager holding the new key and cipher
+            jobs: Number of chunks processed concurrently (0 for one per core)
+            executor: 'thread' or 'process' worker pool, or a
+                pool shared by the run (see pipeline.worker_pool)
+            io_mode: Input mode, one of 'auto', 'buffered', 'readinto', 'mmap',
+                'direct'
+            on_progress: Called with the plaintext length of each chunk written
+            metrics: Receives read/cipher/write timings and the chunk count
+        
+        Returns:
+            Number of plaintext bytes re-encrypted
+        """
+        infile, prefix, seekable, _ = _peek_magic(infile)
+        if not is_encrypted(prefix):
+            raise ContainerError("Not an encrypted file")
+        metrics = metrics or NULL_METRICS
+        data_key = new_crypto.new_data_key()
+        new_suite = new_crypto.get_suite(new_crypto.cipher.id, data_key)
+        key_meta = {'data_key': data_key} if data_key else {}
+        
+        def reencrypt(numbered: Iterable, func: Callable, writer: ContainerWriter) -> int:
+            func = _cipher_stage(metrics, func, executor, 'rekey')
+            write_chunk = metrics.timed(writer.write_chunk, 'fenc_stage_seconds',
+                                        operation='rekey', stage='write')
+            total = count = 0
+            for ciphertext, plain_len in ordered_map(func, numbered, jobs, executor):
+                write_chunk(ciphertext, plain_len)
+                total += plain_len
+                count += 1
+                if on_progress is not None:
+                    on_progress(plain_len)
+            writer.close()
+            metrics.inc('fenc_chunks_total', count, operation='rekey')
+            return total
+        
+        if not is_container(prefix):
+            writer = ContainerWriter(outfile, new_suite.id, LEGACY_CHUNK_SIZE,
+                                     meta=encode_meta(key_meta))
+            tokens = metrics.timed_iter(legacy_tokens(infile), 'fenc_stage_seconds',
+                                        operation='rekey', stage='read')
+            func = partial(_rekey_legacy, old_crypto.get_suite(FernetSuite.id), new_suite)
+            # An empty legacy file still gets one (empty) final chunk
+            return reencrypt(_numbered(tokens, empty=b""), func, writer)
+        
+        with map_stream(infile, _io_mode_for(io_mode, executor)) as source:
+            reader = ContainerReader(source)
+            header = reader.header
+            old_suite = old_crypto.suite_for(header)
+            if header.indexed:
+                if not seekable:
+                    raise ValueError("Rekeying an indexed container needs a seekable input")
+                plain_lens = (plain_len for _, plain_len in reader.index)
+            else:
+                plain_lens = repeat(0)
+            meta = {**header.metadata, **key_meta}
+            if not data_key:
+                meta.pop('data_key', None)
+            writer = ContainerWriter(outfile, new_suite.id, header.chunk_size, header.flags,
+                                     encode_meta(meta))
+            frames = metrics.timed_iter(reader.frames(), 'fenc_stage_seconds',
+                                        operation='rekey', stage='read')
+            total = reencrypt(_numbered(zip(frames, plain_lens)),
+                              partial(_rekey_numbered, old_suite, new_suite), writer)
+            if old_suite.binds_position and not reader.chunk_count:
+                raise TruncatedError("Encrypted file has no chunks - it is truncated")
+        return total
+    
+    @staticmethod
+    def verify_stream(infile: BinaryIO, crypto: CryptoManager, jobs: int = 1,
+                      executor: ExecutorLike = 'thread', io_mode: str = 'auto',
+                      on_progress: Optional[Callable[[int], None]] = None,
+                      metrics: Optional[Metrics] = None) -> Tuple[int, List[int]]:
+        """
+        Authenticate every chunk read from ``infile`` without keeping any plaintext.
+        
+        The container structure is checked as in decrypt_stream, and the
+        chunk index must agree with the frames. A chunk that fails to
+        authenticate does not stop the pass; its number is collected instead.
+        Compressed chunks are not decompressed (their tag already covers
+        them) and Fernet chunks only have their HMAC checked.
+        
+        Args:
+            infile: Binary input stream positioned at the container header
+            crypto: CryptoManager holding the key
+            jobs: Number of chunks verified concurrently (0 for one per core)
+            executor: 'thread' or 'process' worker pool, or a
+                pool shared by the run (see pipeline.worker_pool)
+            io_mode: Input mode, one of 'auto', 'buffered', 'readinto', 'mmap',
+                'direct'
+            on_progress: Called with the encrypted length of each chunk checked
+            metrics: Receives read/cipher timings and the chunk count
+        
+        Returns:
+            ``(chunks checked, numbers of the chunks that failed to authenticate)``
+        
+        Raises:
+            ContainerError: The file is not encrypted or its structure is
+                damaged (TruncatedError if it ends early)
+        """
+        infile, prefix, _, _ = _peek_magic(infile)
+        if not is_encrypted(prefix):
+            raise ContainerError("Not an encrypted file")
+        metrics = metrics or NULL_METRICS
+        
+        def check(results: Iterable[bool]) -> Tuple[int, List[int]]:
+            count, failed = 0, []
+            for number, ok in enumerate(results):
+                if not ok:
+                    failed.append(number)
+                count += 1
+            metrics.inc('fenc_chunks_total', count, operation='verify')
+            return count, failed
+        
+        def measured(tokens: Iterable[bytes]) -> Iterator[bytes]:
+            for token in tokens:
+                if on_progress is not None:
+                    on_progress(len(token))
+                yield token
+        
+        if not is_container(prefix):
+            tokens = metrics.timed_iter(measured(legacy_tokens(infile)), 'fenc_stage_seconds',
+                                        operation='verify', stage='read')
+            verify = _cipher_stage(metrics, partial(_verify_legacy,
+                                                    crypto.get_suite(FernetSuite.id)),
+                                   executor, 'verify')
+            return check(ordered_map(verify, tokens, jobs, executor))
+        
+        with map_stream(infile, _io_mode_for(io_mode, executor)) as source:
+            reader = ContainerReader(source)
+            header = reader.header
+            compressed = 'compression' in header.metadata
+            suite = crypto.suite_for(header)
+            lengths = []
+            frames = reader.frames()
+            if header.indexed:
+                frames = _recording_sizes(frames, lengths)
+            frames = metrics.timed_iter(measured(frames), 'fenc_stage_seconds',
+                                        operation='verify', stage='read')
+            verify = _cipher_stage(metrics, partial(_verify_numbered, suite), executor, 'verify')
+            count, failed = check(ordered_map(verify, _numbered(frames), jobs, executor))
+            if suite.binds_position and not count:
+                raise TruncatedError("Encrypted file has no chunks - it is truncated")
+            # Plaintext lengths in the index are not authenticated; check them
+            # against the frames they describe
+            for number, ((_, plain_len), length) in enumerate(zip(reader.index, lengths)):
+                if plain_len > header.chunk_size or (
+                        not compressed and suite.ciphertext_size(plain_len) != length):
+                    raise ContainerError(f"Chunk index entry {number} does not match its chunk")
+        return count, failed
+    
+    @staticmethod
+    def open_encrypted(input_path: Union[str, Path], crypto: CryptoManager,
+                       cache_chunks: int = DEFAULT_CACHE_CHUNKS) -> EncryptedFileReader:
+        """
+        Open an encrypted file as a read-only, seekable binary file object.
+        
+        Only the chunks covering the ranges actually read are decrypted.
+        
+        Args:
+            input_path: Path to encrypted file
+            crypto: CryptoManager holding the key
+            cache_chunks: Number of decrypted chunks kept for nearby reads
+        """
+        return EncryptedFileReader(input_path, crypto, cache_chunks)
     
     @staticmethod
     def find_files(directory: Union[str, Path], recursive: bool = False, 
-                   extensions: List[str] = None) -> Generator[Path, None, None]:
+                   extensions: List[str] = None, include: List[str] = None,
+                   exclude: List[str] = None, min_size: Optional[int] = None,
+                   max_size: Optional[int] = None,
+                   workers: Optional[int] = None) -> Iterator[Path]:
         """
         Find files in a directory, optionally recursively and with specific extensions.
         
+        Results are streamed while the scan runs (see ``scanner.scan_files``).
+        
         Args:
             directory: Directory to search
             recursive: Whether to search recursively
             extensions: List of file extensions to include (None for all)
+            include: Glob patterns a file must match (None for all)
+            exclude: Glob patterns for files and directories to skip
+            min_size: Smallest file size in bytes to include
+            max_size: Largest file size in bytes to include
+            workers: Threads scanning subdirectories (None for a default, 1 for serial)
             
         Yields:
             Path objects for matching files
         """
-        directory = Path(directory)
-        if not directory.is_dir():
-            raise ValueError(f"{directory} is not a valid directory")
-        
-        pattern = "**/*" if recursive else "*"
-        
-        for file_path in directory.glob(pattern):
-            if file_path.is_file():
-                if extensions is None or file_path.suffix.lower() in extensions:
-                    yield file_path
+        scan_filter = ScanFilter(extensions, include, exclude, min_size, max_size)
+        return scan_files(directory, recursive, scan_filter, workers)
     
     @staticmethod
     def create_output_path(input_path: Union[str, Path], output_dir: Union[str, Path], 
@@ -94,4 +872,61 @@ class FileOperations:
         else:
             new_name += input_path.suffix
             
-        return output_dir / new_name
\ No newline at end of file
+        return output_dir / new_name
+    
+    @staticmethod
+    def output_path_for(input_path: Union[str, Path], output_dir: Union[str, Path],
+                        operation: str) -> Path:
+        """
+        Name the output of an encrypt or decrypt operation.
+        
+        Encryption appends ``.enc`` to the full file name (``a.txt`` ->
+        ``a.txt.enc``) and decryption strips it again.
+        
+        Args:
+            input_path: Original file path
+            output_dir: Directory for output
+            operation: 'encrypt' or 'decrypt'
+            
+        Returns:
+            Path object for output file
+        """
+        input_path = Path(input_path)
+        if operation == 'encrypt':
+            return FileOperations.create_output_path(
+                input_path, output_dir, new_extension=input_path.suffix + ENCRYPTED_EXTENSION
+            )
+        if input_path.suffix == ENCRYPTED_EXTENSION:
+            input_path = input_path.with_suffix('')
+        return FileOperations.create_output_path(input_path, output_dir)
+    
+    @staticmethod
+    def plan_tasks(paths: Iterable[Union[str, Path]], output_dir: Union[str, Path],
+                   operation: str, recursive: bool = False,
+                   extensions: List[str] = None, shard: Optional['Sharder'] = None,
+                   **filters) -> Generator[Tuple[Path, Path], None, None]:
+        """
+        Pair every input file with its output path.
+        
+        Files are written directly into ``output_dir``; a directory is
+        mirrored under ``output_dir / directory.name``.
+        
+        Args:
+            paths: Files or directories given by the user
+            output_dir: Directory for output
+            operation: 'encrypt' or 'decrypt'
+            recursive: Whether to search directories recursively
+            extensions: List of file extensions to include (None for all)
+            shard: Only yield the files of this shard (see ``encryptor.core.shard``)
+            **filters: Further find_files options (include, exclude, min_size,
+                max_size, workers) applied to directories
+            
+        Yields:
+            ``(input_path, output_path)`` tuples
+        """
+        output_dir = Path(output_dir)
+        for file_path, root in iter_inputs(paths, recursive, extensions, shard, **filters):
+            target = output_dir
+            if root is not None:
+                target = output_dir / root.name / file_path.parent.relative_to(root)
+            yield file_path, FileOperations.output_path_for(file_path, target, operation)
@@ -0,0 +1,197 @@
+"""Thread-safe cache of ready-to-use CryptoManager instances.
+
+Building a CryptoManager constructs Fernet and derives the AEAD subkeys,
+and loading one means reading a key file; passphrase keys additionally
+need an expensive KDF. A KeyRing does that work once per key and hands the
+same instance to every worker until the entry is evicted, either because it
+is the least recently used one or because its TTL has passed.
+
+Evicting an entry only drops the keyring's reference to it. Keys live in
+immutable ``bytes`` inside CryptoManager, Fernet and the cryptography
+backend, so they cannot be zeroed; they are freed once no caller holds the
+CryptoManager any more.
+"""
+from collections import OrderedDict
+from pathlib import Path
+from typing import Callable, NamedTuple, Optional, Union
+import base64
+import hashlib
+import hmac
+import os
+import threading
+import time
+from cryptography.hazmat.primitives.kdf.scrypt import Scrypt
+from .ciphers import DEFAULT_CIPHER
+from .crypto import CryptoManager, key_fingerprint
+
+try:
+    from cryptography.hazmat.primitives.kdf.argon2 import Argon2id
+except ImportError:  # cryptography < 44
+    Argon2id = None
+
+DEFAULT_MAX_ENTRIES = 1024
+DEFAULT_TTL = 3600.0
+KDFS = ('scrypt', 'argon2id')
+SALT_SIZE = 16
+# scrypt: 2**15 iterations, ~32 MiB of memory
+SCRYPT_PARAMS = {'n': 2 ** 15, 'r': 8, 'p': 1}
+# argon2id: RFC 9106 second recommended option
+ARGON2_PARAMS = {'iterations': 3, 'lanes': 4, 'memory_cost': 64 * 1024}
+
+
+def derive_key(passphrase: Union[str, bytes], salt: bytes, kdf: str = 'scrypt') -> bytes:
+    """
+    Derive a CryptoManager key (urlsafe base64, as in key files) from a passphrase.
+
+    Args:
+        passphrase: The passphrase; str is encoded as UTF-8
+        salt: Random salt, at least SALT_SIZE bytes, stored alongside the data
+        kdf: 'scrypt' or 'argon2id'
+    """
+    if isinstance(passphrase, str):
+        passphrase = passphrase.encode('utf-8')
+    if len(salt) < SALT_SIZE:
+        raise ValueError(f"Salt must be at least {SALT_SIZE} bytes")
+    if kdf == 'scrypt':
+        raw = Scrypt(salt=salt, length=32, **SCRYPT_PARAMS).derive(passphrase)
+    elif kdf == 'argon2id':
+        if Argon2id is None:
+            raise ValueError("argon2id needs cryptography 44 or newer")
+        raw = Argon2id(salt=salt, length=32, **ARGON2_PARAMS).derive(passphrase)
+    else:
+        raise ValueError(f"Unknown KDF {kdf!r}, expected one of {', '.join(KDFS)}")
+    return base64.urlsafe_b64encode(raw)
+
+
+def key_id_for(key: bytes) -> str:
+    """Stable ID for a key that does not reveal it (for keys without a natural ID)."""
+    return key_fingerprint(key, b'fenc-keyring')
+
+
+class _Entry(NamedTuple):
+    crypto: CryptoManager
+    expires: float
+
+
+class KeyRing:
+    """LRU + TTL cache mapping key IDs to CryptoManager instances."""
+
+    def __init__(self, max_entries: int = DEFAULT_MAX_ENTRIES, ttl: Optional[float] = DEFAULT_TTL,
+                 clock: Callable[[], float] = time.monotonic):
+        """
+        Args:
+            max_entries: Entries kept before the least recently used is evicted
+            ttl: Seconds an entry stays valid after it was added (None for no limit)
+            clock: Monotonic time source (for tests)
+        """
+        if max_entries < 1:
+            raise ValueError("max_entries must be at least 1")
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._clock = clock
+        self._entries: 'OrderedDict[tuple, _Entry]' = OrderedDict()
+        self._lock = threading.Lock()
+        # Passphrases are looked up by a keyed digest, never stored
+        self._secret = os.urandom(32)
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._entries)
+
+    def get(self, key_id, cipher: str = DEFAULT_CIPHER) -> Optional[CryptoManager]:
+        """Return the CryptoManager cached under ``key_id``, if still valid."""
+        return self._lookup(('id', key_id, cipher))
+
+    def add(self, key_id, key: bytes, cipher: str = DEFAULT_CIPHER) -> CryptoManager:
+        """Cache a CryptoManager for ``key`` under ``key_id``, replacing any previous one."""
+        return self._store(('id', key_id, cipher), CryptoManager(bytes(key), cipher))
+
+    def get_or_add(self, key_id, load_key: Callable[[], bytes],
+                   cipher: str = DEFAULT_CIPHER) -> CryptoManager:
+        """Return the cached entry for ``key_id``, calling ``load_key()`` on a miss."""
+        crypto = self.get(key_id, cipher)
+        if crypto is None:
+            crypto = self.add(key_id, load_key(), cipher)
+        return crypto
+
+    def load(self, key_file: Union[str, Path], cipher: str = DEFAULT_CIPHER) -> CryptoManager:
+        """
+        Like CryptoManager.load_key, but the file is only read on a cache miss.
+
+        Entries are tied to the file's mtime and size, so a key file replaced
+        on disk is read again on the next call.
+        """
+        path = str(Path(key_file).resolve())
+        stat = os.stat(path)
+        cache_key = ('file', path, stat.st_mtime_ns, stat.st_size, cipher)
+        crypto = self._lookup(cache_key)
+        if crypto is None:
+            crypto = CryptoManager.load_key(key_file, cipher)
+            with self._lock:
+                # Entries for an older version of the file will never match again
+                for stale in [cache_key for cache_key in self._entries
+                              if cache_key[:2] == ('file', path)]:
+                    del self._entries[stale]
+            self._store(cache_key, crypto)
+        return crypto
+
+    def derive(self, passphrase: Union[str, bytes], salt: bytes, kdf: str = 'scrypt',
+               cipher: str = DEFAULT_CIPHER) -> CryptoManager:
+        """Return a CryptoManager for a passphrase key, running the KDF only on a miss."""
+        if isinstance(passphrase, str):
+            passphrase = passphrase.encode('utf-8')
+        digest = hmac.new(self._secret, passphrase, hashlib.sha256).digest()
+        cache_key = ('kdf', kdf, bytes(salt), digest, cipher)
+        crypto = self._lookup(cache_key)
+        if crypto is None:
+            # The KDF runs outside the lock so other keys are not held up
+            key = derive_key(passphrase, salt, kdf)
+            crypto = self._store(cache_key, CryptoManager(key, cipher))
+        return crypto
+
+    def evict(self, key_id) -> bool:
+        """Drop the entries for ``key_id``; return True if there were any."""
+        with self._lock:
+            cache_keys = [cache_key for cache_key in self._entries
+                          if cache_key[:2] == ('id', key_id)]
+            for cache_key in cache_keys:
+                del self._entries[cache_key]
+        return bool(cache_keys)
+
+    def clear(self) -> None:
+        """Drop every entry."""
+        with self._lock:
+            self._entries = OrderedDict()
+
+    def _lookup(self, cache_key: tuple) -> Optional[CryptoManager]:
+        with self._lock:
+            entry = self._entries.get(cache_key)
+            if entry is None:
+                return None
+            if entry.expires <= self._clock():
+                del self._entries[cache_key]
+                return None
+            self._entries.move_to_end(cache_key)
+            return entry.crypto
+
+    def _store(self, cache_key: tuple, crypto: CryptoManager) -> CryptoManager:
+        expires = self._clock() + self.ttl if self.ttl is not None else float('inf')
+        with self._lock:
+            self._entries.pop(cache_key, None)
+            self._entries[cache_key] = _Entry(crypto, expires)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return crypto
+
+
+_default_keyring: Optional[KeyRing] = None
+_default_lock = threading.Lock()
+
+
+def default_keyring() -> KeyRing:
+    """Process-wide KeyRing shared by callers that do not manage their own."""
+    global _default_keyring
+    with _default_lock:
+        if _default_keyring is None:
+            _default_keyring = KeyRing()
+        return _default_keyring
@@ -0,0 +1,215 @@
+"""Persistent record of encrypted files, used to skip unchanged inputs.
+
+The manifest is a SQLite database kept in the output directory. Each row
+maps a source file (size, mtime and BLAKE2b content hash) to the output it
+produced (size, mtime and hash), the key that produced it and the
+encryption options (cipher, compression, chunk size...). On the next run a
+file is skipped when the key and options match and the size and mtime of
+both the source and the output are unchanged; if only an mtime moved, that file's content hash
+decides, so an output replaced or corrupted in place is written again.
+"""
+from pathlib import Path
+from typing import List, NamedTuple, Optional, Union
+import hashlib
+import json
+import logging
+import sqlite3
+import threading
+import time
+from .crypto import key_fingerprint
+
+logger = logging.getLogger(__name__)
+
+MANIFEST_NAME = '.file-encryptor-manifest.db'
+# Rows written before the manifest commits
+COMMIT_EVERY = 500
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS files (
+    source TEXT PRIMARY KEY,
+    size INTEGER NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    source_hash TEXT NOT NULL,
+    output TEXT NOT NULL,
+    output_size INTEGER NOT NULL,
+    output_hash TEXT NOT NULL,
+    key_id TEXT NOT NULL,
+    run_id INTEGER NOT NULL,
+    output_mtime_ns INTEGER,
+    options TEXT
+)
+"""
+# Columns added after the first release, with their types
+_ADDED_COLUMNS = (('output_mtime_ns', 'INTEGER'), ('options', 'TEXT'))
+
+
+def new_hasher():
+    """Hash object used for source and output checksums."""
+    return hashlib.blake2b(digest_size=32)
+
+
+def hash_file(path: Union[str, Path], block_size: int = 1024 * 1024) -> str:
+    """Return the hex BLAKE2b digest of a file's contents."""
+    hasher = new_hasher()
+    with open(path, 'rb') as stream:
+        for block in iter(lambda: stream.read(block_size), b''):
+            hasher.update(block)
+    return hasher.hexdigest()
+
+
+class ManifestEntry(NamedTuple):
+    source: str
+    size: int
+    mtime_ns: int
+    source_hash: str
+    output: str
+    output_size: int
+    output_hash: str
+    key_id: str
+    run_id: int
+    # None in manifests written before they were recorded
+    output_mtime_ns: Optional[int]
+    options: Optional[str]
+
+
+class Manifest:
+    """Thread-safe manifest shared by the workers of one run."""
+
+    def __init__(self, path: Union[str, Path], key_id: str, options: Optional[dict] = None):
+        """
+        Args:
+            path: Database file
+            key_id: Fingerprint of the key used in this run (see for_output)
+            options: Encryption options of this run (JSON-serialisable);
+                outputs written with other options are not current
+        """
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.key_id = key_id
+        self.options = json.dumps(options or {}, sort_keys=True, separators=(',', ':'))
+        self.run_id = time.time_ns()
+        self._lock = threading.Lock()
+        self._pending = 0
+        self._db = sqlite3.connect(str(self.path), check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(_SCHEMA)
+        columns = [row[1] for row in self._db.execute("PRAGMA table_info(files)")]
+        for column, column_type in _ADDED_COLUMNS:
+            if column not in columns:
+                self._db.execute(f"ALTER TABLE files ADD COLUMN {column} {column_type}")
+        self._db.commit()
+
+    @classmethod
+    def for_output(cls, output_dir: Union[str, Path], key: bytes,
+                   options: Optional[dict] = None) -> 'Manifest':
+        """Open the manifest stored in ``output_dir`` for runs using ``key`` and ``options``."""
+        return cls(Path(output_dir) / MANIFEST_NAME, key_fingerprint(key, b'fenc-manifest'),
+                   options)
+
+    @staticmethod
+    def _key(source: Union[str, Path]) -> str:
+        return str(Path(source).resolve())
+
+    def get(self, source: Union[str, Path]) -> Optional[ManifestEntry]:
+        """Return the entry recorded for ``source``, if any."""
+        with self._lock:
+            row = self._db.execute(
+                f"SELECT {', '.join(ManifestEntry._fields)} FROM files WHERE source = ?",
+                (self._key(source),)
+            ).fetchone()
+        return ManifestEntry(*row) if row else None
+
+    def is_current(self, source: Union[str, Path], output: Union[str, Path]) -> bool:
+        """
+        Return True if ``output`` is an up-to-date encryption of ``source``.
+
+        Current entries are marked as seen in this run.
+        """
+        entry = self.get(source)
+        if (entry is None or entry.key_id != self.key_id or entry.options != self.options
+                or entry.output != self._key(output)):
+            return False
+        try:
+            source_stat = Path(source).stat()
+            output_stat = Path(output).stat()
+        except OSError:
+            return False
+        if output_stat.st_size != entry.output_size or source_stat.st_size != entry.size:
+            return False
+
+        # Touched but maybe not modified: let the content decide
+        if source_stat.st_mtime_ns != entry.mtime_ns:
+            if hash_file(source) != entry.source_hash:
+                return False
+        if output_stat.st_mtime_ns != entry.output_mtime_ns:
+            if hash_file(output) != entry.output_hash:
+                return False
+        self._execute(
+            "UPDATE files SET mtime_ns = ?, output_mtime_ns = ?, run_id = ? WHERE source = ?",
+            (source_stat.st_mtime_ns, output_stat.st_mtime_ns, self.run_id, entry.source)
+        )
+        return True
+
+    def record(self, source: Union[str, Path], output: Union[str, Path],
+               source_hash: str, output_hash: str, source_stat=None) -> None:
+        """Record that ``source`` was encrypted to ``output`` in this run.
+
+        Pass the ``os.stat_result`` taken before encryption started so a file
+        modified during encryption is picked up again next time.
+        """
+        source_stat = source_stat or Path(source).stat()
+        output_stat = Path(output).stat()
+        self._execute(
+            "INSERT OR REPLACE INTO files (source, size, mtime_ns, source_hash, output, "
+            "output_size, output_hash, key_id, run_id, output_mtime_ns, options) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (self._key(source), source_stat.st_size, source_stat.st_mtime_ns, source_hash,
+             self._key(output), output_stat.st_size, output_hash, self.key_id, self.run_id,
+             output_stat.st_mtime_ns, self.options)
+        )
+
+    def _execute(self, sql: str, params: tuple) -> None:
+        with self._lock:
+            self._db.execute(sql, params)
+            self._pending += 1
+            if self._pending >= COMMIT_EVERY:
+                self._db.commit()
+                self._pending = 0
+
+    def prune(self, delete_outputs: bool = True) -> List[str]:
+        """
+        Forget sources that no longer exist and optionally delete their outputs.
+
+        Only entries not seen in this run are checked.
+
+        Returns:
+            Output paths of the pruned entries
+        """
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT source, output FROM files WHERE run_id != ?", (self.run_id,)
+            ).fetchall()
+        pruned = []
+        for source, output in rows:
+            if Path(source).exists():
+                continue
+            if delete_outputs:
+                try:
+                    Path(output).unlink()
+                except FileNotFoundError:
+                    pass
+            self._execute("DELETE FROM files WHERE source = ?", (source,))
+            pruned.append(output)
+        return pruned
+
+    def close(self) -> None:
+        """Commit outstanding rows and close the database."""
+        with self._lock:
+            self._db.commit()
+            self._db.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
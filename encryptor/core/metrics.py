@@ -0,0 +1,281 @@
+"""Run metrics and the sinks that report them.
+
+A Metrics object collects counters, gauges and latency histograms and
+forwards events (one per file, plus a run summary) to its sinks:
+JsonLinesSink writes them as JSON lines, PrometheusSink keeps a text file
+in the Prometheus exposition format up to date, and ProgressSink drives the
+CLI's progress bar.
+
+Instrumentation is opt-in: code takes ``metrics=None`` and falls back to
+NULL_METRICS, whose ``timed``/``timed_iter`` hand back the function or
+iterable unchanged, so disabled metrics add nothing to the per-chunk path.
+"""
+from bisect import bisect_left
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, TextIO, Tuple, Union
+import json
+import os
+import threading
+import time
+
+# Upper bounds (seconds) of the latency histogram buckets
+LATENCY_BUCKETS = (0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0, 30.0, 120.0)
+# Seconds between two rewrites of a Prometheus text file
+PROMETHEUS_INTERVAL = 5.0
+
+_Key = Tuple[str, Tuple[Tuple[str, str], ...]]
+
+
+def _key(name: str, labels: dict) -> _Key:
+    return name, tuple(sorted((label, str(value)) for label, value in labels.items()))
+
+
+class Histogram:
+    """Cumulative-bucket histogram, as Prometheus expects."""
+
+    def __init__(self, buckets: Tuple[float, ...] = LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def as_dict(self) -> dict:
+        cumulative, total = {}, 0
+        for bound, count in zip(self.buckets + (float('inf'),), self.counts):
+            total += count
+            cumulative['+Inf' if bound == float('inf') else repr(bound)] = total
+        return {'buckets': cumulative, 'sum': self.sum, 'count': self.count}
+
+
+class Metrics:
+    """Thread-safe metric store that forwards events to sinks."""
+
+    enabled = True
+
+    def __init__(self, sinks: Iterable = ()):
+        """
+        Args:
+            sinks: Objects with ``handle(event, metrics)`` and ``close(metrics)``
+        """
+        self.sinks = list(sinks)
+        self._counters: Dict[_Key, float] = {}
+        self._gauges: Dict[_Key, float] = {}
+        self._histograms: Dict[_Key, Histogram] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, name: str, value: float = 1, **labels) -> None:
+        """Add ``value`` to a counter."""
+        key = _key(name, labels)
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def set(self, name: str, value: float, **labels) -> None:
+        """Set a gauge."""
+        with self._lock:
+            self._gauges[_key(name, labels)] = value
+
+    def observe(self, name: str, value: float, **labels) -> None:
+        """Record a value (usually seconds) in a histogram."""
+        key = _key(name, labels)
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = Histogram()
+            histogram.observe(value)
+
+    @contextmanager
+    def time(self, name: str, **labels) -> Iterator[None]:
+        """Observe the duration of the ``with`` block in histogram ``name``."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - start, **labels)
+
+    def timed(self, func: Callable, name: str, **labels) -> Callable:
+        """Wrap ``func`` so each call's duration is observed in ``name``."""
+        def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                self.observe(name, time.perf_counter() - start, **labels)
+        return wrapper
+
+    def timed_iter(self, items: Iterable, name: str, **labels) -> Iterator:
+        """Yield from ``items``, observing how long each item took to produce."""
+        items = iter(items)
+        while True:
+            start = time.perf_counter()
+            try:
+                item = next(items)
+            except StopIteration:
+                return
+            self.observe(name, time.perf_counter() - start, **labels)
+            yield item
+
+    def emit(self, event: str, **fields) -> None:
+        """Send an event (e.g. 'file' or 'summary') to every sink."""
+        record = {'ts': time.time(), 'event': event, **fields}
+        for sink in self.sinks:
+            sink.handle(record, self)
+
+    def snapshot(self) -> dict:
+        """Current values as a JSON-serializable dict."""
+        def name(key: _Key) -> str:
+            metric, labels = key
+            if not labels:
+                return metric
+            return metric + '{' + ','.join(f'{label}={value}' for label, value in labels) + '}'
+
+        with self._lock:
+            return {
+                'counters': {name(key): value for key, value in self._counters.items()},
+                'gauges': {name(key): value for key, value in self._gauges.items()},
+                'histograms': {name(key): histogram.as_dict()
+                               for key, histogram in self._histograms.items()},
+            }
+
+    def prometheus(self) -> str:
+        """Current values in the Prometheus text exposition format."""
+        def labelled(metric: str, labels, extra: Tuple[Tuple[str, str], ...] = ()) -> str:
+            pairs = labels + extra
+            if not pairs:
+                return metric
+            escaped = (value.replace('\\', '\\\\').replace('"', '\\"') for _, value in pairs)
+            return metric + '{' + ','.join(
+                f'{label}="{value}"' for (label, _), value in zip(pairs, escaped)
+            ) + '}'
+
+        lines: List[str] = []
+        with self._lock:
+            for kind, values in (('counter', self._counters), ('gauge', self._gauges)):
+                typed = set()
+                for (metric, labels), value in sorted(values.items()):
+                    if metric not in typed:
+                        lines.append(f"# TYPE {metric} {kind}")
+                        typed.add(metric)
+                    lines.append(f"{labelled(metric, labels)} {value}")
+            typed = set()
+            for (metric, labels), histogram in sorted(self._histograms.items(),
+                                                      key=lambda item: item[0]):
+                if metric not in typed:
+                    lines.append(f"# TYPE {metric} histogram")
+                    typed.add(metric)
+                for bound, count in histogram.as_dict()['buckets'].items():
+                    lines.append(f"{labelled(metric + '_bucket', labels, (('le', bound),))} {count}")
+                lines.append(f"{labelled(metric + '_sum', labels)} {histogram.sum}")
+                lines.append(f"{labelled(metric + '_count', labels)} {histogram.count}")
+        return '\n'.join(lines) + '\n'
+
+    def close(self) -> None:
+        """Flush and close every sink."""
+        for sink in self.sinks:
+            sink.close(self)
+
+
+class NullMetrics(Metrics):
+    """Metrics that record nothing; the default when metrics are off."""
+
+    enabled = False
+
+    def __init__(self):
+        super().__init__()
+
+    def inc(self, name: str, value: float = 1, **labels) -> None:
+        pass
+
+    def set(self, name: str, value: float, **labels) -> None:
+        pass
+
+    def observe(self, name: str, value: float, **labels) -> None:
+        pass
+
+    def timed(self, func: Callable, name: str, **labels) -> Callable:
+        return func
+
+    def timed_iter(self, items: Iterable, name: str, **labels) -> Iterable:
+        return items
+
+    def emit(self, event: str, **fields) -> None:
+        pass
+
+
+NULL_METRICS = NullMetrics()
+
+
+class JsonLinesSink:
+    """Writes every event as one JSON object per line."""
+
+    def __init__(self, stream: TextIO, close_stream: bool = False):
+        self.stream = stream
+        self._close_stream = close_stream
+        self._lock = threading.Lock()
+
+    @classmethod
+    def open(cls, path: Union[str, Path]) -> 'JsonLinesSink':
+        """Append events to the file at ``path``."""
+        return cls(open(path, 'a', buffering=1), close_stream=True)
+
+    def handle(self, event: dict, metrics: Metrics) -> None:
+        line = json.dumps(event, default=str) + '\n'
+        with self._lock:
+            self.stream.write(line)
+
+    def close(self, metrics: Metrics) -> None:
+        with self._lock:
+            self.stream.flush()
+            if self._close_stream:
+                self.stream.close()
+
+
+class PrometheusSink:
+    """Keeps a Prometheus text file (e.g. for node_exporter's textfile collector) current."""
+
+    def __init__(self, path: Union[str, Path], interval: float = PROMETHEUS_INTERVAL,
+                 clock: Callable[[], float] = time.monotonic):
+        self.path = Path(path)
+        self.interval = interval
+        self._clock = clock
+        self._last_write: Optional[float] = None
+        self._lock = threading.Lock()
+
+    def handle(self, event: dict, metrics: Metrics) -> None:
+        now = self._clock()
+        with self._lock:
+            if self._last_write is not None and now - self._last_write < self.interval:
+                return
+            self._last_write = now
+        self._write(metrics)
+
+    def close(self, metrics: Metrics) -> None:
+        self._write(metrics)
+
+    def _write(self, metrics: Metrics) -> None:
+        # Replaced atomically so a scraper never reads a half-written file
+        temporary = self.path.with_name(f".{self.path.name}.{os.getpid()}.tmp")
+        temporary.write_text(metrics.prometheus())
+        os.replace(temporary, self.path)
+
+
+class ProgressSink:
+    """tqdm progress bar advanced by 'file' events."""
+
+    def __init__(self, desc: str, unit: str = 'file'):
+        from tqdm import tqdm
+        self._bar = tqdm(unit=unit, desc=desc)
+        self._lock = threading.Lock()
+
+    def handle(self, event: dict, metrics: Metrics) -> None:
+        if event['event'] == 'file':
+            with self._lock:
+                self._bar.update(1)
+
+    def close(self, metrics: Metrics) -> None:
+        self._bar.close()
@@ -0,0 +1,119 @@
+"""Ordered parallel map used to encrypt/decrypt the chunks of one file.
+
+Functions that take an ``executor`` accept either a pool kind from EXECUTORS,
+in which case each call starts and shuts down a pool of its own, or a pool
+from worker_pool that a whole run shares. Process pools take a while to
+start, so batch runs create one pool up front rather than one per file.
+"""
+from collections import deque
+from contextlib import contextmanager, nullcontext
+from itertools import islice
+from typing import TYPE_CHECKING, Callable, Iterable, Iterator, Optional, TypeVar, Union
+import os
+
+if TYPE_CHECKING:
+    from concurrent.futures import Executor
+
+T = TypeVar('T')
+R = TypeVar('R')
+
+EXECUTORS = ('thread', 'process')
+# A kind from EXECUTORS, or a pool shared by a run (see worker_pool)
+ExecutorLike = Union[str, 'Executor']
+
+
+def resolve_jobs(jobs: Optional[int]) -> int:
+    """Turn a ``--jobs`` value into a worker count (0 or None means one per core)."""
+    if not jobs:
+        return os.cpu_count() or 1
+    if jobs < 0:
+        raise ValueError("jobs must be a positive number, or 0 for one per CPU core")
+    return jobs
+
+
+def in_flight_limit(jobs: Optional[int]) -> int:
+    """Maximum number of items ordered_map keeps in flight for ``jobs``."""
+    return 2 * resolve_jobs(jobs)
+
+
+def is_process_pool(executor: ExecutorLike) -> bool:
+    """True if ``executor`` (a kind or a pool) runs work in other processes."""
+    if isinstance(executor, str):
+        return executor == 'process'
+    from concurrent.futures import ProcessPoolExecutor
+    return isinstance(executor, ProcessPoolExecutor)
+
+
+@contextmanager
+def worker_pool(kind: str, jobs: Optional[int]) -> Iterator[ExecutorLike]:
+    """
+    Context manager yielding one pool to pass as ``executor`` for a whole run.
+
+    Yields ``kind`` itself when ``jobs`` resolves to 1, since ordered_map
+    then runs everything inline.
+    """
+    jobs = resolve_jobs(jobs)
+    if jobs == 1:
+        yield kind
+        return
+    with _create_executor(kind, jobs) as pool:
+        yield pool
+
+
+def _create_executor(kind: str, jobs: int) -> 'Executor':
+    # Imported here so the CLI can read EXECUTORS without loading the pools
+    from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+    if kind == 'thread':
+        return ThreadPoolExecutor(max_workers=jobs, thread_name_prefix='cipher')
+    if kind == 'process':
+        return ProcessPoolExecutor(max_workers=jobs)
+    raise ValueError(f"Unknown executor {kind!r}, expected one of {', '.join(EXECUTORS)}")
+
+
+def ordered_map(func: Callable[[T], R], items: Iterable[T], jobs: int = 1,
+                executor: ExecutorLike = 'thread') -> Iterator[R]:
+    """
+    Apply ``func`` to every item on a worker pool and yield results in order.
+
+    The caller's thread acts as both the reader stage (pulling from ``items``)
+    and the ordered writer stage (consuming the results). At most ``2 * jobs``
+    items are in flight, so memory stays bounded however long ``items`` is.
+    Inputs with a single item, or ``jobs == 1``, run inline without a pool.
+
+    Args:
+        func: Function applied to each item (must be picklable for processes)
+        items: Input items, typically plaintext or ciphertext chunks
+        jobs: Number of workers (0 for one per CPU core); with a shared pool
+            it only limits the items in flight
+        executor: 'thread' (cryptography releases the GIL) or 'process' for
+            a pool of this call's own, or a shared pool from worker_pool
+
+    Yields:
+        ``func(item)`` for each item, in input order
+    """
+    jobs = resolve_jobs(jobs)
+    items = iter(items)
+    head = list(islice(items, 2))
+    if jobs == 1 or len(head) < 2:
+        for item in head:
+            yield func(item)
+        for item in items:
+            yield func(item)
+        return
+
+    window = in_flight_limit(jobs)
+    pending = deque()
+    own_pool = isinstance(executor, str)
+    with _create_executor(executor, jobs) if own_pool else nullcontext(executor) as pool:
+        try:
+            for item in head:
+                pending.append(pool.submit(func, item))
+            for item in items:
+                if len(pending) >= window:
+                    yield pending.popleft().result()
+                pending.append(pool.submit(func, item))
+            while pending:
+                yield pending.popleft().result()
+        finally:
+            for future in pending:
+                future.cancel()
@@ -0,0 +1,152 @@
+"""Seekable, read-only file object over an encrypted file.
+
+Only the chunks covering the bytes actually read are decrypted, using the
+container's chunk index to find them. A small LRU cache of decrypted
+chunks serves repeated nearby reads. ``read(n)`` returns ``n`` bytes unless
+the end of the file is reached, so the object can be handed to ``tarfile``,
+``zipfile`` and friends as a regular binary file.
+
+Legacy files (concatenated Fernet tokens) are supported too, since their
+tokens have a fixed size. Streamed containers written without an index can
+only be decrypted sequentially and are rejected.
+"""
+from bisect import bisect_right
+from collections import OrderedDict
+from itertools import accumulate
+from pathlib import Path
+from typing import Union
+import io
+import os
+from .container import (LEGACY_CHUNK_SIZE, MAGIC, ContainerError, ContainerReader,
+                        TruncatedError, is_container, legacy_token_size)
+from .compression import codec_for, unpack_chunk
+from .crypto import CryptoManager
+
+# Decrypted chunks kept for repeated nearby reads
+DEFAULT_CACHE_CHUNKS = 8
+
+
+class EncryptedFileReader(io.RawIOBase):
+    """Random-access reader for the plaintext of an encrypted file."""
+
+    def __init__(self, path: Union[str, Path], crypto: CryptoManager,
+                 cache_chunks: int = DEFAULT_CACHE_CHUNKS):
+        """
+        Args:
+            path: Encrypted file (container or legacy format)
+            crypto: CryptoManager holding the key
+            cache_chunks: Number of decrypted chunks to keep (at least 1)
+        """
+        super().__init__()
+        self.name = str(path)
+        self._cache_chunks = max(1, cache_chunks)
+        self._cache: 'OrderedDict[int, bytes]' = OrderedDict()
+        self._position = 0
+        self._file = open(path, 'rb')
+        try:
+            if is_container(self._file.read(len(MAGIC))):
+                sizes = self._open_container(crypto)
+            else:
+                sizes = self._open_legacy(crypto)
+        except BaseException:
+            self._file.close()
+            raise
+        self._starts = list(accumulate(sizes, initial=0))
+
+    def _open_container(self, crypto: CryptoManager) -> list:
+        self._file.seek(0)
+        container = ContainerReader(self._file)
+        if not container.header.indexed:
+            raise ContainerError("Streamed container has no chunk index - decrypt it sequentially")
+        suite = crypto.suite_for(container.header)
+        if suite.binds_position and not container.index:
+            raise TruncatedError("Encrypted file has no chunks - it is truncated")
+        codec = codec_for(container.header)
+        last = len(container.index) - 1
+
+        def decrypt(number: int) -> bytes:
+            chunk = suite.decrypt_chunk(container.read_frame(number), number, number == last)
+            if codec is not None:
+                chunk = unpack_chunk(codec, chunk, container.header.chunk_size)
+            # Plaintext lengths in the index are not authenticated; check them
+            if len(chunk) != container.index[number][1]:
+                raise ContainerError(f"Chunk index entry {number} does not match its chunk")
+            return chunk
+
+        self._decrypt = decrypt
+        return [plain_len for _, plain_len in container.index]
+
+    def _open_legacy(self, crypto: CryptoManager) -> list:
+        token_size = legacy_token_size()
+        count = -(-os.fstat(self._file.fileno()).st_size // token_size)
+
+        def decrypt(number: int) -> bytes:
+            self._file.seek(number * token_size)
+            return crypto.decrypt_data(self._file.read(token_size))
+
+        self._decrypt = decrypt
+        if not count:
+            return []
+        # Only the last token can be short; its size needs decrypting it
+        return [LEGACY_CHUNK_SIZE] * (count - 1) + [len(self._chunk(count - 1))]
+
+    @property
+    def size(self) -> int:
+        """Plaintext size in bytes."""
+        return self._starts[-1]
+
+    def _chunk(self, number: int) -> bytes:
+        chunk = self._cache.get(number)
+        if chunk is None:
+            chunk = self._cache[number] = self._decrypt(number)
+            if len(self._cache) > self._cache_chunks:
+                self._cache.popitem(last=False)
+        else:
+            self._cache.move_to_end(number)
+        return chunk
+
+    def readable(self) -> bool:
+        return True
+
+    def seekable(self) -> bool:
+        return True
+
+    def readinto(self, buffer) -> int:
+        self._checkClosed()
+        view = memoryview(buffer).cast('B')
+        done = 0
+        while done < len(view) and self._position < self.size:
+            number = bisect_right(self._starts, self._position) - 1
+            offset = self._position - self._starts[number]
+            part = memoryview(self._chunk(number))[offset:offset + len(view) - done]
+            if not part:
+                raise ContainerError(f"Chunk {number} is shorter than the index says")
+            view[done:done + len(part)] = part
+            done += len(part)
+            self._position += len(part)
+        return done
+
+    def seek(self, offset: int, whence: int = io.SEEK_SET) -> int:
+        self._checkClosed()
+        if whence == io.SEEK_SET:
+            position = offset
+        elif whence == io.SEEK_CUR:
+            position = self._position + offset
+        elif whence == io.SEEK_END:
+            position = self.size + offset
+        else:
+            raise ValueError(f"Invalid whence {whence}")
+        if position < 0:
+            raise ValueError(f"Negative seek position {position}")
+        self._position = position
+        return position
+
+    def tell(self) -> int:
+        self._checkClosed()
+        return self._position
+
+    def close(self) -> None:
+        if not self.closed:
+            self._file.close()
+            self._cache.clear()
+        super().close()
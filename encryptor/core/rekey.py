@@ -0,0 +1,219 @@
+"""Key rotation for encrypted files.
+
+Files written with envelope encryption (the default) keep their chunks
+encrypted under a random per-file data key, which the header stores wrapped
+under the key file's key. Rotating such a file only unwraps that data key
+with the old key and wraps it with the new one: the wrapped key always has
+the same length, so the header is rewritten in place with one small write
+and nothing else in the file is read or touched.
+
+Other files (containers without a data key or written with the read-only
+``fernet-legacy`` suite, legacy token files) and every
+file when ``full=True`` are re-encrypted in a single pass through
+FileOperations.rekey_stream: chunks are decrypted and encrypted again in
+memory, in parallel, and the result replaces the file atomically. The new
+file gets a data key of its own, so its next rotation is a header rewrite.
+
+Rewrapping keeps the data key itself. If the old key may have leaked, use
+``full=True`` so the data is encrypted under new data keys as well.
+
+Chunk store recipes are rekeyed like other files, but their chunks stay
+under the store's data key, which ``chunkstore.rewrap_store`` moves to the
+new key. A recipe is refused unless its store is rekeyed in the same run,
+since rotating it alone would leave the store unreadable with the new key.
+"""
+from pathlib import Path
+from typing import Callable, Collection, Dict, Iterable, Optional, Tuple, Union
+import os
+import shutil
+import threading
+from .batch import BatchScheduler, RunSummary
+from .checkpoint import AtomicOutput
+from .ciphers import FernetSuite, WrongKeyError
+from .container import (HEADER_SIZE, MAGIC, ContainerError, ContainerReader, encode_meta,
+                        is_container)
+from .crypto import CryptoManager
+from .file_ops import FileOperations
+from .metrics import NULL_METRICS, Metrics
+from .pipeline import ExecutorLike
+
+REWRAPPED = 'rewrapped'
+REENCRYPTED = 'reencrypted'
+CURRENT = 'current'
+
+
+def rewrap_header(path: Union[str, Path], old_crypto: CryptoManager,
+                  new_crypto: CryptoManager) -> Optional[str]:
+    """
+    Rewrap a file's data key under the new key, in place.
+
+    Args:
+        path: Encrypted file
+        old_crypto: CryptoManager holding the current key
+        new_crypto: CryptoManager holding the new key
+
+    Returns:
+        REWRAPPED, CURRENT if the new key already unwraps the data key, or
+        None if the file has no data key or uses the legacy Fernet suite and
+        must be re-encrypted
+
+    Raises:
+        WrongKeyError: Neither key unwraps the data key
+    """
+    with open(path, 'r+b') as f:
+        if not is_container(f.read(len(MAGIC))):
+            return None
+        f.seek(0)
+        header = ContainerReader(f).header
+        meta = header.metadata
+        wrapped = meta.get('data_key')
+        if wrapped is None or header.cipher == FernetSuite.id:
+            return None
+        try:
+            data_key = old_crypto.unwrap_key(wrapped, header.cipher)
+        except WrongKeyError:
+            # Already rotated, e.g. by an earlier run that was interrupted
+            new_crypto.unwrap_key(wrapped, header.cipher)
+            return CURRENT
+        meta['data_key'] = new_crypto.wrap_key(data_key, header.cipher)
+        encoded = encode_meta(meta)
+        if len(encoded) != len(header.meta):
+            return None
+        # One write well inside the first block, then synced
+        f.seek(HEADER_SIZE)
+        f.write(encoded)
+        f.flush()
+        os.fsync(f.fileno())
+    return REWRAPPED
+
+
+def reencrypt_file(path: Union[str, Path], old_crypto: CryptoManager,
+                   new_crypto: CryptoManager, jobs: int = 1, executor: ExecutorLike = 'thread',
+                   io_mode: str = 'auto', metrics: Optional[Metrics] = None) -> int:
+    """
+    Re-encrypt a file under the new key and atomically replace it.
+
+    Plaintext only ever exists in memory. The file keeps its permissions.
+
+    Returns:
+        Number of plaintext bytes re-encrypted
+    """
+    path = Path(path)
+    with open(path, 'rb') as infile, AtomicOutput(path) as output:
+        shutil.copymode(path, output.partial_path)
+        return FileOperations.rekey_stream(infile, output.file, old_crypto, new_crypto,
+                                           jobs=jobs, executor=executor, io_mode=io_mode,
+                                           metrics=metrics)
+
+
+def _check_recipe(path: Union[str, Path], stores: Collection[str]) -> None:
+    """Refuse a chunk store recipe whose store is not rekeyed too."""
+    with open(path, 'rb') as f:
+        if not is_container(f.read(len(MAGIC))):
+            return
+        f.seek(0)
+        meta = ContainerReader(f).header.metadata
+    if 'recipe' in meta and meta.get('store') not in stores:
+        raise ContainerError(f"{path} is a chunk store recipe - rekey it together with its "
+                             f"store (--store), or the store stays on the old key")
+
+
+def rekey_file(path: Union[str, Path], old_crypto: CryptoManager, new_crypto: CryptoManager,
+               full: bool = False, jobs: int = 1, executor: ExecutorLike = 'thread',
+               io_mode: str = 'auto', metrics: Optional[Metrics] = None,
+               stores: Collection[str] = ()) -> str:
+    """
+    Move one encrypted file from the old key to the new one.
+
+    Args:
+        path: Encrypted file (container or legacy format)
+        old_crypto: CryptoManager holding the current key
+        new_crypto: CryptoManager holding the new key; its cipher and
+            envelope setting apply to files that are re-encrypted
+        full: Re-encrypt even files whose data key could just be rewrapped
+        jobs: Number of chunks re-encrypted concurrently (0 for one per core)
+        executor: 'thread' or 'process' worker pool, or a
+            pool shared by the run (see pipeline.worker_pool)
+        io_mode: Input mode, one of 'auto', 'buffered', 'readinto', 'mmap',
+            'direct'
+        metrics: Receives re-encryption timings and chunk counts
+        stores: IDs of the chunk stores rekeyed in the same run (see
+            chunkstore.rewrap_store); recipes of other stores are refused
+
+    Returns:
+        REWRAPPED, REENCRYPTED, or CURRENT for a file the new key already opens
+
+    Raises:
+        ContainerError: The file is a recipe of a store not in ``stores``
+    """
+    _check_recipe(path, stores)
+    if not full:
+        action = rewrap_header(path, old_crypto, new_crypto)
+        if action is not None:
+            return action
+    try:
+        reencrypt_file(path, old_crypto, new_crypto, jobs, executor, io_mode, metrics)
+    except WrongKeyError:
+        if not _opens(path, new_crypto):
+            raise
+        return CURRENT
+    return REENCRYPTED
+
+
+def _opens(path: Union[str, Path], crypto: CryptoManager) -> bool:
+    """True if ``crypto`` unwraps the data key in the file's header."""
+    with open(path, 'rb') as f:
+        header = ContainerReader(f).header
+    try:
+        crypto.suite_for(header)
+    except WrongKeyError:
+        return False
+    return 'data_key' in header.metadata
+
+
+def rekey_files(files: Iterable[Union[str, Path]], old_crypto: CryptoManager,
+                new_crypto: CryptoManager, full: bool = False, workers: int = 0,
+                jobs: int = 0, executor: ExecutorLike = 'thread', io_mode: str = 'auto',
+                on_file: Optional[Callable[[Path, str], None]] = None,
+                metrics: Optional[Metrics] = None,
+                stores: Collection[str] = ()) -> Tuple[Dict[str, int], RunSummary]:
+    """
+    Rekey many files concurrently through a BatchScheduler.
+
+    Args:
+        files: Encrypted files, e.g. from verify.find_encrypted
+        old_crypto: CryptoManager holding the current key
+        new_crypto: CryptoManager holding the new key
+        full: Re-encrypt every file instead of rewrapping data keys
+        workers: Files processed concurrently (0 for one per core)
+        jobs: Chunk-level parallelism for large files (0 for one per core)
+        executor: 'thread' or 'process' worker pool for chunks, or a
+            pool shared by the run (see pipeline.worker_pool)
+        io_mode: Input mode, one of 'auto', 'buffered', 'readinto', 'mmap',
+            'direct'
+        on_file: Called with each file and the action taken
+        metrics: Receives the scheduler's per-file metrics and a
+            ``fenc_rekey_total{action}`` count
+        stores: IDs of the chunk stores rekeyed in the same run
+
+    Returns:
+        Files per action, and the run summary (files already on the new key
+        count as skipped)
+    """
+    metrics = metrics or NULL_METRICS
+    counts = dict.fromkeys((REWRAPPED, REENCRYPTED, CURRENT), 0)
+    lock = threading.Lock()
+
+    def rekey(input_path: Path, output_path: None, jobs: int) -> bool:
+        action = rekey_file(input_path, old_crypto, new_crypto, full, jobs, executor,
+                            io_mode, metrics, stores)
+        metrics.inc('fenc_rekey_total', action=action)
+        with lock:
+            counts[action] += 1
+        if on_file is not None:
+            on_file(input_path, action)
+        return action != CURRENT
+
+    scheduler = BatchScheduler(rekey, workers=workers, chunk_jobs=jobs, metrics=metrics)
+    summary = scheduler.run((path, None) for path in files)
+    return counts, summary
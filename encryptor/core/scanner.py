@@ -0,0 +1,211 @@
+"""Directory scanning for the file pipeline.
+
+Directories are listed with ``os.scandir``, whose entries already carry the
+file type on most platforms, so deciding file-or-directory costs no extra
+``stat``. Name-based filters (extensions, include/exclude globs) run before
+any size lookup. In recursive scans subdirectories are listed concurrently
+by a small thread pool, and matches are streamed to the caller through a
+bounded queue so processing can start while the scan is still running.
+"""
+from concurrent.futures import ThreadPoolExecutor
+from fnmatch import fnmatch
+from functools import partial
+from pathlib import Path
+from typing import Callable, Iterable, Iterator, List, Optional, Tuple, Union
+import logging
+import os
+import queue
+import threading
+
+logger = logging.getLogger(__name__)
+
+# Directory listings buffered ahead of the consumer
+QUEUE_BATCHES = 64
+
+
+def default_scan_workers() -> int:
+    """Threads used for recursive scans; listing directories is I/O bound."""
+    return min(32, (os.cpu_count() or 1) + 4)
+
+
+class ScanFilter:
+    """
+    Decides which directory entries a scan yields.
+
+    Glob patterns are matched against both the entry's name and its path
+    relative to the scan root (with ``/`` separators), so ``*.tmp`` and
+    ``build/*`` both work. Excluded directories are not descended into.
+    """
+
+    def __init__(self, extensions: Optional[Iterable[str]] = None,
+                 include: Optional[Iterable[str]] = None,
+                 exclude: Optional[Iterable[str]] = None,
+                 min_size: Optional[int] = None, max_size: Optional[int] = None):
+        """
+        Args:
+            extensions: File extensions to include, e.g. ['.txt'] (None for all)
+            include: Glob patterns a file must match (None for all)
+            exclude: Glob patterns for files and directories to skip
+            min_size: Smallest file size in bytes to include
+            max_size: Largest file size in bytes to include
+        """
+        self.extensions = {ext.lower() for ext in extensions} if extensions is not None else None
+        self.include = list(include or [])
+        self.exclude = list(exclude or [])
+        self.min_size = min_size
+        self.max_size = max_size
+
+    @staticmethod
+    def _matches_any(patterns: List[str], name: str, relative: str) -> bool:
+        return any(fnmatch(name, pattern) or fnmatch(relative, pattern) for pattern in patterns)
+
+    def accepts_dir(self, name: str, relative: str) -> bool:
+        """Return True if a directory should be descended into."""
+        return not self._matches_any(self.exclude, name, relative)
+
+    def _accepts(self, name: str, relative: str, stat: Callable[[], os.stat_result]) -> bool:
+        if self.extensions is not None and os.path.splitext(name)[1].lower() not in self.extensions:
+            return False
+        if self.include and not self._matches_any(self.include, name, relative):
+            return False
+        if self._matches_any(self.exclude, name, relative):
+            return False
+        if self.min_size is not None or self.max_size is not None:
+            size = stat().st_size
+            if self.min_size is not None and size < self.min_size:
+                return False
+            if self.max_size is not None and size > self.max_size:
+                return False
+        return True
+
+    def accepts_file(self, entry: os.DirEntry, relative: str) -> bool:
+        """Return True if a file entry should be yielded."""
+        return self._accepts(entry.name, relative, entry.stat)
+
+    def accepts_path(self, path: Union[str, Path], relative: str) -> bool:
+        """
+        Return True if a scan from the root would yield the file at ``path``.
+
+        For single paths (e.g. from filesystem events) rather than directory
+        entries, so the directories along ``relative`` are checked as well.
+        """
+        parts = relative.split('/')
+        for depth in range(1, len(parts)):
+            if not self.accepts_dir(parts[depth - 1], '/'.join(parts[:depth])):
+                return False
+        return self._accepts(parts[-1], relative, partial(os.stat, path))
+
+
+def _list_dir(directory: str, prefix: str, scan_filter: ScanFilter,
+              recursive: bool) -> Tuple[List[Path], List[Tuple[str, str]]]:
+    """List one directory; return matching files and ``(path, prefix)`` subdirectories."""
+    files, subdirs = [], []
+    try:
+        with os.scandir(directory) as entries:
+            for entry in entries:
+                relative = prefix + entry.name
+                try:
+                    # Symlinked directories are not followed, so links cannot loop
+                    if entry.is_dir(follow_symlinks=False):
+                        if recursive and scan_filter.accepts_dir(entry.name, relative):
+                            subdirs.append((entry.path, relative + '/'))
+                    elif entry.is_file() and scan_filter.accepts_file(entry, relative):
+                        files.append(Path(entry.path))
+                except OSError as e:
+                    logger.warning(f"Skipping {entry.path}: {e}")
+    except OSError as e:
+        logger.warning(f"Cannot scan {directory}: {e}")
+    return files, subdirs
+
+
+def _scan_serial(root: str, scan_filter: ScanFilter, recursive: bool) -> Iterator[Path]:
+    stack = [(root, '')]
+    while stack:
+        directory, prefix = stack.pop()
+        files, subdirs = _list_dir(directory, prefix, scan_filter, recursive)
+        yield from files
+        stack.extend(reversed(subdirs))
+
+
+def _scan_parallel(root: str, scan_filter: ScanFilter, workers: int) -> Iterator[Path]:
+    results: queue.Queue = queue.Queue(maxsize=QUEUE_BATCHES)
+    stop = threading.Event()
+    lock = threading.Lock()
+    pending = 1
+    pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='scan')
+
+    def put(item) -> None:
+        # Poll so workers exit once the consumer has gone away
+        while not stop.is_set():
+            try:
+                results.put(item, timeout=0.1)
+                return
+            except queue.Full:
+                continue
+
+    def visit(directory: str, prefix: str) -> None:
+        nonlocal pending
+        try:
+            if stop.is_set():
+                return
+            files, subdirs = _list_dir(directory, prefix, scan_filter, True)
+            with lock:
+                pending += len(subdirs)
+            for index, subdir in enumerate(subdirs):
+                try:
+                    pool.submit(visit, *subdir)
+                except RuntimeError:
+                    # Pool shut down because the consumer stopped early
+                    with lock:
+                        pending -= len(subdirs) - index
+                    break
+            if files:
+                put(files)
+        except Exception as e:
+            logger.error(f"Scanning {directory} failed: {e}")
+        finally:
+            with lock:
+                pending -= 1
+                finished = pending == 0
+            if finished:
+                put(None)
+
+    pool.submit(visit, root, '')
+    try:
+        while True:
+            batch = results.get()
+            if batch is None:
+                return
+            yield from batch
+    finally:
+        stop.set()
+        pool.shutdown(wait=True, cancel_futures=True)
+
+
+def scan_files(directory: Union[str, Path], recursive: bool = False,
+               scan_filter: Optional[ScanFilter] = None,
+               workers: Optional[int] = None) -> Iterator[Path]:
+    """
+    Yield files under ``directory`` accepted by ``scan_filter``.
+
+    Results are streamed as directories are listed; with more than one
+    worker their order is not deterministic.
+
+    Args:
+        directory: Directory to scan
+        recursive: Whether to descend into subdirectories
+        scan_filter: Which files to yield (None for all)
+        workers: Threads listing directories concurrently (None for a default
+            based on the CPU count, 1 to scan serially)
+    """
+    directory = Path(directory)
+    if not directory.is_dir():
+        raise ValueError(f"{directory} is not a valid directory")
+    scan_filter = scan_filter or ScanFilter()
+    workers = default_scan_workers() if workers is None else workers
+    if workers < 1:
+        raise ValueError(f"workers must be at least 1, got {workers}")
+
+    if not recursive or workers == 1:
+        return _scan_serial(str(directory), scan_filter, recursive)
+    return _scan_parallel(str(directory), scan_filter, workers)
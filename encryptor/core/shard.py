@@ -0,0 +1,233 @@
+"""Splitting one run over several machines.
+
+With ``--shard K/N`` a run only processes its share of the files, so N
+nodes can work through one tree together without talking to each other.
+Every file has a shard key: its path relative to the directory given on
+the command line, prefixed with that directory's name (the part of the
+path that outputs mirror), or just its name for a file given directly.
+Keys do not depend on where the tree is mounted, so all nodes agree on
+them as long as they are given the same directories.
+
+By default a file belongs to shard ``hash(key) mod N + 1``: stable, with
+no coordination, and balanced by file count. A plan file (from build_plan
+and write_plan) balances bytes instead, placing the largest files first,
+each onto the shard with the fewest bytes so far. Files that appeared after
+the plan was made fall back to the hash.
+
+Each node can write a summary of its shard (write_summary), and
+merge_summaries adds them up and reports shards that are missing.
+"""
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple, Union
+import hashlib
+import heapq
+import json
+import logging
+import os
+import socket
+import time
+from .file_ops import iter_inputs
+
+logger = logging.getLogger(__name__)
+
+PLAN_FORMAT = 'file-encryptor-plan'
+PLAN_VERSION = 1
+SUMMARY_FORMAT = 'file-encryptor-shard-summary'
+
+
+def shard_key(path: Union[str, Path], root: Optional[Union[str, Path]] = None) -> str:
+    """
+    Name a file the same way on every node.
+
+    Args:
+        path: The file
+        root: Directory given by the user that the file was found in (None
+            for a file given directly)
+    """
+    path = Path(path)
+    if root is None:
+        return path.name
+    root = Path(root)
+    name = Path(os.path.abspath(root)).name
+    return f"{name}/{path.relative_to(root).as_posix()}"
+
+
+def hash_shard(key: str, count: int) -> int:
+    """Shard (1 to ``count``) a key belongs to when no plan says otherwise."""
+    digest = hashlib.blake2b(key.encode('utf-8', 'surrogateescape'), digest_size=8).digest()
+    return int.from_bytes(digest, 'big') % count + 1
+
+
+class Sharder:
+    """Decides which files belong to shard ``index`` of ``count``."""
+
+    def __init__(self, index: int, count: int, plan: Optional[Dict[str, int]] = None):
+        """
+        Args:
+            index: This node's shard, from 1 to ``count``
+            count: Number of shards
+            plan: Shard of each key from a plan file (None to hash every key)
+        """
+        if count < 1 or not 1 <= index <= count:
+            raise ValueError(f"Invalid shard {index}/{count}: expected 1 <= K <= N")
+        self.index = index
+        self.count = count
+        self.plan = plan or {}
+
+    @classmethod
+    def parse(cls, text: str, plan_file: Optional[Union[str, Path]] = None) -> 'Sharder':
+        """Build a Sharder from ``'K/N'``, optionally following a plan file."""
+        try:
+            index, count = (int(part) for part in text.split('/'))
+        except ValueError:
+            raise ValueError(f"Invalid shard {text!r}: expected K/N, e.g. 2/8") from None
+        plan = load_plan(plan_file, count) if plan_file else None
+        return cls(index, count, plan)
+
+    def shard_of(self, key: str) -> int:
+        """Shard a key belongs to."""
+        shard = self.plan.get(key)
+        return hash_shard(key, self.count) if shard is None else shard
+
+    def owns(self, path: Union[str, Path], root: Optional[Union[str, Path]] = None) -> bool:
+        """True if this shard processes ``path`` (found under ``root``, see shard_key)."""
+        return self.shard_of(shard_key(path, root)) == self.index
+
+    def __str__(self) -> str:
+        return f"{self.index}/{self.count}"
+
+
+def iter_keyed_files(paths: Iterable[Union[str, Path]], recursive: bool = False,
+                     extensions: List[str] = None,
+                     **filters) -> Iterable[Tuple[Path, str]]:
+    """Yield ``(file, shard key)`` for every file a run over ``paths`` would see."""
+    for file_path, root in iter_inputs(paths, recursive, extensions, **filters):
+        yield file_path, shard_key(file_path, root)
+
+
+def build_plan(paths: Iterable[Union[str, Path]], count: int, recursive: bool = False,
+               extensions: List[str] = None,
+               **filters) -> Tuple[List[Tuple[str, int, int]], List[int]]:
+    """
+    Assign files to ``count`` shards so that each gets about the same bytes.
+
+    Every file's size is held in memory while planning (tens of bytes per
+    file), and nodes load the whole plan too.
+
+    Args:
+        paths: Files or directories, as they will be given to each node
+        count: Number of shards
+        recursive: Whether to search directories recursively
+        extensions: File extensions to include (None for all)
+        **filters: Further find_files options (include, exclude, min_size, max_size)
+
+    Returns:
+        ``(key, shard, size)`` for every file, and the bytes of each shard
+    """
+    if count < 1:
+        raise ValueError("The number of shards must be at least 1")
+    files = []
+    for path, key in iter_keyed_files(paths, recursive, extensions, **filters):
+        try:
+            files.append((path.stat().st_size, key))
+        except OSError as e:
+            logger.warning(f"Skipping {path}: {e}")
+    # Largest first, each onto the lightest shard (ties go to the lowest shard)
+    files.sort(key=lambda item: (-item[0], item[1]))
+    loads = [(0, shard) for shard in range(1, count + 1)]
+    totals = [0] * count
+    entries = []
+    for size, key in files:
+        load, shard = heapq.heappop(loads)
+        heapq.heappush(loads, (load + size, shard))
+        totals[shard - 1] += size
+        entries.append((key, shard, size))
+    return entries, totals
+
+
+def write_plan(path: Union[str, Path], entries: List[Tuple[str, int, int]],
+               totals: List[int]) -> None:
+    """Write a plan as JSON lines: a header, then one line per file."""
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write(json.dumps({'format': PLAN_FORMAT, 'version': PLAN_VERSION,
+                            'shards': len(totals), 'files': len(entries),
+                            'bytes': totals}) + '\n')
+        for key, shard, size in entries:
+            f.write(json.dumps({'key': key, 'shard': shard, 'size': size}) + '\n')
+
+
+def load_plan(path: Union[str, Path], count: int) -> Dict[str, int]:
+    """Read a plan file into ``{key: shard}``, checking it was made for ``count`` shards."""
+    with open(path, encoding='utf-8') as f:
+        header = json.loads(f.readline() or 'null')
+        if not isinstance(header, dict) or header.get('format') != PLAN_FORMAT:
+            raise ValueError(f"{path} is not a shard plan")
+        if header['shards'] != count:
+            raise ValueError(f"{path} was made for {header['shards']} shards, not {count}")
+        return {entry['key']: entry['shard'] for entry in map(json.loads, f)}
+
+
+def write_summary(path: Union[str, Path], operation: str, sharder: Optional[Sharder],
+                  summary: dict) -> None:
+    """
+    Record one node's results for merge_summaries.
+
+    Args:
+        path: Summary file to write
+        operation: Command that ran, e.g. 'encrypt'
+        sharder: The node's shard (None for an unsharded run, recorded as 1/1)
+        summary: The run's totals, e.g. RunSummary.as_dict()
+    """
+    sharder = sharder or Sharder(1, 1)
+    Path(path).write_text(json.dumps({
+        'format': SUMMARY_FORMAT,
+        'operation': operation,
+        'shard': sharder.index,
+        'shards': sharder.count,
+        'host': socket.gethostname(),
+        'finished': time.time(),
+        'summary': summary,
+    }, indent=2))
+
+
+def merge_summaries(paths: Iterable[Union[str, Path]]) -> dict:
+    """
+    Combine per-shard summaries of one run.
+
+    Counts are added up and error lists joined; ``wall_time`` is that of the
+    slowest shard, since shards run side by side.
+
+    Returns:
+        ``{'operation', 'shards', 'completed', 'missing', 'summary'}``
+
+    Raises:
+        ValueError: The summaries belong to different runs or repeat a shard
+    """
+    operation, count, completed, merged = None, None, [], {}
+    for path in paths:
+        data = json.loads(Path(path).read_text())
+        if not isinstance(data, dict) or data.get('format') != SUMMARY_FORMAT:
+            raise ValueError(f"{path} is not a shard summary")
+        if operation is not None and (data['operation'], data['shards']) != (operation, count):
+            raise ValueError(f"{path} is from a different run ({data['operation']}, "
+                             f"{data['shards']} shards)")
+        operation, count = data['operation'], data['shards']
+        if data['shard'] in completed:
+            raise ValueError(f"Shard {data['shard']}/{count} appears twice")
+        completed.append(data['shard'])
+        for name, value in data['summary'].items():
+            if name == 'wall_time':
+                merged[name] = max(merged.get(name, 0.0), value)
+            elif isinstance(value, list):
+                merged[name] = merged.get(name, []) + value
+            elif isinstance(value, (int, float)):
+                merged[name] = merged.get(name, 0) + value
+    if operation is None:
+        raise ValueError("No summaries to merge")
+    return {
+        'operation': operation,
+        'shards': count,
+        'completed': sorted(completed),
+        'missing': [shard for shard in range(1, count + 1) if shard not in completed],
+        'summary': merged,
+    }
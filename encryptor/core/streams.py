@@ -0,0 +1,452 @@
+"""Chunk readers and output helpers for the file pipeline.
+
+Four input modes are available:
+
+- ``buffered``: ``read(chunk_size)`` allocates a new ``bytes`` per chunk.
+- ``readinto``: chunks are read into a small ring of reusable ``bytearray``
+  buffers and handed out as ``memoryview`` slices.
+- ``mmap``: the input is memory-mapped and chunks are zero-copy
+  ``memoryview`` slices of the mapping. If the file shrinks while it is
+  mapped, touching the lost pages kills the process with SIGBUS, so this
+  mode is only used when asked for.
+- ``direct``: like ``readinto``, but with ``O_DIRECT`` reads into
+  page-aligned buffers, so the input never enters the page cache (Linux;
+  other systems and filesystems without ``O_DIRECT`` fall back to
+  ``readinto``).
+
+``auto`` picks ``readinto`` for regular files and ``buffered`` for anything
+else (pipes, sockets, character devices).
+
+For bulk runs over more data than fits in memory, CacheLimiter keeps files
+read or written sequentially from filling the page cache and evicting other
+programs' hot pages: it drops pages behind the current position, and for
+outputs starts writeback early so that dirty pages never pile up.
+"""
+from contextlib import contextmanager
+from typing import BinaryIO, Callable, Iterator, Optional, Union
+import logging
+import mmap
+import os
+import stat
+import sys
+from .chunking import ChunkSizer
+
+logger = logging.getLogger(__name__)
+
+IO_MODES = ('auto', 'buffered', 'readinto', 'mmap', 'direct')
+
+# O_DIRECT needs buffers, offsets and lengths aligned to the logical block
+# size; a page covers every common device
+DIRECT_ALIGNMENT = mmap.PAGESIZE
+# Bytes a CacheLimiter lets through before writing back and dropping them
+BULK_WINDOW = 8 * 1024 * 1024
+
+_SYNC_FILE_RANGE_WAIT_BEFORE = 1
+_SYNC_FILE_RANGE_WRITE = 2
+_SYNC_FILE_RANGE_WAIT_AFTER = 4
+
+Chunk = Union[bytes, memoryview]
+
+
+def is_regular_file(stream: BinaryIO) -> bool:
+    """Return True if ``stream`` is backed by a regular file."""
+    try:
+        return stat.S_ISREG(os.fstat(stream.fileno()).st_mode)
+    except (AttributeError, OSError, ValueError):
+        return False
+
+
+def resolve_io_mode(stream: BinaryIO, io_mode: str = 'auto') -> str:
+    """Pick the input mode actually usable for ``stream``."""
+    if io_mode not in IO_MODES:
+        raise ValueError(f"Unknown I/O mode {io_mode!r}, expected one of {', '.join(IO_MODES)}")
+    regular = is_regular_file(stream)
+    if io_mode == 'auto':
+        return 'readinto' if regular and hasattr(stream, 'readinto') else 'buffered'
+    if io_mode == 'mmap' and not regular:
+        logger.debug("Input is not a regular file, falling back to buffered reads")
+        return 'buffered'
+    if io_mode in ('readinto', 'direct') and not hasattr(stream, 'readinto'):
+        return 'buffered'
+    if io_mode == 'direct':
+        if not regular:
+            return 'buffered'
+        if not hasattr(os, 'O_DIRECT'):
+            return 'readinto'
+    return io_mode
+
+
+def _buffered_chunks(stream: BinaryIO, sizer: ChunkSizer) -> Iterator[bytes]:
+    while True:
+        chunk = stream.read(sizer.next_size())
+        if not chunk:
+            return
+        yield chunk
+
+
+def _readinto_chunks(stream: BinaryIO, sizer: ChunkSizer, buffers: int) -> Iterator[memoryview]:
+    ring = [bytearray() for _ in range(buffers)]
+    number = 0
+    while True:
+        size = sizer.next_size()
+        slot = number % buffers
+        if len(ring[slot]) < size:
+            # Chunks still using the old buffer keep it alive until they are done
+            ring[slot] = bytearray(size)
+        view = memoryview(ring[slot])[:size]
+        read = stream.readinto(view)
+        if not read:
+            return
+        yield view[:read]
+        number += 1
+
+
+def _enable_direct(fd: int) -> bool:
+    """Switch ``fd`` to O_DIRECT; False if the filesystem does not support it."""
+    import fcntl
+    flags = fcntl.fcntl(fd, fcntl.F_GETFL)
+    try:
+        fcntl.fcntl(fd, fcntl.F_SETFL, flags | os.O_DIRECT)
+    except OSError:
+        return False
+    return True
+
+
+def _disable_direct(fd: int) -> None:
+    import fcntl
+    flags = fcntl.fcntl(fd, fcntl.F_GETFL)
+    fcntl.fcntl(fd, fcntl.F_SETFL, flags & ~os.O_DIRECT)
+
+
+def _direct_chunks(fd: int, start: int, sizer: ChunkSizer, buffers: int) -> Iterator[memoryview]:
+    """
+    Read chunks with aligned ``preadv`` calls into a ring of anonymous mappings.
+
+    Reads start on an aligned offset, so a chunk ending inside a block keeps
+    that block and the next chunk's buffer starts with a copy of it instead
+    of reading it again.
+    """
+    align = DIRECT_ALIGNMENT
+    ring = [None] * buffers
+    carried = None  # (offset, data) of the block the last chunk ended in
+    offset = start
+    number = 0
+    while True:
+        size = sizer.next_size()
+        base = offset - offset % align
+        end = -(-(offset + size) // align) * align
+        slot = number % buffers
+        if ring[slot] is None or len(ring[slot]) < end - base:
+            # Chunks still using the old mapping keep it alive until they are done
+            ring[slot] = mmap.mmap(-1, end - base + align)
+        view = memoryview(ring[slot])
+        filled = read = 0
+        if carried is not None and carried[0] == base:
+            filled = len(carried[1])
+            view[:filled] = carried[1]
+        # A carried block shorter than ``align`` holds the end of the file
+        if filled % align == 0 and filled < end - base:
+            read = os.preadv(fd, [view[filled:end - base]], base + filled)
+        available = filled + read
+        chunk = view[offset - base:min(offset + size, base + available) - base]
+        if not len(chunk):
+            return
+        offset += len(chunk)
+        carried = None
+        if offset % align and offset < base + available:
+            block = offset - offset % align - base
+            carried = (base + block, bytes(view[block:min(block + align, available)]))
+        yield chunk
+        if len(chunk) < size:
+            return
+        number += 1
+
+
+def _mapped_chunks(view: memoryview, start: int, sizer: ChunkSizer) -> Iterator[memoryview]:
+    offset = start
+    while offset < len(view):
+        size = sizer.next_size()
+        yield view[offset:offset + size]
+        offset += size
+
+
+@contextmanager
+def open_chunks(stream: BinaryIO, chunk_size: Union[int, ChunkSizer], io_mode: str = 'auto',
+                buffers: int = 4) -> Iterator[Iterator[Chunk]]:
+    """
+    Context manager yielding an iterator over the remaining chunks of ``stream``.
+
+    In ``readinto`` mode a buffer is reused once ``buffers`` further chunks
+    have been read, so ``buffers`` must exceed the number of chunks the
+    caller keeps alive at once. Mappings are released when the context exits.
+
+    Args:
+        stream: Binary input stream, positioned where reading should start
+        chunk_size: Fixed chunk size (bytes) or a ChunkSizer asked before each read
+        io_mode: One of IO_MODES
+        buffers: Size of the buffer ring for ``readinto`` mode
+    """
+    sizer = chunk_size if isinstance(chunk_size, ChunkSizer) else ChunkSizer(chunk_size)
+    mode = resolve_io_mode(stream, io_mode)
+    if mode == 'direct':
+        fd = stream.fileno()
+        if _enable_direct(fd):
+            try:
+                yield _direct_chunks(fd, stream.tell(), sizer, buffers)
+            finally:
+                _disable_direct(fd)
+            return
+        logger.debug("The filesystem does not support O_DIRECT, falling back to readinto")
+        mode = 'readinto'
+    if mode == 'readinto':
+        yield _readinto_chunks(stream, sizer, buffers)
+        return
+    if mode == 'buffered':
+        yield _buffered_chunks(stream, sizer)
+        return
+
+    start = stream.tell()
+    size = os.fstat(stream.fileno()).st_size
+    if size <= start:
+        # Empty files cannot be mapped
+        yield iter(())
+        return
+    mapping = mmap.mmap(stream.fileno(), 0, access=mmap.ACCESS_READ)
+    if hasattr(mapping, 'madvise'):
+        mapping.madvise(mmap.MADV_SEQUENTIAL)
+    view = memoryview(mapping)
+    try:
+        yield _mapped_chunks(view, start, sizer)
+    finally:
+        try:
+            view.release()
+            mapping.close()
+        except BufferError:
+            # A caller still holds a chunk; the mapping is freed with it
+            pass
+
+
+@contextmanager
+def map_stream(stream: BinaryIO, io_mode: str = 'auto') -> Iterator[BinaryIO]:
+    """
+    Context manager yielding a reader over ``stream`` for ContainerReader.
+
+    In ``mmap`` mode reads return zero-copy ``memoryview`` slices of the
+    mapped file; otherwise ``stream`` itself is yielded.
+    """
+    if resolve_io_mode(stream, io_mode) != 'mmap' or os.fstat(stream.fileno()).st_size == 0:
+        yield stream
+        return
+    mapping = mmap.mmap(stream.fileno(), 0, access=mmap.ACCESS_READ)
+    if hasattr(mapping, 'madvise'):
+        mapping.madvise(mmap.MADV_SEQUENTIAL)
+    reader = BufferReader(mapping)
+    reader.seek(stream.tell())
+    try:
+        yield reader
+    finally:
+        try:
+            reader.close()
+            mapping.close()
+        except BufferError:
+            pass
+
+
+class BufferReader:
+    """Minimal seekable reader over a buffer that returns memoryview slices."""
+
+    def __init__(self, buffer):
+        self._view = memoryview(buffer)
+        self._position = 0
+
+    def read(self, size: int = -1) -> memoryview:
+        end = len(self._view) if size is None or size < 0 else self._position + size
+        data = self._view[self._position:end]
+        self._position += len(data)
+        return data
+
+    def seek(self, offset: int, whence: int = 0) -> int:
+        base = (0, self._position, len(self._view))[whence]
+        self._position = max(0, base + offset)
+        return self._position
+
+    def tell(self) -> int:
+        return self._position
+
+    def close(self) -> None:
+        self._view.release()
+
+
+class PrefixedReader:
+    """Reader that returns ``prefix`` before the rest of ``stream``.
+
+    Lets a caller look at the first bytes of a non-seekable stream (a pipe)
+    and then hand the whole stream on.
+    """
+
+    def __init__(self, prefix: bytes, stream: BinaryIO):
+        self._prefix = prefix
+        self._stream = stream
+
+    def read(self, size: int = -1) -> bytes:
+        if not self._prefix:
+            return self._stream.read(size)
+        if size is None or size < 0:
+            data, self._prefix = self._prefix + self._stream.read(), b""
+            return data
+        data, self._prefix = self._prefix[:size], self._prefix[size:]
+        if len(data) < size:
+            data += self._stream.read(size - len(data))
+        return data
+
+
+def preallocate(stream: BinaryIO, size: int) -> bool:
+    """
+    Reserve ``size`` bytes of disk space for a regular output file.
+
+    The file is extended to ``size``, so callers must truncate it to the
+    number of bytes actually written. Only streams positioned at the start of
+    the file are preallocated (not e.g. a stdout appending to a file).
+    Returns False if nothing was reserved.
+    """
+    if size <= 0 or not hasattr(os, 'posix_fallocate') or not is_regular_file(stream):
+        return False
+    try:
+        if stream.tell() != 0:
+            return False
+        os.posix_fallocate(stream.fileno(), 0, size)
+    except OSError:
+        return False
+    return True
+
+
+_sync_file_range = None
+
+
+def _load_sync_file_range() -> Optional[Callable]:
+    """libc's sync_file_range (Linux only), or None where it is missing."""
+    global _sync_file_range
+    if _sync_file_range is None:
+        function = False
+        if sys.platform.startswith('linux'):
+            import ctypes
+            import ctypes.util
+            try:
+                libc = ctypes.CDLL(ctypes.util.find_library('c'), use_errno=True)
+                function = libc.sync_file_range
+                function.argtypes = [ctypes.c_int, ctypes.c_int64, ctypes.c_int64, ctypes.c_uint]
+            except (OSError, AttributeError):
+                function = False
+        _sync_file_range = function
+    return _sync_file_range or None
+
+
+class CacheLimiter:
+    """
+    Keeps a file read or written sequentially from filling the page cache.
+
+    Call ``update`` as the work progresses (after each chunk is fine: it is
+    cheap until a BULK_WINDOW has passed) and ``close`` when done. Inputs are
+    read with SEQUENTIAL readahead and pages behind the file position are
+    dropped. Outputs start writeback of each new window with
+    ``sync_file_range`` and drop the window before it once it is on disk, so
+    writes stream out steadily instead of as large bursts of dirty pages;
+    without ``sync_file_range`` (non-Linux) an ``fdatasync`` per window does
+    the same job. The position is the kernel's file offset, so data still in
+    a Python buffer is simply handled on a later call. Does nothing where
+    ``posix_fadvise`` is missing or ``stream`` is not a regular file.
+    """
+
+    def __init__(self, stream: BinaryIO, writing: bool, window: int = BULK_WINDOW):
+        """
+        Args:
+            stream: File being read or written
+            writing: True for an output, False for an input
+            window: Bytes between two writebacks or drops
+        """
+        self.enabled = hasattr(os, 'posix_fadvise') and is_regular_file(stream)
+        self.writing = writing
+        self.window = window
+        if not self.enabled:
+            return
+        self._stream = stream
+        self._fd = stream.fileno()
+        self._start = self._done = self._synced = os.lseek(self._fd, 0, os.SEEK_CUR)
+        if not writing:
+            os.posix_fadvise(self._fd, 0, 0, os.POSIX_FADV_SEQUENTIAL)
+
+    def _position(self) -> int:
+        return os.lseek(self._fd, 0, os.SEEK_CUR)
+
+    def _write_back(self, start: int, end: int, wait: bool) -> None:
+        sync = _load_sync_file_range()
+        if sync is None:
+            os.fdatasync(self._fd)
+            return
+        flags = _SYNC_FILE_RANGE_WRITE
+        if wait:
+            flags |= _SYNC_FILE_RANGE_WAIT_BEFORE | _SYNC_FILE_RANGE_WAIT_AFTER
+        if sync(self._fd, start, end - start, flags) != 0:
+            import ctypes
+            raise OSError(ctypes.get_errno(), "sync_file_range failed")
+
+    def update(self) -> None:
+        """Write back and drop what passed since the last window."""
+        if not self.enabled:
+            return
+        position = self._position()
+        if position - self._done < self.window:
+            return
+        if not self.writing:
+            os.posix_fadvise(self._fd, self._done, position - self._done,
+                             os.POSIX_FADV_DONTNEED)
+        else:
+            # Wait for the previous window, which has had a whole window's time
+            # to reach the disk, then start the new one
+            if self._synced < self._done:
+                self._write_back(self._synced, self._done, wait=True)
+                os.posix_fadvise(self._fd, self._synced, self._done - self._synced,
+                                 os.POSIX_FADV_DONTNEED)
+                self._synced = self._done
+            self._write_back(self._done, position, wait=False)
+        self._done = position
+
+    def close(self) -> None:
+        """Flush ``stream``, write everything back and drop it from the cache."""
+        if not self.enabled:
+            return
+        self.enabled = False
+        if self.writing:
+            self._stream.flush()
+            # From the start: headers are rewritten after the data behind them
+            end = os.fstat(self._fd).st_size
+            if end > self._start:
+                self._write_back(self._start, end, wait=True)
+            os.posix_fadvise(self._fd, self._start, 0, os.POSIX_FADV_DONTNEED)
+        else:
+            os.posix_fadvise(self._fd, self._start, 0, os.POSIX_FADV_DONTNEED)
+
+
+@contextmanager
+def limit_cache(infile: BinaryIO, outfile: BinaryIO,
+                enabled: bool = True) -> Iterator[Optional[Callable[[], None]]]:
+    """
+    Context manager applying CacheLimiters to an input and an output file.
+
+    Yields a function to call as data moves through (None when disabled);
+    on a clean exit the output is written back and both files are dropped
+    from the page cache.
+    """
+    if not enabled:
+        yield None
+        return
+    limiters = [CacheLimiter(infile, writing=False), CacheLimiter(outfile, writing=True)]
+    limiters = [limiter for limiter in limiters if limiter.enabled]
+
+    def update() -> None:
+        for limiter in limiters:
+            limiter.update()
+
+    yield update
+    for limiter in limiters:
+        limiter.close()
@@ -0,0 +1,197 @@
+"""Integrity verification of encrypted files without writing plaintext.
+
+verify_file authenticates every chunk of a file and checks its container
+structure (frames, end marker, chunk index, footer), then sorts the outcome
+into one of STATUSES. Nothing is decrypted to disk, Fernet chunks only have
+their HMAC checked and compressed chunks are never decompressed, so a
+verification pass is bound by how fast the files can be read.
+
+A file whose data key cannot be unwrapped, or (for files without one) whose
+chunks all fail to authenticate, is reported as ``wrong_key``. That is a
+judgement: a damaged wrapped key looks the same, while corruption confined
+to some chunks is reported as ``corrupt``.
+"""
+from pathlib import Path
+from typing import (TYPE_CHECKING, Callable, Iterable, Iterator, List, NamedTuple, Optional,
+                    Tuple, Union)
+import logging
+import os
+import threading
+from .batch import BatchScheduler, RunSummary
+from .ciphers import WrongKeyError
+from .container import MAGIC, ContainerError, TruncatedError, is_encrypted
+from .crypto import CryptoManager
+from .file_ops import FileOperations, iter_inputs
+from .metrics import NULL_METRICS, Metrics
+from .pipeline import ExecutorLike
+
+if TYPE_CHECKING:
+    from .shard import Sharder
+
+logger = logging.getLogger(__name__)
+
+OK = 'ok'
+CORRUPT = 'corrupt'
+TRUNCATED = 'truncated'
+WRONG_KEY = 'wrong_key'
+INVALID = 'invalid'
+UNREADABLE = 'unreadable'
+STATUSES = (OK, CORRUPT, TRUNCATED, WRONG_KEY, INVALID, UNREADABLE)
+# Failed chunk numbers listed per file; the count is always complete
+MAX_REPORTED_CHUNKS = 16
+
+
+class VerifyResult(NamedTuple):
+    """Outcome of verifying one file."""
+    path: str
+    status: str
+    size: int
+    chunks: int = 0
+    failed_chunks: int = 0
+    bad_chunks: Tuple[int, ...] = ()
+    error: Optional[str] = None
+
+    @property
+    def ok(self) -> bool:
+        return self.status == OK
+
+    def as_dict(self) -> dict:
+        """Return the result as a JSON-serializable dict."""
+        result = self._asdict()
+        result['bad_chunks'] = list(self.bad_chunks)
+        return result
+
+
+def verify_file(path: Union[str, Path], crypto: CryptoManager, jobs: int = 1,
+                executor: ExecutorLike = 'thread', io_mode: str = 'auto',
+                metrics: Optional[Metrics] = None) -> VerifyResult:
+    """
+    Verify one encrypted file (container or legacy format).
+
+    Args:
+        path: Encrypted file
+        crypto: CryptoManager holding the key
+        jobs: Number of chunks verified concurrently (0 for one per core)
+        executor: 'thread' or 'process' worker pool, or a
+            pool shared by the run (see pipeline.worker_pool)
+        io_mode: Input mode, one of 'auto', 'buffered', 'readinto', 'mmap',
+            'direct'
+        metrics: Receives read/cipher timings and the chunk count
+
+    Returns:
+        The file's VerifyResult; problems with the file are reported there,
+        never raised
+    """
+    path = Path(path)
+    try:
+        with open(path, 'rb') as infile:
+            size = os.fstat(infile.fileno()).st_size
+            prefix = infile.read(len(MAGIC))
+            if not is_encrypted(prefix):
+                if not prefix:
+                    return VerifyResult(str(path), TRUNCATED, size, error="File is empty")
+                return VerifyResult(str(path), INVALID, size, error="Not an encrypted file")
+            infile.seek(0)
+            try:
+                chunks, failed = FileOperations.verify_stream(
+                    infile, crypto, jobs=jobs, executor=executor, io_mode=io_mode,
+                    metrics=metrics
+                )
+            except TruncatedError as e:
+                return VerifyResult(str(path), TRUNCATED, size, error=str(e))
+            except WrongKeyError as e:
+                return VerifyResult(str(path), WRONG_KEY, size, error=str(e))
+            except ValueError as e:
+                # ContainerError, or e.g. an unknown cipher ID in the header
+                return VerifyResult(str(path), CORRUPT, size, error=str(e))
+    except OSError as e:
+        return VerifyResult(str(path), UNREADABLE, 0, error=str(e))
+
+    if not failed:
+        return VerifyResult(str(path), OK, size, chunks)
+    status = WRONG_KEY if len(failed) == chunks else CORRUPT
+    error = ("No chunk authenticates - wrong key?" if status == WRONG_KEY
+             else f"{len(failed)} of {chunks} chunks fail to authenticate")
+    return VerifyResult(str(path), status, size, chunks, len(failed),
+                        tuple(failed[:MAX_REPORTED_CHUNKS]), error)
+
+
+def find_encrypted(paths: Iterable[Union[str, Path]], recursive: bool = False,
+                   extensions: List[str] = None, shard: Optional['Sharder'] = None,
+                   **filters) -> Iterator[Path]:
+    """
+    Expand files and directories given by the user into the files to verify.
+
+    Args:
+        paths: Files or directories
+        recursive: Whether to search directories recursively
+        extensions: File extensions to include in directories (None for all)
+        shard: Only yield the files of this shard (see ``encryptor.core.shard``)
+        **filters: Further find_files options (include, exclude, min_size, max_size)
+    """
+    for file_path, _ in iter_inputs(paths, recursive, extensions, shard, **filters):
+        yield file_path
+
+
+def verify_files(files: Iterable[Union[str, Path]], crypto: CryptoManager, workers: int = 0,
+                 jobs: int = 0, executor: ExecutorLike = 'thread', io_mode: str = 'auto',
+                 on_result: Optional[Callable[[VerifyResult], None]] = None,
+                 metrics: Optional[Metrics] = None) -> Tuple[List[VerifyResult], RunSummary]:
+    """
+    Verify many files concurrently through a BatchScheduler.
+
+    Args:
+        files: Encrypted files, e.g. from find_encrypted
+        crypto: CryptoManager holding the key
+        workers: Files verified concurrently (0 for one per core)
+        jobs: Chunk-level parallelism for large files (0 for one per core)
+        executor: 'thread' or 'process' worker pool for chunks, or a
+            pool shared by the run (see pipeline.worker_pool)
+        io_mode: Input mode, one of 'auto', 'buffered', 'readinto', 'mmap',
+            'direct'
+        on_result: Called with each file's result as soon as it is known
+        metrics: Receives the scheduler's per-file metrics, chunk timings and
+            a ``fenc_verify_total{status}`` count
+
+    Returns:
+        The results sorted by path, and the run summary (files that fail
+        verification are counted as errors)
+    """
+    metrics = metrics or NULL_METRICS
+    results: List[VerifyResult] = []
+    lock = threading.Lock()
+
+    def verify(input_path: Path, output_path: None, jobs: int) -> None:
+        result = verify_file(input_path, crypto, jobs, executor, io_mode, metrics)
+        metrics.inc('fenc_verify_total', status=result.status)
+        with lock:
+            results.append(result)
+        if on_result is not None:
+            on_result(result)
+        if not result.ok:
+            raise ContainerError(f"{result.status}: {result.error}")
+
+    scheduler = BatchScheduler(verify, workers=workers, chunk_jobs=jobs, metrics=metrics)
+    summary = scheduler.run((path, None) for path in files)
+    # Files that could not even be stat()ed never reached verify()
+    seen = {result.path for result in results}
+    results.extend(VerifyResult(str(path), UNREADABLE, 0, error=error)
+                   for path, error in summary.errors if str(path) not in seen)
+    results.sort(key=lambda result: result.path)
+    return results, summary
+
+
+def build_report(results: List[VerifyResult], summary: RunSummary) -> dict:
+    """Machine-readable report of a verification run."""
+    counts = dict.fromkeys(STATUSES, 0)
+    for result in results:
+        counts[result.status] += 1
+    return {
+        'summary': {
+            'files': len(results),
+            'bytes': sum(result.size for result in results),
+            **counts,
+            'wall_time': summary.wall_time,
+        },
+        'files': [result.as_dict() for result in results],
+    }
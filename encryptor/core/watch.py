@@ -0,0 +1,312 @@
+"""Continuous encryption of files dropped into watched directories.
+
+A Watcher turns filesystem activity into ``(input, output)`` tasks for a
+BatchScheduler, so a long-lived process keeps its key and worker threads
+warm instead of paying for a fresh run per file. Events come from
+``watchdog`` when it is installed; otherwise (or with ``polling=True``) the
+directories are rescanned every ``poll_interval`` seconds.
+
+A file is handed on only once its size and modification time have not
+changed for ``settle`` seconds, so files that are still being written or
+copied are not picked up half-way. Between events the watcher blocks
+without a timeout: with watchdog an idle watcher uses no CPU at all.
+"""
+from pathlib import Path
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Set, Tuple, Union
+import logging
+import os
+import queue
+import stat
+import threading
+import time
+from .batch import BatchScheduler, RunSummary, Task
+from .checkpoint import CHECKPOINT_SUFFIX, PARTIAL_SUFFIX
+from .file_ops import FileOperations
+from .metrics import Metrics
+from .scanner import ScanFilter, scan_files
+
+try:
+    from watchdog.observers import Observer
+except ImportError:
+    Observer = None
+
+logger = logging.getLogger(__name__)
+
+# Seconds a file must stay unchanged before it is processed
+SETTLE_SECONDS = 2.0
+# Seconds between rescans when polling
+POLL_INTERVAL = 5.0
+# Event types that never mean new or changed data
+_IGNORED_EVENTS = frozenset({'deleted', 'opened', 'closed_no_write'})
+
+
+def _signature(path: Path) -> Optional[Tuple[int, int]]:
+    """Size and modification time of a regular file, or None."""
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    if not stat.S_ISREG(st.st_mode):
+        return None
+    return st.st_size, st.st_mtime_ns
+
+
+class _EventHandler:
+    """Forwards watchdog events to the watcher's queue (duck-typed handler)."""
+
+    def __init__(self, put: Callable[[Path, bool], None]):
+        self._put = put
+
+    def dispatch(self, event) -> None:
+        if event.event_type in _IGNORED_EVENTS:
+            return
+        # A move into the directory is reported under its destination
+        path = getattr(event, 'dest_path', None) or event.src_path
+        self._put(Path(os.fsdecode(path)), event.is_directory)
+
+
+class _PollingSource:
+    """Rescans the roots periodically and reports files that changed."""
+
+    def __init__(self, roots: List[Path], recursive: bool, interval: float,
+                 put: Callable[[Path, bool], None]):
+        self._roots = roots
+        self._recursive = recursive
+        self._interval = interval
+        self._put = put
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='watch-poll', daemon=True)
+        self._snapshot: Dict[Path, Tuple[int, int]] = {}
+
+    def _scan(self) -> Dict[Path, Tuple[int, int]]:
+        snapshot = {}
+        for root in self._roots:
+            try:
+                files = list(scan_files(root, self._recursive, workers=1))
+            except ValueError as e:
+                logger.warning(f"Cannot scan {root}: {e}")
+                continue
+            for path in files:
+                signature = _signature(path)
+                if signature is not None:
+                    snapshot[path] = signature
+        return snapshot
+
+    def start(self) -> None:
+        # Files present now are the watcher's initial scan, not changes
+        self._snapshot = self._scan()
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self) -> None:
+        while not self._stop.wait(self._interval):
+            snapshot = self._scan()
+            for path, signature in snapshot.items():
+                if self._snapshot.get(path) != signature:
+                    self._put(path, False)
+            self._snapshot = snapshot
+
+
+class _WatchdogSource:
+    """Subscribes to native filesystem events through watchdog."""
+
+    def __init__(self, roots: List[Path], recursive: bool, put: Callable[[Path, bool], None]):
+        self._observer = Observer()
+        handler = _EventHandler(put)
+        for root in roots:
+            self._observer.schedule(handler, str(root), recursive=recursive)
+
+    def start(self) -> None:
+        self._observer.start()
+
+    def stop(self) -> None:
+        self._observer.stop()
+        self._observer.join()
+
+
+class Watcher:
+    """
+    Encrypts files as they appear under one or more directories.
+
+    Outputs are laid out like a batch run over the same directories:
+    ``output_dir / root.name / <relative path>.enc``.
+    """
+
+    def __init__(self, roots: Iterable[Union[str, Path]], output_dir: Union[str, Path],
+                 recursive: bool = False, scan_filter: Optional[ScanFilter] = None,
+                 settle: float = SETTLE_SECONDS, polling: bool = False,
+                 poll_interval: float = POLL_INTERVAL, clock: Callable[[], float] = time.monotonic):
+        """
+        Args:
+            roots: Directories to watch
+            output_dir: Directory for encrypted files; it is never watched,
+                even when it lies inside a root
+            recursive: Whether to watch subdirectories too
+            scan_filter: Which files to encrypt (None for all)
+            settle: Seconds a file must stay unchanged before it is encrypted
+            polling: Rescan the directories instead of using watchdog (also
+                used when watchdog is not installed)
+            poll_interval: Seconds between rescans when polling
+            clock: Monotonic time source
+        """
+        self.roots = [Path(os.path.abspath(root)) for root in roots]
+        for root in self.roots:
+            if not root.is_dir():
+                raise ValueError(f"{root} is not a valid directory")
+        if settle < 0 or poll_interval <= 0:
+            raise ValueError("settle must be >= 0 and poll_interval > 0")
+        self.output_dir = Path(os.path.abspath(output_dir))
+        self.recursive = recursive
+        self.scan_filter = scan_filter or ScanFilter()
+        self.settle = settle
+        self.polling = polling or Observer is None
+        self.poll_interval = poll_interval
+        self._clock = clock
+        self._events: queue.Queue = queue.Queue()
+        self._stopped = threading.Event()
+        # Path -> (signature, time it was last seen changing)
+        self._pending: Dict[Path, Tuple[Optional[Tuple[int, int]], float]] = {}
+        self._active: Set[Path] = set()
+        self._lock = threading.Lock()
+
+    def stop(self) -> None:
+        """Stop watching; files already handed out are still finished. Thread-safe."""
+        self._stopped.set()
+        self._events.put(None)
+
+    def run(self, file_func: Callable[[Path, Path, int], object], workers: int = 0,
+            chunk_jobs: int = 0, initial_scan: bool = True,
+            metrics: Optional[Metrics] = None) -> RunSummary:
+        """
+        Encrypt files as they become ready until stop() is called.
+
+        Args:
+            file_func: Called as ``file_func(input_path, output_path, jobs)``
+                on a worker thread, as with BatchScheduler
+            workers: Files processed concurrently (0 for one per core)
+            chunk_jobs: Chunk-level parallelism for large files (0 for one per core)
+            initial_scan: Also process files already present at start-up
+            metrics: Receives the scheduler's per-file metrics and events
+
+        Returns:
+            The summary of every file processed while watching
+        """
+        scheduler = BatchScheduler(file_func, workers=workers, chunk_jobs=chunk_jobs,
+                                   on_file=self._finished, metrics=metrics, batch_files=1)
+        return scheduler.run(self.tasks(initial_scan))
+
+    def tasks(self, initial_scan: bool = True) -> Iterator[Task]:
+        """Yield ``(input, output)`` for each file once it has settled, until stop()."""
+        source = (_PollingSource(self.roots, self.recursive, self.poll_interval, self._put)
+                  if self.polling else _WatchdogSource(self.roots, self.recursive, self._put))
+        source.start()
+        logger.info(f"Watching {', '.join(map(str, self.roots))} "
+                    f"({'polling' if self.polling else 'filesystem events'})")
+        try:
+            if initial_scan:
+                for root in self.roots:
+                    self._touch_tree(root)
+            while not self._stopped.is_set():
+                self._wait()
+                yield from self._ready()
+        finally:
+            source.stop()
+
+    def _put(self, path: Path, is_directory: bool) -> None:
+        self._events.put((path, is_directory))
+
+    def _wait(self) -> None:
+        """Block until an event arrives or the next pending file is due."""
+        due = min((seen for _, seen in self._pending.values()), default=None)
+        timeout = None if due is None else max(0.0, due + self.settle - self._clock())
+        try:
+            item = self._events.get(timeout=timeout)
+        except queue.Empty:
+            return
+        # Drain whatever else arrived, e.g. a burst of writes to one file
+        while item is not None:
+            path, is_directory = item
+            if is_directory:
+                if self.recursive:
+                    self._touch_tree(path)
+            else:
+                self._touch(path)
+            try:
+                item = self._events.get_nowait()
+            except queue.Empty:
+                return
+
+    def _touch(self, path: Path) -> None:
+        """Note activity on a file, restarting its settle timer."""
+        if self._root_of(path) is None:
+            return
+        self._pending[path] = (_signature(path), self._clock())
+
+    def _touch_tree(self, directory: Path) -> None:
+        """Note every file under a directory, e.g. one moved into a root."""
+        try:
+            files = list(scan_files(directory, self.recursive, workers=1))
+        except ValueError:
+            return
+        for path in files:
+            self._touch(path)
+
+    def _ready(self) -> Iterator[Task]:
+        """Yield tasks for pending files that stayed unchanged for ``settle`` seconds."""
+        now = self._clock()
+        for path, (signature, seen) in list(self._pending.items()):
+            if now - seen < self.settle:
+                continue
+            current = _signature(path)
+            if current is None:
+                # Deleted, renamed away or not a regular file
+                del self._pending[path]
+                continue
+            if current != signature:
+                self._pending[path] = (current, now)
+                continue
+            with self._lock:
+                if path in self._active:
+                    # Changed while being encrypted; look again after settling
+                    self._pending[path] = (current, now)
+                    continue
+            del self._pending[path]
+            task = self._task_for(path)
+            if task is None:
+                continue
+            with self._lock:
+                self._active.add(path)
+            yield task
+
+    def _finished(self, path: Path, size: int, error: Optional[Exception]) -> None:
+        with self._lock:
+            self._active.discard(path)
+
+    def _root_of(self, path: Path) -> Optional[Path]:
+        """The watched root containing ``path``, or None for ignored paths."""
+        if path.name.endswith((PARTIAL_SUFFIX, CHECKPOINT_SUFFIX)):
+            return None
+        if path == self.output_dir or self.output_dir in path.parents:
+            return None
+        for root in self.roots:
+            if root in path.parents:
+                if not self.recursive and path.parent != root:
+                    return None
+                return root
+        return None
+
+    def _task_for(self, path: Path) -> Optional[Task]:
+        root = self._root_of(path)
+        if root is None:
+            return None
+        relative = path.relative_to(root)
+        try:
+            if not self.scan_filter.accepts_path(path, relative.as_posix()):
+                return None
+        except OSError:
+            return None
+        target = self.output_dir / root.name / relative.parent
+        return path, FileOperations.output_path_for(path, target, 'encrypt')
@@ -3,9 +3,13 @@ from PyQt5.QtWidgets import (QMainWindow, QWidget, QVBoxLayout, QHBoxLayout,
                             QProgressBar, QMessageBox, QGroupBox, QRadioButton)
 from PyQt5.QtCore import Qt, QThread, pyqtSignal
 from pathlib import Path
+import itertools
+import logging
 import sys
+from ..core.batch import BatchScheduler
 from ..core.crypto import CryptoManager
 from ..core.file_ops import FileOperations
+from ..core.keyring import default_keyring, key_id_for
 
 class EncryptionThread(QThread):
     """Worker thread for encryption/decryption operations."""
@@ -20,41 +24,42 @@ class EncryptionThread(QThread):
         self.input_path = input_path
         self.output_dir = output_dir
         self.recursive = recursive
-        self.crypto = CryptoManager(key)
+        # Reuse the cipher state built for this key by earlier runs
+        if key:
+            self.crypto = default_keyring().get_or_add(key_id_for(key), lambda: key)
+        else:
+            self.crypto = CryptoManager()
+        self._done = itertools.count(1)
     
     def run(self):
         try:
             if self.operation == 'encrypt':
-                process_func = self.crypto.encrypt_data
-                suffix = '.enc'
+                file_func = lambda src, dst, jobs: FileOperations.encrypt_file(
+                    src, dst, self.crypto, jobs=jobs, progress=False)
                 extensions = None
             else:
-                process_func = self.crypto.decrypt_data
-                suffix = ''
+                file_func = lambda src, dst, jobs: FileOperations.decrypt_file(
+                    src, dst, self.crypto, jobs=jobs, progress=False)
                 extensions = ['.enc']
             
-            input_path = Path(self.input_path)
-            processed_files = 0
-            
-            if input_path.is_file():
-                output_path = FileOperations.create_output_path(
-                    input_path, self.output_dir, suffix
-                )
-                FileOperations.process_file(input_path, output_path, process_func)
-                processed_files = 1
-            elif input_path.is_dir():
-                for file_path in FileOperations.find_files(
-                    input_path, self.recursive, extensions
-                ):
-                    output_path = FileOperations.create_output_path(
-                        file_path, self.output_dir, suffix
-                    )
-                    FileOperations.process_file(file_path, output_path, process_func)
-                    processed_files += 1
+            tasks = FileOperations.plan_tasks(
+                [self.input_path], self.output_dir, self.operation,
+                self.recursive, extensions
+            )
+            scheduler = BatchScheduler(file_func, on_file=self._on_file)
+            summary = scheduler.run(tasks)
             
-            self.finished.emit(True, f"Successfully processed {processed_files} files")
+            if summary.errors:
+                failed = "\n".join(f"{path}: {error}" for path, error in summary.errors[:10])
+                self.finished.emit(False, f"{summary}\n\n{failed}")
+            else:
+                self.finished.emit(True, f"Successfully processed {summary}")
         except Exception as e:
             self.finished.emit(False, f"Error: {str(e)}")
+    
+    def _on_file(self, path, size, error):
+        """Count finished files for the progress signal."""
+        self.progress.emit(next(self._done))
 
 class FileEncryptorGUI(QMainWindow):
     """Main application window for the GUI."""
@@ -226,6 +231,7 @@ class FileEncryptorGUI(QMainWindow):
 def run_gui():
     """Run the GUI application."""
     from PyQt5.QtWidgets import QApplication
+    logging.basicConfig(level=logging.INFO)
     app = QApplication(sys.argv)
     window = FileEncryptorGUI()
     window.show()
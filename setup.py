@@ -25,6 +25,7 @@ setup(
     ],
     extras_require={
         "gui": ["PyQt5>=5.15"],
+        "watch": ["watchdog>=2.0"],
     },
     entry_points={
         "console_scripts": [
@@ -0,0 +1,109 @@
+import asyncio
+import io
+import os
+import pytest
+from encryptor.core import aio
+from encryptor.core.container import ContainerError
+from encryptor.core.crypto import CryptoManager
+from encryptor.core.file_ops import FileOperations
+
+
+class _Reader:
+    """Async reader returning short reads, like a socket."""
+
+    def __init__(self, data, step=7000):
+        self._buffer = io.BytesIO(data)
+        self._step = step
+
+    async def read(self, size):
+        await asyncio.sleep(0)
+        return self._buffer.read(min(size, self._step))
+
+
+class _Writer:
+    def __init__(self):
+        self.buffer = io.BytesIO()
+
+    async def write(self, data):
+        self.buffer.write(data)
+
+
+def _encrypt(crypto, data, **kwargs):
+    writer = _Writer()
+    size = asyncio.run(aio.encrypt_stream(_Reader(data), writer, crypto, **kwargs))
+    assert size == len(data)
+    return writer.buffer.getvalue()
+
+
+def _decrypt(crypto, data, **kwargs):
+    writer = _Writer()
+    asyncio.run(aio.decrypt_stream(_Reader(data), writer, crypto, **kwargs))
+    return writer.buffer.getvalue()
+
+
+@pytest.mark.parametrize("cipher", ["fernet", "aes-256-gcm", "chacha20-poly1305"])
+def test_stream_round_trip(cipher):
+    crypto = CryptoManager(cipher=cipher)
+    data = os.urandom(200 * 1024 + 3)
+    encrypted = _encrypt(crypto, data, chunk_size=16 * 1024, jobs=4)
+    assert _decrypt(crypto, encrypted, jobs=4) == data
+
+
+def test_empty_stream_round_trip():
+    crypto = CryptoManager()
+    assert _decrypt(crypto, _encrypt(crypto, b"")) == b""
+
+
+def test_interoperates_with_sync_api(tmp_path):
+    crypto = CryptoManager()
+    data = os.urandom(100 * 1024)
+
+    out = io.BytesIO()
+    FileOperations.decrypt_stream(io.BytesIO(_encrypt(crypto, data, chunk_size=32 * 1024)), out, crypto)
+    assert out.getvalue() == data
+
+    plain = tmp_path / "plain.bin"
+    plain.write_bytes(data)
+    FileOperations.encrypt_file(plain, tmp_path / "plain.bin.enc", crypto, progress=False)
+    assert _decrypt(crypto, (tmp_path / "plain.bin.enc").read_bytes()) == data
+
+    legacy = crypto.encrypt_data(data[:64 * 1024]) + crypto.encrypt_data(data[64 * 1024:])
+    assert _decrypt(crypto, legacy) == data
+
+
+def test_truncated_stream_is_rejected():
+    crypto = CryptoManager()
+    encrypted = _encrypt(crypto, os.urandom(50 * 1024), chunk_size=16 * 1024)
+    with pytest.raises(ContainerError):
+        _decrypt(crypto, encrypted[:-30])
+
+
+def test_file_functions(tmp_path):
+    crypto = CryptoManager()
+    data = os.urandom(70 * 1024)
+    (tmp_path / "a.bin").write_bytes(data)
+
+    async def round_trip():
+        await asyncio.gather(*(
+            aio.encrypt_file(tmp_path / "a.bin", tmp_path / f"a{i}.enc", crypto) for i in range(8)
+        ))
+        await aio.decrypt_file(tmp_path / "a7.enc", tmp_path / "a.out", crypto)
+
+    asyncio.run(round_trip())
+    assert (tmp_path / "a.out").read_bytes() == data
+
+
+def test_asyncio_stream_reader():
+    crypto = CryptoManager()
+    data = os.urandom(30 * 1024)
+    encrypted = _encrypt(crypto, data)
+
+    async def run():
+        reader = asyncio.StreamReader()
+        reader.feed_data(encrypted)
+        reader.feed_eof()
+        writer = _Writer()
+        await aio.decrypt_stream(reader, writer, crypto)
+        return writer.buffer.getvalue()
+
+    assert asyncio.run(run()) == data
@@ -0,0 +1,130 @@
+import pytest
+import time
+from pathlib import Path
+from encryptor.core import batch
+from encryptor.core.batch import BatchScheduler, RunSummary
+
+
+def _copy(input_path, output_path, jobs):
+    Path(output_path).parent.mkdir(parents=True, exist_ok=True)
+    Path(output_path).write_bytes(Path(input_path).read_bytes())
+
+
+def _tasks(tmp_path, count):
+    for i in range(count):
+        src = tmp_path / "in" / f"f{i}.txt"
+        src.parent.mkdir(exist_ok=True)
+        src.write_text(f"file {i}")
+        yield src, tmp_path / "out" / f"f{i}.txt"
+
+
+def test_scheduler_processes_all_files(tmp_path):
+    seen = []
+    scheduler = BatchScheduler(_copy, workers=4, on_file=lambda p, s, e: seen.append(p))
+    summary = scheduler.run(_tasks(tmp_path, 600))
+
+    assert summary.files == 600
+    assert summary.bytes == sum(len(f"file {i}") for i in range(600))
+    assert summary.output_bytes == summary.bytes
+    assert summary.errors == []
+    assert len(seen) == 600
+    assert (tmp_path / "out" / "f599.txt").read_text() == "file 599"
+
+
+def test_scheduler_collects_errors(tmp_path):
+    def flaky(input_path, output_path, jobs):
+        if input_path.name == "f3.txt":
+            raise ValueError("boom")
+        _copy(input_path, output_path, jobs)
+
+    summary = BatchScheduler(flaky, workers=2).run(_tasks(tmp_path, 5))
+    assert summary.files == 4
+    assert [(path.name, error) for path, error in summary.errors] == [("f3.txt", "boom")]
+
+
+def test_large_files_get_chunk_jobs(tmp_path, monkeypatch):
+    monkeypatch.setattr(batch, "LARGE_FILE_SIZE", 5)
+    jobs_seen = {}
+
+    def record(input_path, output_path, jobs):
+        jobs_seen[input_path.name] = jobs
+
+    (tmp_path / "small").write_bytes(b"1234")
+    (tmp_path / "large").write_bytes(b"123456")
+    BatchScheduler(record, workers=1, chunk_jobs=8).run(
+        [(tmp_path / "small", tmp_path / "a"), (tmp_path / "large", tmp_path / "b")]
+    )
+    assert jobs_seen == {"small": 1, "large": 8}
+
+
+def test_large_files_share_the_chunk_budget(tmp_path, monkeypatch):
+    import threading
+    monkeypatch.setattr(batch, "LARGE_FILE_SIZE", 5)
+    lock = threading.Lock()
+    running, peak = [0], [0]
+
+    def cipher_task():
+        with lock:
+            running[0] += 1
+            peak[0] = max(peak[0], running[0])
+        time.sleep(0.02)
+        with lock:
+            running[0] -= 1
+
+    def encrypt(input_path, output_path, jobs):
+        # Stands in for a file whose chunks run on ``jobs`` threads
+        for _ in range(3):
+            threads = [threading.Thread(target=cipher_task) for _ in range(jobs)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+
+    tasks = []
+    for i in range(8):
+        (tmp_path / f"large{i}").write_bytes(b"123456")
+        tasks.append((tmp_path / f"large{i}", tmp_path / f"out{i}"))
+    summary = BatchScheduler(encrypt, workers=4, chunk_jobs=4).run(tasks)
+
+    assert summary.files == 8
+    # Per-file pools would reach workers * chunk_jobs = 16
+    assert peak[0] <= 4 + 3
+
+
+def test_summary_as_dict():
+    summary = RunSummary()
+    summary.record(Path("a"), 10)
+    summary.record_error(Path("b"), OSError("denied"))
+    assert summary.as_dict()["errors"] == [{"path": "b", "error": "denied"}]
+    assert summary.as_dict()["files"] == 1
+
+
+def test_scheduler_counts_skipped_files(tmp_path):
+    def skip_odd(input_path, output_path, jobs):
+        if int(input_path.stem[1:]) % 2:
+            return False
+        _copy(input_path, output_path, jobs)
+
+    summary = BatchScheduler(skip_odd, workers=2).run(_tasks(tmp_path, 6))
+    assert (summary.files, summary.skipped) == (3, 3)
+    assert "3 unchanged skipped" in str(summary)
+
+
+def test_unbatched_scheduler_starts_files_immediately(tmp_path):
+    started, waited = [], []
+
+    def record(input_path, output_path, jobs):
+        started.append(input_path)
+
+    def tasks():
+        for task in _tasks(tmp_path, 2):
+            yield task
+        # A watcher's task stream pauses here until more files arrive
+        for _ in range(200):
+            if len(started) == 2:
+                waited.append(True)
+                return
+            time.sleep(0.01)
+
+    BatchScheduler(record, workers=1, batch_files=1).run(tasks())
+    assert waited and len(started) == 2
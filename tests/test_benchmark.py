@@ -0,0 +1,48 @@
+from encryptor.core.benchmark import (bench_bulk_io, bench_crypto, bench_files, bench_records,
+                                      compare_results)
+
+
+def test_bench_crypto_reports_throughput():
+    results = bench_crypto(["aes-256-gcm"], [4096], total_bytes=64 * 1024, repeat=1)
+    names = [result["name"] for result in results]
+    assert "crypto/encrypt/aes-256-gcm/4KiB" in names
+    assert "crypto/decrypt_data/fernet-token/4KiB" in names
+    assert all(result["mb_per_s"] > 0 for result in results)
+
+
+def test_bench_files_profiles(tmp_path):
+    results = bench_files(tmp_path, ["fernet"], [4096], {"tiny": (5, 100)}, jobs=2)
+    assert [result["name"] for result in results] == [
+        "file/encrypt/fernet/4KiB/tiny", "file/decrypt/fernet/4KiB/tiny",
+    ]
+    assert results[0]["bytes"] == 500
+    assert results[0]["files_per_s"] > 0
+
+
+def test_compare_results_flags_regressions():
+    baseline = {"results": [{"name": "a", "mb_per_s": 100.0}, {"name": "b", "mb_per_s": 100.0}]}
+    current = {"results": [{"name": "a", "mb_per_s": 95.0}, {"name": "b", "mb_per_s": 50.0},
+                           {"name": "new", "mb_per_s": 1.0}]}
+
+    regressions = compare_results(current, baseline, threshold=0.10)
+    assert [regression["name"] for regression in regressions] == ["b"]
+    assert regressions[0]["change"] == -0.5
+
+
+def test_bench_records_reports_records_per_second():
+    results = bench_records(["aes-256-gcm"], record_size=64, count=100, repeat=1)
+    names = [result["name"] for result in results]
+    assert names == ["records/encrypt_batch/aes-256-gcm/64B",
+                     "records/decrypt_batch/aes-256-gcm/64B",
+                     "records/encrypt_data/fernet-token/64B"]
+    assert all(result["records_per_s"] > 0 for result in results)
+
+
+def test_bench_bulk_io_reports_cache_footprint(tmp_path):
+    results = bench_bulk_io(tmp_path, 256 * 1024, jobs=1)
+    assert [result["name"] for result in results] == [
+        f"bulkio/{operation}/{mode}/256KiB"
+        for mode in ("default", "bulk", "direct") for operation in ("encrypt", "decrypt")
+    ]
+    assert all(result["mb_per_s"] > 0 for result in results)
+    assert all("cached_bytes" in result for result in results)
@@ -0,0 +1,85 @@
+import os
+import pytest
+from encryptor.core.bundle import Bundle, create_bundle, is_bundle, plan_members
+from encryptor.core.crypto import CryptoManager
+from encryptor.core.file_ops import FileOperations
+
+
+@pytest.fixture
+def tree(tmp_path):
+    root = tmp_path / "tree"
+    (root / "sub").mkdir(parents=True)
+    files = {
+        "big.bin": os.urandom(300_000),
+        "a.txt": b"hello",
+        "empty": b"",
+        "sub/b.txt": b"nested " * 1000,
+    }
+    for name, data in files.items():
+        (root / name).write_bytes(data)
+    os.chmod(root / "a.txt", 0o600)
+    return root, {f"tree/{name}": data for name, data in files.items()}
+
+
+def test_bundle_round_trip(tree, tmp_path):
+    root, files = tree
+    crypto = CryptoManager()
+    entries = create_bundle(plan_members([root], recursive=True), tmp_path / "b.enc", crypto,
+                            chunk_size=16384)
+    assert sorted(entry.name for entry in entries) == sorted(files)
+    assert is_bundle(tmp_path / "b.enc")
+
+    with Bundle(tmp_path / "b.enc", crypto) as bundle:
+        assert sorted(bundle.names()) == sorted(files)
+        for name, data in files.items():
+            assert bundle.read(name) == data
+        bundle.extract_all(tmp_path / "out")
+    for name, data in files.items():
+        assert (tmp_path / "out" / name).read_bytes() == data
+    assert (tmp_path / "out" / "tree/a.txt").stat().st_mode & 0o777 == 0o600
+
+
+def test_extracting_one_file_decrypts_only_its_chunks(tree, tmp_path):
+    root, files = tree
+    crypto = CryptoManager()
+    create_bundle(plan_members([root], recursive=True), tmp_path / "b.enc", crypto,
+                  chunk_size=16384)
+    with Bundle(tmp_path / "b.enc", crypto) as bundle:
+        decrypted = []
+        decrypt = bundle._reader._decrypt
+        bundle._reader._decrypt = lambda number: decrypted.append(number) or decrypt(number)
+        bundle._reader._cache.clear()
+        entry = bundle.get("tree/sub/b.txt")
+        assert bundle.read("tree/sub/b.txt") == files["tree/sub/b.txt"]
+        assert set(decrypted) == set(range(entry.offset // 16384,
+                                           (entry.offset + entry.size - 1) // 16384 + 1))
+
+
+def test_bundle_rejects_duplicates_and_unsafe_names(tmp_path):
+    crypto = CryptoManager()
+    (tmp_path / "a").write_bytes(b"x")
+    with pytest.raises(ValueError, match="Two files"):
+        create_bundle([(tmp_path / "a", "a"), (tmp_path / "a", "a")], tmp_path / "b.enc", crypto)
+
+    create_bundle([(tmp_path / "a", "../escape")], tmp_path / "b.enc", crypto)
+    with Bundle(tmp_path / "b.enc", crypto) as bundle:
+        with pytest.raises(ValueError, match="unsafe"):
+            bundle.extract_all(tmp_path / "out")
+        with pytest.raises(KeyError):
+            bundle.read("missing")
+    assert not (tmp_path / "escape").exists()
+
+
+def test_regular_container_is_not_a_bundle(tmp_path):
+    crypto = CryptoManager()
+    (tmp_path / "a").write_bytes(b"x" * 100)
+    FileOperations.encrypt_file(tmp_path / "a", tmp_path / "a.enc", crypto, progress=False)
+    assert not is_bundle(tmp_path / "a.enc")
+    assert not is_bundle(tmp_path / "a")
+
+
+def test_empty_bundle(tmp_path):
+    crypto = CryptoManager()
+    create_bundle([], tmp_path / "b.enc", crypto)
+    with Bundle(tmp_path / "b.enc", crypto) as bundle:
+        assert bundle.entries == []
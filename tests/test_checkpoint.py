@@ -0,0 +1,126 @@
+import hashlib
+import json
+import os
+import pytest
+from encryptor.core import file_ops
+from encryptor.core.checkpoint import AtomicOutput, checkpoint_path, partial_path
+from encryptor.core.crypto import CryptoManager
+from encryptor.core.file_ops import FileOperations
+
+CHUNK = 4096
+DATA = os.urandom(CHUNK * 40 + 123)
+
+
+class Crash(Exception):
+    pass
+
+
+def _crash_at(monkeypatch, name, number):
+    """Make chunk ``number`` fail; return the list of chunk numbers processed."""
+    seen = []
+    real = getattr(file_ops, name)
+
+    def failing(*args):
+        item = args[-1]
+        if item[0] == number:
+            raise Crash()
+        seen.append(item[0])
+        return real(*args)
+
+    monkeypatch.setattr(file_ops, name, failing)
+    return seen
+
+
+def test_failed_write_leaves_no_output(tmp_path):
+    output = tmp_path / "out.bin"
+    with pytest.raises(Crash):
+        with AtomicOutput(output) as out:
+            out.file.write(b"partial")
+            raise Crash()
+    assert not output.exists()
+    assert not partial_path(output).exists()
+
+
+def test_encrypt_resumes_from_checkpoint(tmp_path, monkeypatch):
+    crypto = CryptoManager()
+    plain, enc = tmp_path / "plain.bin", tmp_path / "plain.bin.enc"
+    plain.write_bytes(DATA)
+    options = dict(chunk_size=CHUNK, progress=False, checkpoint_interval=CHUNK * 8)
+
+    _crash_at(monkeypatch, "_encrypt_numbered", 30)
+    with pytest.raises(Crash):
+        FileOperations.encrypt_file(plain, enc, crypto, **options)
+    assert not enc.exists()
+    assert partial_path(enc).exists() and checkpoint_path(enc).exists()
+
+    monkeypatch.undo()
+    seen = _crash_at(monkeypatch, "_encrypt_numbered", -1)
+    source_hash, output_hash = hashlib.sha256(), hashlib.sha256()
+    FileOperations.encrypt_file(plain, enc, crypto, resume=True, source_hasher=source_hash,
+                                output_hasher=output_hash, **options)
+    # Only the chunks after the last checkpoint (at chunk 24) are redone
+    assert seen[0] == 24 and seen[-1] == 40
+    assert not partial_path(enc).exists() and not checkpoint_path(enc).exists()
+    assert source_hash.digest() == hashlib.sha256(DATA).digest()
+    assert output_hash.digest() == hashlib.sha256(enc.read_bytes()).digest()
+
+    FileOperations.decrypt_file(enc, tmp_path / "out.bin", crypto, progress=False)
+    assert (tmp_path / "out.bin").read_bytes() == DATA
+
+
+def test_encrypt_checkpoint_stays_small_and_checks_the_prefix(tmp_path, monkeypatch):
+    crypto = CryptoManager()
+    plain, enc = tmp_path / "plain.bin", tmp_path / "plain.bin.enc"
+    plain.write_bytes(DATA)
+    options = dict(chunk_size=CHUNK, progress=False, checkpoint_interval=CHUNK * 8)
+    _crash_at(monkeypatch, "_encrypt_numbered", 30)
+    with pytest.raises(Crash):
+        FileOperations.encrypt_file(plain, enc, crypto, **options)
+    monkeypatch.undo()
+    state = json.loads(checkpoint_path(enc).read_text())['state']
+    assert set(state) == {'position', 'done', 'chunk_size', 'data_key'}
+
+    # A committed chunk damaged after the checkpoint stops the resume
+    partial = partial_path(enc)
+    damaged = bytearray(partial.read_bytes())
+    damaged[state['position'] - 1] ^= 1
+    partial.write_bytes(bytes(damaged))
+    with pytest.raises(ValueError):
+        FileOperations.encrypt_file(plain, enc, crypto, resume=True, **options)
+    assert not enc.exists()
+
+
+@pytest.mark.parametrize("cipher", ["fernet", "chacha20-poly1305"])
+def test_decrypt_resumes_from_checkpoint(tmp_path, monkeypatch, cipher):
+    crypto = CryptoManager(cipher=cipher)
+    plain, enc, out = tmp_path / "plain.bin", tmp_path / "plain.bin.enc", tmp_path / "out.bin"
+    plain.write_bytes(DATA)
+    FileOperations.encrypt_file(plain, enc, crypto, CHUNK, progress=False)
+
+    _crash_at(monkeypatch, "_decrypt_numbered", 20)
+    with pytest.raises(Crash):
+        FileOperations.decrypt_file(enc, out, crypto, progress=False,
+                                    checkpoint_interval=CHUNK * 8)
+    monkeypatch.undo()
+    seen = _crash_at(monkeypatch, "_decrypt_numbered", -1)
+    FileOperations.decrypt_file(enc, out, crypto, progress=False, resume=True,
+                                checkpoint_interval=CHUNK * 8)
+    assert seen[0] == 16
+    assert out.read_bytes() == DATA
+
+
+def test_checkpoint_for_changed_source_is_ignored(tmp_path, monkeypatch):
+    crypto = CryptoManager()
+    plain, enc = tmp_path / "plain.bin", tmp_path / "plain.bin.enc"
+    plain.write_bytes(DATA)
+    _crash_at(monkeypatch, "_encrypt_numbered", 30)
+    with pytest.raises(Crash):
+        FileOperations.encrypt_file(plain, enc, crypto, CHUNK, progress=False,
+                                    checkpoint_interval=CHUNK * 8)
+    monkeypatch.undo()
+
+    changed = DATA[::-1]
+    plain.write_bytes(changed)
+    FileOperations.encrypt_file(plain, enc, crypto, CHUNK, progress=False, resume=True)
+    FileOperations.decrypt_file(enc, tmp_path / "out.bin", crypto, progress=False)
+    assert (tmp_path / "out.bin").read_bytes() == changed
@@ -0,0 +1,53 @@
+import pytest
+from encryptor.core import chunking
+from encryptor.core.chunking import (AdaptiveChunkSizer, ChunkSizer, chunk_sizer,
+                                     initial_chunk_size)
+
+
+def test_initial_chunk_size():
+    assert initial_chunk_size(1000) == chunking.MIN_CHUNK_SIZE
+    assert initial_chunk_size(64 * 1024 * 1024) == 1024 * 1024
+    assert initial_chunk_size(10 * 1024 * 1024) == 128 * 1024
+    assert initial_chunk_size(10 * 1024 * 1024, block_size=1024 * 1024) == 1024 * 1024
+
+
+def test_small_files_use_fixed_single_chunk():
+    sizer = chunk_sizer(None, 5000)
+    assert type(sizer) is ChunkSizer
+    assert sizer.next_size() >= 5000
+
+
+def test_explicit_chunk_size_is_fixed():
+    sizer = chunk_sizer(4096, 10 ** 9)
+    assert type(sizer) is ChunkSizer and sizer.max_size == 4096
+    with pytest.raises(ValueError):
+        ChunkSizer(0)
+
+
+def _run(sizer, seconds_per_chunk, chunks):
+    """Drive the sizer with a fake clock; seconds_per_chunk(size) -> time taken."""
+    now = [0.0]
+    sizer._clock = lambda: now[0]
+    sizes = []
+    for _ in range(chunks):
+        size = sizer.next_size()
+        sizes.append(size)
+        now[0] += seconds_per_chunk(size)
+    return sizes
+
+
+def test_adaptive_grows_while_throughput_improves(monkeypatch):
+    monkeypatch.setattr(chunking, "WINDOW_BYTES", 1)
+    sizer = AdaptiveChunkSizer(64 * 1024, max_size=1024 * 1024)
+    # Fixed per-chunk overhead: larger chunks are always faster
+    sizes = _run(sizer, lambda size: 0.001 + size / 1e9, 200)
+    assert sizes[-1] == 1024 * 1024
+    assert sizes == sorted(sizes)
+
+
+def test_adaptive_reverts_when_throughput_stops_improving(monkeypatch):
+    monkeypatch.setattr(chunking, "WINDOW_BYTES", 1)
+    sizer = AdaptiveChunkSizer(64 * 1024, max_size=4 * 1024 * 1024)
+    # Throughput grows with chunk size up to 128 KiB, then stays flat
+    sizes = _run(sizer, lambda size: size / (1e8 * min(size / (128 * 1024), 1)), 200)
+    assert sizes[-1] == 128 * 1024
@@ -0,0 +1,141 @@
+import io
+import os
+import pytest
+from encryptor.core import chunkstore
+from encryptor.core.chunkstore import (ChunkStore, ContentChunker, is_recipe, read_stats,
+                                       rewrap_store)
+from encryptor.core.container import ContainerError
+from encryptor.core.crypto import CryptoManager
+from encryptor.core.file_ops import FileOperations
+from encryptor.core.rekey import REWRAPPED, rekey_file
+
+
+def _chunker():
+    return ContentChunker(b"\x11\x7e", 12345, min_size=256, max_size=8192, bits=4)
+
+
+def test_chunker_is_deterministic_and_bounded():
+    data = os.urandom(200_000)
+    chunks = _chunker().split_bytes(data)
+
+    assert b"".join(chunks) == data
+    assert chunks == list(_chunker().split(io.BytesIO(data), read_size=1000))
+    assert all(256 <= len(chunk) <= 8192 for chunk in chunks[:-1])
+    assert _chunker().split_bytes(b"") == []
+
+
+def test_chunker_resynchronises_after_an_insertion():
+    data = os.urandom(200_000)
+    before = _chunker().split_bytes(data)
+    after = _chunker().split_bytes(data[:1000] + b"inserted" + data[1000:])
+
+    assert len(set(before) & set(after)) >= len(before) - 3
+
+
+def test_round_trip(tmp_path):
+    crypto = CryptoManager()
+    source = tmp_path / "plain.bin"
+    source.write_bytes(os.urandom(300_000) + b"\0" * 300_000)
+
+    with ChunkStore(tmp_path / "store", crypto, compression='zlib') as store:
+        assert store.store_file(source, tmp_path / "plain.bin.enc", jobs=2) == 600_000
+        assert is_recipe(tmp_path / "plain.bin.enc")
+        store.restore_file(tmp_path / "plain.bin.enc", tmp_path / "out.bin", jobs=2)
+    assert (tmp_path / "out.bin").read_bytes() == source.read_bytes()
+
+    # Reopened with the same key
+    with ChunkStore(tmp_path / "store", CryptoManager(crypto.key)) as store:
+        store.restore_file(tmp_path / "plain.bin.enc", tmp_path / "again.bin")
+    assert (tmp_path / "again.bin").read_bytes() == source.read_bytes()
+
+
+def test_recipe_is_streamed(tmp_path, monkeypatch):
+    monkeypatch.setattr(chunkstore, "RECIPE_READ_ENTRIES", 3)
+    data = os.urandom(200_000)
+    with ChunkStore(tmp_path / "store", CryptoManager()) as store:
+        store.chunker = _chunker()
+        with open(tmp_path / "a.enc", "wb") as recipe:
+            assert store.store_stream(io.BytesIO(data), recipe) == 200_000
+        entries = list(store.read_recipe(tmp_path / "a.enc"))
+        assert len(entries) > 10 and sum(size for _, size in entries) == 200_000
+        store.restore_file(tmp_path / "a.enc", tmp_path / "out")
+        # The totals rows count towards the next commit like chunk rows do
+        assert store._pending == store.stats().chunks + 2
+    assert (tmp_path / "out").read_bytes() == data
+
+
+def test_duplicates_add_no_chunks(tmp_path):
+    data = os.urandom(500_000)
+    (tmp_path / "a").write_bytes(data)
+    (tmp_path / "b").write_bytes(data)
+
+    with ChunkStore(tmp_path / "store", CryptoManager()) as store:
+        store.store_file(tmp_path / "a", tmp_path / "a.enc")
+        first = store.stats()
+        store.store_file(tmp_path / "b", tmp_path / "b.enc")
+        second = store.stats()
+
+    assert second.chunks == first.chunks
+    assert second.stored_bytes == first.stored_bytes
+    assert second.files == 2 and second.logical_bytes == 1_000_000
+    assert second.dedup_ratio == pytest.approx(2.0)
+    assert second.saved_bytes == 500_000
+    assert read_stats(tmp_path / "store") == second
+
+
+def test_corrupt_chunk_is_detected(tmp_path):
+    (tmp_path / "a").write_bytes(os.urandom(100_000))
+    with ChunkStore(tmp_path / "store", CryptoManager()) as store:
+        store.store_file(tmp_path / "a", tmp_path / "a.enc")
+        chunk_id, size = next(store.read_recipe(tmp_path / "a.enc"))
+        path = store.chunk_path(chunk_id)
+        token = bytearray(path.read_bytes())
+        token[-1] ^= 1
+        path.write_bytes(bytes(token))
+
+        with pytest.raises(ValueError):
+            store.restore_file(tmp_path / "a.enc", tmp_path / "out")
+        assert not (tmp_path / "out").exists()
+
+        path.unlink()
+        with pytest.raises(ContainerError):
+            store.get(chunk_id, size)
+
+
+def test_store_rejects_other_keys_and_settings(tmp_path):
+    ChunkStore(tmp_path / "store", CryptoManager(), compression='zlib').close()
+    with pytest.raises(ValueError):
+        ChunkStore(tmp_path / "store", CryptoManager())
+    with pytest.raises(ValueError):
+        ChunkStore(tmp_path / "other", CryptoManager(), compression='nope')
+
+
+def test_plain_decrypt_rejects_recipes(tmp_path):
+    crypto = CryptoManager()
+    (tmp_path / "a").write_bytes(b"data" * 1000)
+    with ChunkStore(tmp_path / "store", crypto) as store:
+        store.store_file(tmp_path / "a", tmp_path / "a.enc")
+
+    with pytest.raises(ContainerError, match="recipe"):
+        FileOperations.decrypt_file(tmp_path / "a.enc", tmp_path / "out", crypto, progress=False)
+
+
+def test_rekey_moves_the_store_and_its_recipes(tmp_path):
+    old, new = CryptoManager(), CryptoManager()
+    (tmp_path / "a").write_bytes(os.urandom(100_000))
+    with ChunkStore(tmp_path / "store", old) as store:
+        store.store_file(tmp_path / "a", tmp_path / "a.enc")
+
+    # A recipe alone would leave the store on the old key
+    with pytest.raises(ContainerError, match="store"):
+        rekey_file(tmp_path / "a.enc", old, new)
+
+    store_id, rewrapped = rewrap_store(tmp_path / "store", old, new)
+    assert rewrapped and rewrap_store(tmp_path / "store", old, new) == (store_id, False)
+    assert rekey_file(tmp_path / "a.enc", old, new, stores=[store_id]) == REWRAPPED
+
+    with ChunkStore(tmp_path / "store", new) as store:
+        store.restore_file(tmp_path / "a.enc", tmp_path / "out")
+    assert (tmp_path / "out").read_bytes() == (tmp_path / "a").read_bytes()
+    with pytest.raises(ValueError):
+        ChunkStore(tmp_path / "store", old)
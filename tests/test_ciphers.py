@@ -0,0 +1,69 @@
+import base64
+import pickle
+import pytest
+from cryptography.fernet import Fernet
+from encryptor.core.ciphers import SUITES, SUITES_BY_ID
+
+MASTER_KEY = base64.urlsafe_b64decode(Fernet.generate_key())
+
+
+@pytest.mark.parametrize("name", sorted(SUITES))
+def test_suite_round_trip(name):
+    suite = SUITES[name](MASTER_KEY)
+    token = suite.encrypt_chunk(b"payload" * 100, number=3, last=False)
+    assert suite.decrypt_chunk(token, number=3, last=False) == b"payload" * 100
+    assert SUITES_BY_ID[suite.id] is SUITES[name]
+
+
+@pytest.mark.parametrize("name", ["aes-256-gcm", "chacha20-poly1305"])
+def test_aead_output_is_compact(name):
+    token = SUITES[name](MASTER_KEY).encrypt_chunk(b"x" * 65536)
+    assert len(token) == 65536 + 12 + 16
+
+
+@pytest.mark.parametrize("name", sorted(SUITES))
+def test_suite_binds_chunk_position(name):
+    suite = SUITES[name](MASTER_KEY)
+    assert suite.binds_position
+    token = suite.encrypt_chunk(b"data", number=1, last=False)
+    for number, last in [(2, False), (1, True)]:
+        with pytest.raises(ValueError):
+            suite.decrypt_chunk(token, number=number, last=last)
+        with pytest.raises(ValueError):
+            suite.verify_chunk(token, number=number, last=last)
+
+
+def test_legacy_fernet_is_read_only():
+    assert "fernet-legacy" not in SUITES
+    suite = SUITES_BY_ID[0](MASTER_KEY)
+    token = suite.encrypt_chunk(b"data")
+    assert suite.decrypt_chunk(token, number=5, last=False) == b"data"
+    assert len(SUITES["fernet"](MASTER_KEY).encrypt_chunk(b"data")) == len(token)
+
+
+@pytest.mark.parametrize("name", sorted(SUITES))
+def test_suite_rejects_tampering(name):
+    suite = SUITES[name](MASTER_KEY)
+    token = bytearray(suite.encrypt_chunk(b"data"))
+    token[-1] ^= 1
+    with pytest.raises(ValueError):
+        suite.decrypt_chunk(bytes(token))
+
+
+@pytest.mark.parametrize("name", sorted(SUITES))
+def test_verify_chunk_authenticates_without_plaintext(name):
+    suite = SUITES[name](MASTER_KEY)
+    token = suite.encrypt_chunk(b"data", number=2, last=False)
+    assert suite.verify_chunk(token, number=2, last=False) is None
+    tampered = bytearray(token)
+    tampered[len(tampered) // 2] ^= 1
+    with pytest.raises(ValueError):
+        suite.verify_chunk(bytes(tampered), number=2, last=False)
+    with pytest.raises(ValueError):
+        SUITES[name](MASTER_KEY[::-1]).verify_chunk(token, number=2, last=False)
+
+
+def test_suites_are_picklable():
+    suite = SUITES["aes-256-gcm"](MASTER_KEY)
+    clone = pickle.loads(pickle.dumps(suite))
+    assert clone.decrypt_chunk(suite.encrypt_chunk(b"data")) == b"data"
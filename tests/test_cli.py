@@ -0,0 +1,46 @@
+import argparse
+import json
+import os
+import subprocess
+import sys
+from pathlib import Path
+import pytest
+from encryptor.cli.app import parse_chunk_size, parse_size
+
+ROOT = Path(__file__).resolve().parent.parent
+
+
+def _imported_after(code):
+    check = code + "\nimport json, sys; print(json.dumps(sorted(sys.modules)))"
+    env = dict(os.environ, PYTHONPATH=str(ROOT))
+    output = subprocess.run([sys.executable, "-c", check], capture_output=True,
+                            text=True, env=env, check=True).stdout
+    return set(json.loads(output.splitlines()[-1]))
+
+
+def test_cli_import_stays_light():
+    modules = _imported_after("import encryptor; from encryptor.cli.app import FileEncryptorCLI")
+    assert not {"PyQt5", "tqdm", "sqlite3", "concurrent.futures"} & modules
+
+
+def test_file_pipeline_imports_codecs_lazily():
+    modules = _imported_after("from encryptor.core.file_ops import FileOperations")
+    assert not {"lzma", "zstandard", "_lzma"} & modules
+    modules = _imported_after("from encryptor.core.compression import get_codec\n"
+                              "get_codec('lzma').compress(b'x')")
+    assert "lzma" in modules
+
+
+def test_package_exports_entry_points_lazily():
+    modules = _imported_after("import encryptor; encryptor.cli_main")
+    assert "encryptor.cli.app" in modules
+    assert "PyQt5" not in modules
+
+
+def test_parse_sizes():
+    assert parse_size("512") == 512
+    assert parse_size("4KiB") == 4096
+    assert parse_chunk_size("auto") is None
+    assert parse_chunk_size("1M") == 1024 * 1024
+    with pytest.raises(argparse.ArgumentTypeError):
+        parse_chunk_size("0")
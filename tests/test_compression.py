@@ -0,0 +1,93 @@
+import asyncio
+import io
+import os
+import pytest
+from encryptor.core import aio
+from encryptor.core.compression import (CODECS, COMPRESSED, STORED, get_codec, pack_chunk,
+                                        unpack_chunk)
+from encryptor.core.container import ContainerReader
+from encryptor.core.crypto import CryptoManager
+from encryptor.core.file_ops import FileOperations
+
+TEXT = b"".join(b"line %d of some very repetitive text\n" % (i % 50) for i in range(20_000))
+
+
+@pytest.mark.parametrize("name", sorted(CODECS))
+def test_pack_round_trip(name):
+    codec = get_codec(name)
+    for data in (b"", b"x", TEXT, os.urandom(100_000)):
+        assert unpack_chunk(codec, pack_chunk(codec, data), max(len(data), 1)) == data
+
+
+def test_incompressible_chunks_are_stored():
+    codec = get_codec("zlib")
+    data = os.urandom(100_000)
+    assert pack_chunk(codec, data) == bytes((STORED,)) + data
+    assert pack_chunk(codec, TEXT)[0] == COMPRESSED
+
+
+@pytest.mark.parametrize("name", sorted(CODECS))
+def test_decompression_is_bounded(name):
+    codec = get_codec(name)
+    payload = pack_chunk(codec, bytes(1_000_000))
+    with pytest.raises(ValueError):
+        unpack_chunk(codec, payload, 65536)
+    with pytest.raises(ValueError):
+        unpack_chunk(codec, payload[:-5], 1_000_000)
+
+
+def test_unknown_codec():
+    with pytest.raises(ValueError, match="not available"):
+        get_codec("brotli")
+
+
+@pytest.mark.parametrize("name", sorted(CODECS))
+@pytest.mark.parametrize("cipher", ["fernet", "aes-256-gcm"])
+def test_file_round_trip(tmp_path, name, cipher):
+    crypto = CryptoManager(cipher=cipher)
+    data = TEXT + os.urandom(50_000) + TEXT
+    plain = tmp_path / "plain.txt"
+    plain.write_bytes(data)
+    FileOperations.encrypt_file(plain, tmp_path / "plain.enc", crypto, 65536,
+                                progress=False, compression=name)
+
+    with open(tmp_path / "plain.enc", "rb") as f:
+        assert ContainerReader(f).header.metadata["compression"] == name
+    assert (tmp_path / "plain.enc").stat().st_size < len(data) // 2
+    FileOperations.decrypt_file(tmp_path / "plain.enc", tmp_path / "out.txt", crypto,
+                                progress=False)
+    assert (tmp_path / "out.txt").read_bytes() == data
+
+    with FileOperations.open_encrypted(tmp_path / "plain.enc", crypto) as reader:
+        reader.seek(len(TEXT) - 10)
+        assert reader.read(100) == data[len(TEXT) - 10:len(TEXT) + 90]
+
+
+class _Reader:
+    def __init__(self, data):
+        self._buffer = io.BytesIO(data)
+
+    async def read(self, size):
+        return self._buffer.read(size)
+
+
+async def _decrypt_async(data, crypto):
+    plain = io.BytesIO()
+    await aio.decrypt_stream(_Reader(data), plain, crypto)
+    return plain.getvalue()
+
+
+def test_compressed_stream_and_aio():
+    crypto = CryptoManager()
+    encrypted = io.BytesIO()
+    FileOperations.encrypt_stream(io.BytesIO(TEXT), encrypted, crypto, 8192,
+                                  compression="zlib")
+    assert len(encrypted.getvalue()) < len(TEXT) // 4
+    assert asyncio.run(_decrypt_async(encrypted.getvalue(), crypto)) == TEXT
+
+    async def round_trip():
+        out = io.BytesIO()
+        await aio.encrypt_stream(_Reader(TEXT), out, crypto, 8192, compression="lzma")
+        return await _decrypt_async(out.getvalue(), crypto)
+
+    assert asyncio.run(round_trip()) == TEXT
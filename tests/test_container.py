@@ -0,0 +1,62 @@
+import io
+import pytest
+from encryptor.core.container import (FLAG_UNINDEXED, ContainerError, ContainerReader,
+                                      ContainerWriter, legacy_token_size)
+from encryptor.core.crypto import CryptoManager
+
+
+def _build(chunks):
+    stream = io.BytesIO()
+    writer = ContainerWriter(stream, cipher=0, chunk_size=4)
+    for chunk in chunks:
+        writer.write_chunk(chunk, len(chunk))
+    writer.close()
+    return stream.getvalue()
+
+
+def test_sequential_frames():
+    data = _build([b"aaaa", b"bbbb", b"cc"])
+    reader = ContainerReader(io.BytesIO(data))
+    assert reader.header.chunk_size == 4
+    assert list(reader.frames()) == [b"aaaa", b"bbbb", b"cc"]
+
+
+def test_random_access_frame():
+    data = _build([b"aaaa", b"bbbb", b"cc"])
+    reader = ContainerReader(io.BytesIO(data))
+    assert reader.read_frame(2) == b"cc"
+    assert reader.read_frame(0) == b"aaaa"
+    assert [plain_len for _, plain_len in reader.index] == [4, 4, 2]
+
+
+def test_unindexed_container_reads_sequentially():
+    stream = io.BytesIO()
+    writer = ContainerWriter(stream, cipher=0, chunk_size=4, flags=FLAG_UNINDEXED)
+    for chunk in (b"aaaa", b"bb"):
+        writer.write_chunk(chunk, len(chunk))
+    writer.close()
+    assert writer.index == []
+
+    reader = ContainerReader(io.BytesIO(stream.getvalue()))
+    assert not reader.header.indexed
+    assert list(reader.frames()) == [b"aaaa", b"bb"]
+    assert reader.chunk_count == 2
+    with pytest.raises(ContainerError):
+        reader.read_frame(0)
+
+
+def test_truncated_container():
+    data = _build([b"aaaa", b"bbbb"])
+    reader = ContainerReader(io.BytesIO(data[:-10]))
+    with pytest.raises(ContainerError):
+        list(reader.frames())
+
+
+def test_not_a_container():
+    with pytest.raises(ContainerError):
+        ContainerReader(io.BytesIO(b"gAAAAA" + b"\0" * 20))
+
+
+def test_legacy_token_size():
+    crypto = CryptoManager()
+    assert len(crypto.encrypt_data(b"x" * 64 * 1024)) == legacy_token_size()
@@ -1,7 +1,9 @@
 import pytest
 from pathlib import Path
 from encryptor.core.crypto import CryptoManager
+import base64
 import os
+import struct
 
 @pytest.fixture
 def temp_key_file(tmp_path):
@@ -48,4 +50,54 @@ def test_key_save_load(temp_key_file):
 
 def test_key_file_not_found():
     with pytest.raises(FileNotFoundError):
-        CryptoManager.load_key("nonexistent.key")
\ No newline at end of file
+        CryptoManager.load_key("nonexistent.key")
+
+def test_chunk_encryption_is_raw_fernet():
+    crypto = CryptoManager(cipher="fernet")
+    token = crypto.encrypt_chunk(b"chunk data")
+
+    assert crypto.decrypt_chunk(token) == b"chunk data"
+    # Raw chunk tokens are ordinary Fernet tokens without the base64 layer,
+    # their plaintext led by the chunk number and last flag
+    assert crypto.decrypt_data(base64.urlsafe_b64encode(token)) == (
+        struct.pack(">QB", 0, True) + b"chunk data")
+
+
+def test_invalid_chunk_decryption():
+    token = CryptoManager().encrypt_chunk(b"chunk data")
+    with pytest.raises(ValueError):
+        CryptoManager().decrypt_chunk(token)
+    with pytest.raises(ValueError):
+        CryptoManager().decrypt_chunk(token[:-1])
+
+
+def test_same_key_works_with_every_cipher(temp_key_file):
+    fernet = CryptoManager.load_key(temp_key_file, cipher="fernet")
+    gcm = CryptoManager.load_key(temp_key_file, cipher="aes-256-gcm")
+
+    token = gcm.encrypt_chunk(b"data")
+    assert fernet.get_suite(gcm.cipher.id).decrypt_chunk(token) == b"data"
+
+
+def test_unknown_cipher():
+    with pytest.raises(ValueError):
+        CryptoManager(cipher="rot13")
+    with pytest.raises(ValueError):
+        CryptoManager().get_suite(99)
+
+
+def test_data_keys_are_wrapped_per_file():
+    crypto = CryptoManager()
+    first, second = crypto.new_data_key(), crypto.new_data_key()
+    assert first != second and len(first) == len(second)
+
+    token = crypto.get_suite(crypto.cipher.id, first).encrypt_chunk(b"data")
+    assert crypto.get_suite(crypto.cipher.id, first).decrypt_chunk(token) == b"data"
+    with pytest.raises(ValueError):
+        crypto.decrypt_chunk(token)
+    # The wrapped key is bound to the cipher suite recorded next to it
+    with pytest.raises(ValueError):
+        crypto.unwrap_key(first, 0)
+    with pytest.raises(ValueError):
+        CryptoManager().get_suite(crypto.cipher.id, first)
+    assert CryptoManager(envelope=False).new_data_key() is None
@@ -1,6 +1,10 @@
 import pytest
 from pathlib import Path
-from encryptor.core.file_ops import FileOperations
+from encryptor.core.ciphers import FernetSuite
+from encryptor.core.container import ContainerReader, ContainerWriter
+from encryptor.core.crypto import CryptoManager
+from encryptor.core.file_ops import FileOperations, iter_inputs
+import io
 import shutil
 import os
 
@@ -47,3 +51,211 @@ def test_create_output_path(test_dir):
         input_path, "output", "_backup", ".enc"
     )
     assert output_path.as_posix() == "output/file3_backup.enc"
+
+
+def test_encrypt_decrypt_file_multiple_chunks(tmp_path):
+    crypto = CryptoManager()
+    data = os.urandom(3 * 64 * 1024 + 123)
+    plain = tmp_path / "plain.bin"
+    plain.write_bytes(data)
+
+    FileOperations.encrypt_file(plain, tmp_path / "plain.bin.enc", crypto)
+    FileOperations.decrypt_file(tmp_path / "plain.bin.enc", tmp_path / "out.bin", crypto)
+
+    assert (tmp_path / "out.bin").read_bytes() == data
+    # Raw binary chunks keep the overhead far below base64's 33%
+    assert (tmp_path / "plain.bin.enc").stat().st_size < len(data) * 1.01
+
+
+def test_decrypt_legacy_file(tmp_path):
+    crypto = CryptoManager()
+    data = os.urandom(2 * 64 * 1024 + 5)
+    legacy = tmp_path / "legacy.enc"
+    chunks = [data[i:i + 64 * 1024] for i in range(0, len(data), 64 * 1024)]
+    legacy.write_bytes(b"".join(crypto.encrypt_data(chunk) for chunk in chunks))
+
+    FileOperations.decrypt_file(legacy, tmp_path / "legacy.out", crypto)
+    assert (tmp_path / "legacy.out").read_bytes() == data
+
+
+def test_output_path_for():
+    encrypted = FileOperations.output_path_for("data/a.txt", "out", "encrypt")
+    assert encrypted.as_posix() == "out/a.txt.enc"
+    decrypted = FileOperations.output_path_for(encrypted, "back", "decrypt")
+    assert decrypted.as_posix() == "back/a.txt"
+
+
+@pytest.mark.parametrize("executor", ["thread", "process"])
+def test_parallel_encrypt_decrypt_file(tmp_path, executor):
+    crypto = CryptoManager()
+    data = os.urandom(10 * 64 * 1024 + 7)
+    plain = tmp_path / "plain.bin"
+    plain.write_bytes(data)
+
+    FileOperations.encrypt_file(plain, tmp_path / "plain.enc", crypto, jobs=4, executor=executor)
+    FileOperations.decrypt_file(tmp_path / "plain.enc", tmp_path / "out.bin", crypto, jobs=4)
+
+    assert (tmp_path / "out.bin").read_bytes() == data
+
+
+def test_plan_tasks_mirrors_tree(test_dir, tmp_path):
+    tasks = dict(FileOperations.plan_tasks([test_dir], tmp_path / "out", "encrypt", recursive=True))
+    target = tmp_path / "out" / test_dir.name
+    assert tasks[test_dir / "subdir" / "file3.txt"] == target / "subdir" / "file3.txt.enc"
+    assert tasks[test_dir / "file1.txt"] == target / "file1.txt.enc"
+
+
+def test_iter_inputs_reports_the_root(test_dir, tmp_path):
+    inputs = list(iter_inputs([test_dir / "file1.txt", test_dir, tmp_path / "missing"],
+                              recursive=True))
+    assert inputs[0] == (test_dir / "file1.txt", None)
+    assert (test_dir / "subdir" / "file3.txt", test_dir) in inputs
+    assert all(path != tmp_path / "missing" for path, _ in inputs)
+
+
+@pytest.mark.parametrize("cipher", ["fernet", "aes-256-gcm", "chacha20-poly1305"])
+def test_decrypt_picks_cipher_from_header(tmp_path, cipher):
+    key = CryptoManager().key
+    data = os.urandom(2 * 64 * 1024 + 1)
+    (tmp_path / "plain").write_bytes(data)
+
+    FileOperations.encrypt_file(tmp_path / "plain", tmp_path / "plain.enc",
+                                CryptoManager(key, cipher=cipher))
+    # The decrypting manager's default cipher is irrelevant
+    FileOperations.decrypt_file(tmp_path / "plain.enc", tmp_path / "out",
+                                CryptoManager(key, cipher="fernet"))
+    assert (tmp_path / "out").read_bytes() == data
+
+
+@pytest.mark.parametrize("cipher", ["fernet", "aes-256-gcm"])
+@pytest.mark.parametrize("order", [[0, 1], [0, 2, 1], [1, 0, 2]])
+def test_dropped_or_reordered_chunks_are_rejected(tmp_path, cipher, order):
+    crypto = CryptoManager(cipher=cipher)
+    (tmp_path / "plain").write_bytes(os.urandom(3 * 64 * 1024))
+    FileOperations.encrypt_file(tmp_path / "plain", tmp_path / "plain.enc", crypto)
+
+    # Rearrange the chunks but write a consistent index for them
+    with open(tmp_path / "plain.enc", "rb") as infile, open(tmp_path / "cut.enc", "wb") as outfile:
+        reader = ContainerReader(infile)
+        header = reader.header
+        writer = ContainerWriter(outfile, header.cipher, header.chunk_size, header.flags,
+                                 header.meta)
+        frames = list(reader.frames())
+        for number in order:
+            writer.write_chunk(frames[number], 64 * 1024)
+        writer.close()
+
+    with pytest.raises(ValueError):
+        FileOperations.decrypt_file(tmp_path / "cut.enc", tmp_path / "out", crypto)
+
+
+def test_legacy_fernet_containers_still_decrypt(tmp_path):
+    crypto = CryptoManager(envelope=False)
+    suite = crypto.get_suite(FernetSuite.id)
+    chunks = [os.urandom(100), os.urandom(50)]
+    with open(tmp_path / "old.enc", "wb") as outfile:
+        writer = ContainerWriter(outfile, suite.id, 100)
+        for chunk in chunks:
+            writer.write_chunk(suite.encrypt_chunk(chunk), len(chunk))
+        writer.close()
+
+    FileOperations.decrypt_file(tmp_path / "old.enc", tmp_path / "out", crypto)
+    assert (tmp_path / "out").read_bytes() == b"".join(chunks)
+
+
+def test_empty_file_round_trip(tmp_path):
+    crypto = CryptoManager()
+    (tmp_path / "plain").write_bytes(b"")
+    FileOperations.encrypt_file(tmp_path / "plain", tmp_path / "plain.enc", crypto)
+    FileOperations.decrypt_file(tmp_path / "plain.enc", tmp_path / "out", crypto)
+    assert (tmp_path / "out").read_bytes() == b""
+
+
+@pytest.mark.parametrize("io_mode", ["buffered", "readinto", "mmap", "direct"])
+def test_encrypt_decrypt_io_modes(tmp_path, io_mode):
+    crypto = CryptoManager()
+    data = os.urandom(5 * 64 * 1024 + 99)
+    (tmp_path / "plain").write_bytes(data)
+
+    FileOperations.encrypt_file(tmp_path / "plain", tmp_path / "plain.enc", crypto,
+                                jobs=3, io_mode=io_mode)
+    FileOperations.decrypt_file(tmp_path / "plain.enc", tmp_path / "out", crypto,
+                                jobs=3, io_mode=io_mode)
+    assert (tmp_path / "out").read_bytes() == data
+
+
+def test_bulk_io_round_trip(tmp_path, monkeypatch):
+    from encryptor.core import streams
+    monkeypatch.setattr(streams, "BULK_WINDOW", 64 * 1024)
+    crypto = CryptoManager()
+    data = os.urandom(1024 * 1024 + 7)
+    (tmp_path / "plain").write_bytes(data)
+
+    FileOperations.encrypt_file(tmp_path / "plain", tmp_path / "plain.enc", crypto,
+                                chunk_size=16 * 1024, jobs=2, progress=False, bulk_io=True)
+    FileOperations.decrypt_file(tmp_path / "plain.enc", tmp_path / "out", crypto,
+                                jobs=2, progress=False, bulk_io=True)
+    assert (tmp_path / "out").read_bytes() == data
+
+
+def test_adaptive_chunks_decrypt_without_encrypt_settings(tmp_path, monkeypatch):
+    from encryptor.core import chunking
+    monkeypatch.setattr(chunking, "WINDOW_BYTES", 1)
+    monkeypatch.setattr(chunking, "MIN_GAIN", 0.0)  # always grow
+    crypto = CryptoManager()
+    data = os.urandom(4 * 1024 * 1024 + 17)
+    (tmp_path / "plain").write_bytes(data)
+
+    FileOperations.encrypt_file(tmp_path / "plain", tmp_path / "plain.enc", crypto)
+    with open(tmp_path / "plain.enc", "rb") as stream:
+        sizes = [plain_len for _, plain_len in ContainerReader(stream).index]
+    assert len(set(sizes)) > 2
+
+    FileOperations.decrypt_file(tmp_path / "plain.enc", tmp_path / "out", crypto)
+    assert (tmp_path / "out").read_bytes() == data
+
+class _Pipe:
+    """Read/write-only stream without fileno() or seek(), like a pipe."""
+
+    def __init__(self, data=b""):
+        self._buffer = io.BytesIO(data)
+
+    def read(self, size=-1):
+        return self._buffer.read(size)
+
+    def write(self, data):
+        return self._buffer.write(data)
+
+    def getvalue(self):
+        return self._buffer.getvalue()
+
+
+@pytest.mark.parametrize("cipher", ["fernet", "aes-256-gcm"])
+def test_encrypt_decrypt_stream(cipher):
+    crypto = CryptoManager(cipher=cipher)
+    data = os.urandom(300 * 1024 + 7)
+    encrypted, decrypted = _Pipe(), _Pipe()
+
+    assert FileOperations.encrypt_stream(_Pipe(data), encrypted, crypto, 64 * 1024, jobs=2) == len(data)
+    # Streams of unknown length are written without a chunk index
+    assert not ContainerReader(io.BytesIO(encrypted.getvalue())).header.indexed
+    assert FileOperations.decrypt_stream(_Pipe(encrypted.getvalue()), decrypted, crypto, jobs=2) == len(data)
+    assert decrypted.getvalue() == data
+
+
+def test_decrypt_stream_accepts_files_and_legacy_tokens(tmp_path):
+    crypto = CryptoManager()
+    data = os.urandom(100 * 1024)
+    plain = tmp_path / "plain.bin"
+    plain.write_bytes(data)
+    FileOperations.encrypt_file(plain, tmp_path / "plain.bin.enc", crypto, progress=False)
+
+    out = _Pipe()
+    with open(tmp_path / "plain.bin.enc", "rb") as infile:
+        FileOperations.decrypt_stream(infile, out, crypto)
+    assert out.getvalue() == data
+
+    legacy = _Pipe(crypto.encrypt_data(data[:64 * 1024]) + crypto.encrypt_data(data[64 * 1024:]))
+    out = _Pipe()
+    FileOperations.decrypt_stream(legacy, out, crypto)
+    assert out.getvalue() == data
@@ -0,0 +1,126 @@
+import os
+import threading
+import pytest
+from encryptor.core import keyring as keyring_module
+from encryptor.core.crypto import CryptoManager
+from encryptor.core.keyring import KeyRing, derive_key, key_id_for
+
+
+class _Clock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture(autouse=True)
+def fast_kdf(monkeypatch):
+    monkeypatch.setattr(keyring_module, "SCRYPT_PARAMS", {"n": 2 ** 4, "r": 8, "p": 1})
+    monkeypatch.setattr(keyring_module, "ARGON2_PARAMS",
+                        {"iterations": 1, "lanes": 1, "memory_cost": 64})
+
+
+def test_add_and_get_returns_same_instance():
+    ring = KeyRing()
+    key = CryptoManager().key
+    crypto = ring.add("tenant-1", key)
+    assert ring.get("tenant-1") is crypto
+    assert ring.get("tenant-1", "fernet") is None
+    assert ring.get_or_add("tenant-1", lambda: pytest.fail("key reloaded")) is crypto
+
+
+def test_lru_eviction():
+    ring = KeyRing(max_entries=2)
+    ring.add("a", CryptoManager().key)
+    ring.add("b", CryptoManager().key)
+    ring.get("a")
+    ring.add("c", CryptoManager().key)
+
+    assert ring.get("b") is None
+    assert ring.get("a") is not None
+    assert len(ring) == 2
+    assert ring._entries.get(("id", "b", "aes-256-gcm")) is None
+    assert ring.evict("a") and not ring.evict("a")
+    ring.clear()
+    assert len(ring) == 0
+
+
+def test_ttl_expiry():
+    clock = _Clock()
+    ring = KeyRing(ttl=10, clock=clock)
+    ring.add("a", CryptoManager().key)
+    clock.now = 9.9
+    assert ring.get("a") is not None
+    clock.now = 10
+    assert ring.get("a") is None
+    assert len(ring) == 0
+
+
+def test_load_reads_key_file_once(tmp_path):
+    key_file = tmp_path / "k.key"
+    CryptoManager().save_key(key_file)
+    ring = KeyRing()
+    crypto = ring.load(key_file)
+    assert ring.load(key_file) is crypto
+
+
+def test_load_rereads_a_replaced_key_file(tmp_path):
+    key_file = tmp_path / "k.key"
+    CryptoManager().save_key(key_file)
+    ring = KeyRing()
+    old = ring.load(key_file)
+
+    replacement = CryptoManager()
+    replacement.save_key(key_file)
+    stat = key_file.stat()
+    # Same size; make sure the mtime differs even on coarse filesystems
+    os.utime(key_file, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+    crypto = ring.load(key_file)
+    assert crypto is not old and crypto.key == replacement.key
+    assert len(ring) == 1
+
+
+@pytest.mark.parametrize("kdf", ["scrypt", "argon2id"])
+def test_derive_caches_by_passphrase(kdf, monkeypatch):
+    salt = b"s" * 16
+    calls = []
+    real = keyring_module.derive_key
+    monkeypatch.setattr(keyring_module, "derive_key", lambda *a: calls.append(a) or real(*a))
+    ring = KeyRing()
+
+    crypto = ring.derive("correct horse", salt, kdf)
+    assert ring.derive("correct horse", salt, kdf) is crypto
+    assert ring.derive("wrong horse", salt, kdf) is not crypto
+    assert len(calls) == 2
+    assert crypto.key == derive_key("correct horse", salt, kdf)
+    assert crypto.decrypt_chunk(crypto.encrypt_chunk(b"data")) == b"data"
+
+
+def test_derive_rejects_bad_arguments():
+    with pytest.raises(ValueError):
+        derive_key("pw", b"short")
+    with pytest.raises(ValueError):
+        derive_key("pw", b"s" * 16, "md5")
+
+
+def test_thread_safety():
+    ring = KeyRing(max_entries=8)
+    keys = [CryptoManager().key for _ in range(16)]
+    errors = []
+
+    def worker(offset):
+        try:
+            for i in range(200):
+                key = keys[(i + offset) % len(keys)]
+                crypto = ring.get_or_add(key_id_for(key), lambda: key)
+                assert crypto.key == key
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=worker, args=(n,)) for n in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert errors == [] and len(ring) <= 8
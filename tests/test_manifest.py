@@ -0,0 +1,131 @@
+import os
+import pytest
+from encryptor.core.crypto import CryptoManager, key_fingerprint
+from encryptor.core.file_ops import FileOperations
+from encryptor.core.manifest import Manifest, hash_file, new_hasher
+
+
+@pytest.fixture
+def crypto():
+    return CryptoManager()
+
+
+def _encrypt(manifest, crypto, src, dst):
+    stat = src.stat()
+    source_hash, output_hash = new_hasher(), new_hasher()
+    FileOperations.encrypt_file(src, dst, crypto, progress=False,
+                                source_hasher=source_hash, output_hasher=output_hash)
+    manifest.record(src, dst, source_hash.hexdigest(), output_hash.hexdigest(), stat)
+
+
+def test_streamed_hashes_match_files(tmp_path, crypto):
+    src, dst = tmp_path / "a.txt", tmp_path / "a.txt.enc"
+    src.write_bytes(os.urandom(300_000))
+    with Manifest.for_output(tmp_path, crypto.key) as manifest:
+        _encrypt(manifest, crypto, src, dst)
+        entry = manifest.get(src)
+
+    assert entry.source_hash == hash_file(src)
+    assert entry.output_hash == hash_file(dst)
+    assert entry.output_size == dst.stat().st_size
+
+
+def test_unchanged_files_are_current(tmp_path, crypto):
+    src, dst = tmp_path / "a.txt", tmp_path / "out" / "a.txt.enc"
+    src.write_text("hello")
+    with Manifest.for_output(tmp_path / "out", crypto.key) as manifest:
+        assert not manifest.is_current(src, dst)
+        _encrypt(manifest, crypto, src, dst)
+
+    with Manifest.for_output(tmp_path / "out", crypto.key) as manifest:
+        assert manifest.is_current(src, dst)
+        # A touched but unmodified file is still current
+        os.utime(src, ns=(0, 0))
+        assert manifest.is_current(src, dst)
+        src.write_text("world")
+        assert not manifest.is_current(src, dst)
+
+
+def test_replaced_output_is_not_current(tmp_path, crypto):
+    src, dst = tmp_path / "a.txt", tmp_path / "a.txt.enc"
+    src.write_text("hello")
+    with Manifest.for_output(tmp_path, crypto.key) as manifest:
+        _encrypt(manifest, crypto, src, dst)
+
+    with Manifest.for_output(tmp_path, crypto.key) as manifest:
+        # Touched but unchanged: the output hash still matches
+        os.utime(dst, ns=(0, 0))
+        assert manifest.is_current(src, dst)
+        # Same size, different content
+        data = bytearray(dst.read_bytes())
+        data[-1] ^= 1
+        dst.write_bytes(bytes(data))
+        assert not manifest.is_current(src, dst)
+
+
+def test_missing_output_or_other_key_is_not_current(tmp_path, crypto):
+    src, dst = tmp_path / "a.txt", tmp_path / "a.txt.enc"
+    src.write_text("hello")
+    with Manifest.for_output(tmp_path, crypto.key) as manifest:
+        _encrypt(manifest, crypto, src, dst)
+
+    other = CryptoManager()
+    assert (key_fingerprint(other.key, b'fenc-manifest')
+            != key_fingerprint(crypto.key, b'fenc-manifest'))
+    with Manifest.for_output(tmp_path, other.key) as manifest:
+        assert not manifest.is_current(src, dst)
+
+    dst.unlink()
+    with Manifest.for_output(tmp_path, crypto.key) as manifest:
+        assert not manifest.is_current(src, dst)
+
+
+def test_other_options_are_not_current(tmp_path, crypto):
+    src, dst = tmp_path / "a.txt", tmp_path / "a.txt.enc"
+    src.write_text("hello")
+    options = {'cipher': 'aes-256-gcm', 'compression': None, 'chunk_size': None}
+    with Manifest.for_output(tmp_path, crypto.key, options) as manifest:
+        _encrypt(manifest, crypto, src, dst)
+
+    for changed in [{'cipher': 'fernet'}, {'compression': 'zlib'}, {'chunk_size': 4096}]:
+        with Manifest.for_output(tmp_path, crypto.key, {**options, **changed}) as manifest:
+            assert not manifest.is_current(src, dst)
+    with Manifest.for_output(tmp_path, crypto.key, dict(reversed(options.items()))) as manifest:
+        assert manifest.is_current(src, dst)
+
+
+def test_prune_removes_outputs_of_deleted_sources(tmp_path, crypto):
+    kept, gone = tmp_path / "kept.txt", tmp_path / "gone.txt"
+    kept.write_text("kept")
+    gone.write_text("gone")
+    with Manifest.for_output(tmp_path / "out", crypto.key) as manifest:
+        for src in (kept, gone):
+            _encrypt(manifest, crypto, src, tmp_path / "out" / (src.name + ".enc"))
+
+    gone.unlink()
+    with Manifest.for_output(tmp_path / "out", crypto.key) as manifest:
+        assert manifest.is_current(kept, tmp_path / "out" / "kept.txt.enc")
+        pruned = manifest.prune()
+        assert manifest.get(gone) is None
+
+    assert [os.path.basename(path) for path in pruned] == ["gone.txt.enc"]
+    assert not (tmp_path / "out" / "gone.txt.enc").exists()
+    assert (tmp_path / "out" / "kept.txt.enc").exists()
+
+
+def test_manifest_without_output_mtime_is_upgraded(tmp_path, crypto):
+    import sqlite3
+    src, dst = tmp_path / "a.txt", tmp_path / "a.txt.enc"
+    src.write_text("hello")
+    with Manifest.for_output(tmp_path, crypto.key) as manifest:
+        _encrypt(manifest, crypto, src, dst)
+    db = sqlite3.connect(str(manifest.path))
+    db.execute("ALTER TABLE files DROP COLUMN output_mtime_ns")
+    db.commit()
+    db.close()
+
+    with Manifest.for_output(tmp_path, crypto.key) as manifest:
+        assert manifest.get(src).output_mtime_ns is None
+        # Checked by hash once, then by mtime
+        assert manifest.is_current(src, dst)
+        assert manifest.get(src).output_mtime_ns == dst.stat().st_mtime_ns
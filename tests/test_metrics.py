@@ -0,0 +1,104 @@
+import io
+import json
+from pathlib import Path
+from encryptor.core.batch import BatchScheduler
+from encryptor.core.crypto import CryptoManager
+from encryptor.core.file_ops import FileOperations
+from encryptor.core.metrics import (NULL_METRICS, JsonLinesSink, Metrics, PrometheusSink)
+
+
+def test_counters_gauges_and_histograms():
+    metrics = Metrics()
+    metrics.inc("fenc_files_total", status="ok")
+    metrics.inc("fenc_files_total", 2, status="ok")
+    metrics.set("fenc_queue_depth", 3)
+    metrics.observe("fenc_file_seconds", 0.002)
+    metrics.observe("fenc_file_seconds", 7.0)
+
+    snapshot = metrics.snapshot()
+    assert snapshot["counters"] == {"fenc_files_total{status=ok}": 3}
+    assert snapshot["gauges"] == {"fenc_queue_depth": 3}
+    histogram = snapshot["histograms"]["fenc_file_seconds"]
+    assert histogram["count"] == 2
+    assert histogram["buckets"]["0.005"] == 1
+    assert histogram["buckets"]["+Inf"] == 2
+
+
+def test_prometheus_text_format():
+    metrics = Metrics()
+    metrics.inc("fenc_bytes_total", 10, direction="in")
+    metrics.observe("fenc_stage_seconds", 0.5, stage="read")
+    text = metrics.prometheus()
+    assert "# TYPE fenc_bytes_total counter\nfenc_bytes_total{direction=\"in\"} 10\n" in text
+    assert "# TYPE fenc_stage_seconds histogram" in text
+    assert 'fenc_stage_seconds_bucket{stage="read",le="+Inf"} 1' in text
+    assert 'fenc_stage_seconds_count{stage="read"} 1' in text
+
+
+def test_null_metrics_add_no_wrappers():
+    def func():
+        pass
+    items = iter([1, 2])
+    assert NULL_METRICS.timed(func, "x") is func
+    assert NULL_METRICS.timed_iter(items, "x") is items
+    assert not NULL_METRICS.enabled
+
+
+def test_scheduler_emits_file_events(tmp_path):
+    stream = io.StringIO()
+    metrics = Metrics([JsonLinesSink(stream)])
+    (tmp_path / "in").mkdir()
+    tasks = []
+    for i in range(3):
+        (tmp_path / "in" / f"f{i}").write_text("x" * i)
+        tasks.append((tmp_path / "in" / f"f{i}", tmp_path / "out" / f"f{i}"))
+
+    def copy(input_path, output_path, jobs):
+        if input_path.name == "f2":
+            raise ValueError("boom")
+        Path(output_path).parent.mkdir(exist_ok=True)
+        Path(output_path).write_bytes(input_path.read_bytes())
+
+    BatchScheduler(copy, workers=2, metrics=metrics).run(tasks)
+    events = [json.loads(line) for line in stream.getvalue().splitlines()]
+    assert sorted(event["status"] for event in events) == ["error", "ok", "ok"]
+    assert {event["event"] for event in events} == {"file"}
+    counters = metrics.snapshot()["counters"]
+    assert counters["fenc_files_total{status=ok}"] == 2
+    assert counters["fenc_files_total{status=error}"] == 1
+    assert counters["fenc_bytes_total{direction=in}"] == 1
+
+
+def test_file_ops_report_stages(tmp_path):
+    metrics = Metrics()
+    crypto = CryptoManager()
+    (tmp_path / "plain").write_bytes(b"x" * 50_000)
+    FileOperations.encrypt_file(tmp_path / "plain", tmp_path / "plain.enc", crypto, 4096,
+                                progress=False, metrics=metrics)
+    FileOperations.decrypt_file(tmp_path / "plain.enc", tmp_path / "out", crypto,
+                                progress=False, metrics=metrics)
+
+    snapshot = metrics.snapshot()
+    assert snapshot["counters"]["fenc_chunks_total{operation=encrypt}"] == 13
+    assert snapshot["counters"]["fenc_chunks_total{operation=decrypt}"] == 13
+    for operation in ("encrypt", "decrypt"):
+        for stage in ("read", "cipher", "write"):
+            assert snapshot["histograms"][
+                f"fenc_stage_seconds{{operation={operation},stage={stage}}}"]["count"] >= 13
+
+
+def test_prometheus_sink_rewrites_at_most_every_interval(tmp_path):
+    now = [0.0]
+    path = tmp_path / "fenc.prom"
+    metrics = Metrics()
+    sink = PrometheusSink(path, interval=5.0, clock=lambda: now[0])
+    metrics.sinks.append(sink)
+
+    metrics.inc("fenc_files_total")
+    metrics.emit("file")
+    assert "fenc_files_total 1" in path.read_text()
+    metrics.inc("fenc_files_total")
+    metrics.emit("file")
+    assert "fenc_files_total 1" in path.read_text()
+    metrics.close()
+    assert "fenc_files_total 2" in path.read_text()
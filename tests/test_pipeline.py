@@ -0,0 +1,49 @@
+import pytest
+from encryptor.core import pipeline
+from encryptor.core.pipeline import is_process_pool, ordered_map, resolve_jobs, worker_pool
+
+
+def _square(value):
+    return value * value
+
+
+@pytest.mark.parametrize("jobs", [1, 4])
+def test_ordered_map_preserves_order(jobs):
+    assert list(ordered_map(_square, range(50), jobs=jobs)) == [v * v for v in range(50)]
+
+
+def test_ordered_map_process_executor():
+    assert list(ordered_map(_square, range(5), jobs=2, executor='process')) == [0, 1, 4, 9, 16]
+
+
+def test_shared_pool_outlives_each_call(monkeypatch):
+    created = []
+    real = pipeline._create_executor
+    monkeypatch.setattr(pipeline, "_create_executor",
+                        lambda *args: created.append(args) or real(*args))
+    with worker_pool("process", 2) as pool:
+        assert is_process_pool(pool)
+        for _ in range(3):
+            assert list(ordered_map(_square, range(5), jobs=2, executor=pool)) == [0, 1, 4, 9, 16]
+        # Still usable: ordered_map did not shut it down
+        assert pool.submit(_square, 3).result() == 9
+    assert created == [("process", 2)]
+    with worker_pool("thread", 1) as pool:
+        assert pool == "thread"
+
+
+def test_ordered_map_propagates_errors():
+    def fail(value):
+        if value == 3:
+            raise ValueError("bad chunk")
+        return value
+
+    with pytest.raises(ValueError):
+        list(ordered_map(fail, range(10), jobs=3))
+
+
+def test_resolve_jobs():
+    assert resolve_jobs(0) >= 1
+    assert resolve_jobs(3) == 3
+    with pytest.raises(ValueError):
+        resolve_jobs(-1)
@@ -0,0 +1,114 @@
+import io
+import os
+import struct
+import tarfile
+import zipfile
+import pytest
+from encryptor.core.container import ContainerError
+from encryptor.core.crypto import CryptoManager
+from encryptor.core.file_ops import FileOperations
+
+
+def _encrypted(tmp_path, data, crypto, chunk_size=4096):
+    plain = tmp_path / "plain.bin"
+    plain.write_bytes(data)
+    FileOperations.encrypt_file(plain, tmp_path / "plain.bin.enc", crypto, chunk_size,
+                                progress=False)
+    return tmp_path / "plain.bin.enc"
+
+
+@pytest.mark.parametrize("cipher", ["fernet", "aes-256-gcm", "chacha20-poly1305"])
+def test_random_reads_match_plaintext(tmp_path, cipher):
+    crypto = CryptoManager(cipher=cipher)
+    data = os.urandom(50_000)
+    with FileOperations.open_encrypted(_encrypted(tmp_path, data, crypto), crypto) as reader:
+        assert reader.size == len(data)
+        for start, length in [(0, 10), (4090, 20), (12_345, 9000), (49_990, 100), (60_000, 5)]:
+            reader.seek(start)
+            assert reader.read(length) == data[start:start + length]
+        assert reader.seek(-7, io.SEEK_END) == len(data) - 7
+        assert reader.read() == data[-7:]
+        reader.seek(0)
+        assert reader.read() == data
+
+
+def test_only_needed_chunks_are_decrypted(tmp_path):
+    crypto = CryptoManager()
+    data = os.urandom(100 * 4096)
+    reader = FileOperations.open_encrypted(_encrypted(tmp_path, data, crypto), crypto, cache_chunks=2)
+    decrypted = []
+    decrypt = reader._decrypt
+    reader._decrypt = lambda number: decrypted.append(number) or decrypt(number)
+
+    reader.seek(50 * 4096 - 10)
+    assert reader.read(20) == data[50 * 4096 - 10:50 * 4096 + 10]
+    reader.seek(50 * 4096)
+    reader.read(100)
+    assert decrypted == [49, 50]
+    reader.close()
+    assert reader.closed
+
+
+def test_works_with_tarfile_and_zipfile(tmp_path):
+    crypto = CryptoManager()
+    members = {"a.txt": b"alpha" * 1000, "b/c.bin": os.urandom(20_000)}
+
+    tar_buffer = io.BytesIO()
+    with tarfile.open(fileobj=tar_buffer, mode="w") as archive:
+        for name, content in members.items():
+            info = tarfile.TarInfo(name)
+            info.size = len(content)
+            archive.addfile(info, io.BytesIO(content))
+    zip_buffer = io.BytesIO()
+    with zipfile.ZipFile(zip_buffer, "w") as archive:
+        for name, content in members.items():
+            archive.writestr(name, content)
+
+    for kind, buffer in (("tar", tar_buffer), ("zip", zip_buffer)):
+        (tmp_path / kind).mkdir()
+        path = _encrypted(tmp_path / kind, buffer.getvalue(), crypto)
+        with FileOperations.open_encrypted(path, crypto) as reader:
+            if kind == "tar":
+                with tarfile.open(fileobj=reader) as archive:
+                    assert archive.extractfile("b/c.bin").read() == members["b/c.bin"]
+            else:
+                with zipfile.ZipFile(reader) as archive:
+                    assert archive.read("a.txt") == members["a.txt"]
+
+
+def test_legacy_file(tmp_path):
+    crypto = CryptoManager()
+    data = os.urandom(2 * 64 * 1024 + 100)
+    legacy = tmp_path / "legacy.enc"
+    legacy.write_bytes(b"".join(
+        crypto.encrypt_data(data[i:i + 64 * 1024]) for i in range(0, len(data), 64 * 1024)
+    ))
+    with FileOperations.open_encrypted(legacy, crypto) as reader:
+        assert reader.size == len(data)
+        reader.seek(64 * 1024 - 5)
+        assert reader.read(64 * 1024 + 10) == data[64 * 1024 - 5:2 * 64 * 1024 + 5]
+
+
+def test_streamed_container_is_rejected(tmp_path):
+    crypto = CryptoManager()
+    encrypted = io.BytesIO()
+    FileOperations.encrypt_stream(io.BytesIO(b"data"), encrypted, crypto)
+    (tmp_path / "s.enc").write_bytes(encrypted.getvalue())
+    with pytest.raises(ContainerError):
+        FileOperations.open_encrypted(tmp_path / "s.enc", crypto)
+
+
+@pytest.mark.parametrize("change", [100, -1])
+def test_tampered_index_length_is_rejected(tmp_path, change):
+    crypto = CryptoManager()
+    path = _encrypted(tmp_path, os.urandom(10_000), crypto)
+    data = bytearray(path.read_bytes())
+    index_offset, _, _ = struct.unpack(">QI4s", data[-16:])
+    # Plaintext lengths in the index are not covered by any tag
+    offset, plain_len = struct.unpack(">QI", data[index_offset:index_offset + 12])
+    data[index_offset:index_offset + 12] = struct.pack(">QI", offset, plain_len + change)
+    path.write_bytes(bytes(data))
+
+    with FileOperations.open_encrypted(path, crypto) as reader:
+        with pytest.raises(ContainerError, match="index"):
+            reader.read()
@@ -0,0 +1,90 @@
+import os
+import pytest
+from encryptor.core import records
+from encryptor.core.ciphers import SUITES, RecordError
+from encryptor.core.crypto import CryptoManager
+from encryptor.core.records import PackedRecords
+
+
+@pytest.mark.parametrize("cipher", sorted(SUITES))
+def test_batch_round_trip(cipher):
+    crypto = CryptoManager(cipher=cipher)
+    batch = [os.urandom(size) for size in (0, 1, 100, 4096)]
+    tokens = crypto.encrypt_batch(batch)
+
+    assert [token[0] for token in tokens] == [SUITES[cipher].id] * len(batch)
+    assert crypto.decrypt_batch(tokens) == batch
+    # Every token decrypts on its own too
+    assert crypto.decrypt_batch(tokens[2:3]) == batch[2:3]
+
+
+def test_aead_tokens_are_compact():
+    crypto = CryptoManager()
+    token, = crypto.encrypt_batch([b"x" * 100])
+    assert len(token) == 100 + 45
+
+
+def test_each_run_of_records_gets_its_own_key(monkeypatch):
+    monkeypatch.setattr(records, "RECORDS_PER_KEY", 3)
+    crypto = CryptoManager()
+    batch = [b"%d" % i for i in range(8)]
+    tokens = crypto.encrypt_batch(batch)
+    salts = [token[1:records.HEADER_SIZE] for token in tokens]
+
+    assert salts[0] == salts[2] != salts[3] == salts[5] != salts[6]
+    assert len(set(salts)) == 3
+    assert crypto.decrypt_batch(tokens) == batch
+    assert crypto.decrypt_batch(tokens[::-1]) == batch[::-1]
+
+
+def test_packed_round_trip():
+    crypto = CryptoManager()
+    batch = [b"record %d" % i for i in range(50)]
+    packed = crypto.encrypt_batch(PackedRecords.pack(batch), packed=True)
+
+    assert isinstance(packed, PackedRecords)
+    assert len(packed) == 50
+    assert len(packed.offsets) == 51 and packed.offsets[-1] == len(packed.data)
+    plain = crypto.decrypt_batch(packed, packed=True)
+    assert plain.unpack() == batch
+    assert plain[-1] == b"record 49"
+
+
+def test_packed_records_rejects_bad_offsets():
+    with pytest.raises(ValueError):
+        PackedRecords(b"abc", [0, 2])
+
+
+def test_parallel_batches_keep_order(monkeypatch):
+    monkeypatch.setattr(records, "RECORDS_PER_TASK", 7)
+    crypto = CryptoManager()
+    batch = [b"%d" % i for i in range(100)]
+    tokens = crypto.encrypt_batch(batch, jobs=4)
+    assert crypto.decrypt_batch(tokens, jobs=4) == batch
+
+
+def test_mixed_suites_decrypt():
+    key = CryptoManager().key
+    gcm, fernet = CryptoManager(key), CryptoManager(key, cipher="fernet")
+    tokens = gcm.encrypt_batch([b"a", b"b"]) + fernet.encrypt_batch([b"c"]) + gcm.encrypt_batch([b"d"])
+    assert gcm.decrypt_batch(tokens) == [b"a", b"b", b"c", b"d"]
+
+
+def test_bad_record_reports_its_index(monkeypatch):
+    monkeypatch.setattr(records, "RECORDS_PER_TASK", 4)
+    crypto = CryptoManager()
+    tokens = crypto.encrypt_batch([b"%d" % i for i in range(10)])
+    tokens[6] = tokens[6][:-1] + bytes([tokens[6][-1] ^ 1])
+
+    with pytest.raises(RecordError) as excinfo:
+        crypto.decrypt_batch(tokens, jobs=2)
+    assert excinfo.value.index == 6
+
+
+def test_records_do_not_decrypt_as_file_chunks():
+    crypto = CryptoManager()
+    token, = crypto.encrypt_batch([b"secret"])
+    with pytest.raises(ValueError):
+        crypto.decrypt_chunk(token[records.HEADER_SIZE:])
+    with pytest.raises(RecordError):
+        CryptoManager().decrypt_batch([token])
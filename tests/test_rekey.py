@@ -0,0 +1,117 @@
+import os
+import pytest
+from encryptor.core.ciphers import FernetSuite, WrongKeyError
+from encryptor.core.container import ContainerReader, ContainerWriter, encode_meta
+from encryptor.core.crypto import CryptoManager
+from encryptor.core.file_ops import FileOperations
+from encryptor.core.rekey import (CURRENT, REENCRYPTED, REWRAPPED, rekey_file, rekey_files,
+                                  rewrap_header)
+
+DATA = os.urandom(150_000) + b"text " * 20_000
+
+
+def _encrypt(path, crypto, **options):
+    path.with_suffix("").write_bytes(DATA)
+    FileOperations.encrypt_file(path.with_suffix(""), path, crypto, 16384, progress=False,
+                                **options)
+    return path
+
+
+def _decrypted(path, crypto, tmp_path):
+    FileOperations.decrypt_file(path, tmp_path / "out", crypto, progress=False)
+    return (tmp_path / "out").read_bytes()
+
+
+def test_rewrap_touches_only_the_header(tmp_path):
+    old, new = CryptoManager(), CryptoManager()
+    path = _encrypt(tmp_path / "a.enc", old, compression="zlib")
+    before = path.read_bytes()
+    with open(path, "rb") as f:
+        header_size = ContainerReader(f).header.size
+
+    assert rekey_file(path, old, new) == REWRAPPED
+    after = path.read_bytes()
+    assert len(after) == len(before) and after[header_size:] == before[header_size:]
+    assert _decrypted(path, new, tmp_path) == DATA
+    with pytest.raises(ValueError):
+        _decrypted(path, old, tmp_path)
+
+    # Running again (e.g. after an interrupted run) is a no-op
+    assert rewrap_header(path, old, new) == CURRENT
+    with pytest.raises(WrongKeyError):
+        rewrap_header(path, CryptoManager(), CryptoManager())
+
+
+@pytest.mark.parametrize("cipher", ["fernet", "chacha20-poly1305"])
+def test_files_without_data_keys_are_reencrypted(tmp_path, cipher):
+    old = CryptoManager(cipher="fernet", envelope=False)
+    new = CryptoManager(cipher=cipher)
+    path = _encrypt(tmp_path / "a.enc", old, compression="zlib")
+    (tmp_path / "a.enc").chmod(0o600)
+
+    assert rekey_file(path, old, new, jobs=2) == REENCRYPTED
+    assert _decrypted(path, new, tmp_path) == DATA
+    assert path.stat().st_mode & 0o777 == 0o600
+    assert not (tmp_path / "a.enc.part").exists()
+    with open(path, "rb") as f:
+        header = ContainerReader(f).header
+    assert header.cipher == new.cipher.id and "data_key" in header.metadata
+    # Now it has a data key, the next rotation only rewrites the header
+    assert rekey_file(path, new, old) == REWRAPPED
+
+
+def test_legacy_fernet_containers_are_reencrypted(tmp_path):
+    old, new = CryptoManager(cipher="fernet"), CryptoManager(cipher="fernet")
+    data_key = old.new_data_key(FernetSuite.id)
+    suite = old.get_suite(FernetSuite.id, data_key)
+    path = tmp_path / "old.enc"
+    with open(path, "wb") as outfile:
+        writer = ContainerWriter(outfile, suite.id, len(DATA), 0,
+                                 encode_meta({"data_key": data_key}))
+        writer.write_chunk(suite.encrypt_chunk(DATA), len(DATA))
+        writer.close()
+
+    # The read-only suite is replaced instead of having its data key rewrapped
+    assert rekey_file(path, old, new) == REENCRYPTED
+    with open(path, "rb") as f:
+        assert ContainerReader(f).header.cipher == new.cipher.id
+    assert _decrypted(path, new, tmp_path) == DATA
+
+
+def test_full_rekey_replaces_data_keys(tmp_path):
+    old, new = CryptoManager(), CryptoManager()
+    path = _encrypt(tmp_path / "a.enc", old)
+    with open(path, "rb") as f:
+        wrapped = ContainerReader(f).header.metadata["data_key"]
+    data_key = old.unwrap_key(wrapped, old.cipher.id)
+
+    assert rekey_file(path, old, new, full=True) == REENCRYPTED
+    with open(path, "rb") as f:
+        wrapped = ContainerReader(f).header.metadata["data_key"]
+    assert new.unwrap_key(wrapped, new.cipher.id) != data_key
+    assert _decrypted(path, new, tmp_path) == DATA
+    assert rekey_file(path, old, new, full=True) == CURRENT
+
+
+def test_legacy_files_become_containers(tmp_path):
+    old, new = CryptoManager(), CryptoManager()
+    path = tmp_path / "legacy.enc"
+    with open(path, "wb") as f:
+        for start in range(0, len(DATA), 65536):
+            f.write(old.encrypt_data(DATA[start:start + 65536]))
+    assert rekey_file(path, old, new) == REENCRYPTED
+    assert _decrypted(path, new, tmp_path) == DATA
+
+
+def test_rekey_files_counts_actions(tmp_path):
+    old, new = CryptoManager(), CryptoManager()
+    _encrypt(tmp_path / "a.enc", old)
+    _encrypt(tmp_path / "b.enc", CryptoManager(old.key, envelope=False))
+    _encrypt(tmp_path / "c.enc", new)
+    _encrypt(tmp_path / "d.enc", CryptoManager())
+
+    files = sorted(tmp_path.glob("*.enc"))
+    counts, summary = rekey_files(files, old, new, workers=2)
+    assert counts == {REWRAPPED: 1, REENCRYPTED: 1, CURRENT: 1}
+    assert summary.files == 2 and summary.skipped == 1
+    assert [str(path) for path, _ in summary.errors] == [str(tmp_path / "d.enc")]
@@ -0,0 +1,62 @@
+import os
+import pytest
+from encryptor.core.scanner import ScanFilter, scan_files
+
+
+@pytest.fixture
+def tree(tmp_path):
+    for i in range(20):
+        directory = tmp_path / f"d{i % 4}" / f"e{i % 3}"
+        directory.mkdir(parents=True, exist_ok=True)
+        (directory / f"f{i}.txt").write_text("x" * i)
+        (directory / f"f{i}.log").write_text("log")
+    (tmp_path / "top.txt").write_text("top")
+    (tmp_path / "build").mkdir()
+    (tmp_path / "build" / "out.txt").write_text("built")
+    return tmp_path
+
+
+@pytest.mark.parametrize("workers", [1, 4])
+def test_parallel_scan_matches_walk(tree, workers):
+    expected = sorted(
+        os.path.join(root, name) for root, _, files in os.walk(tree) for name in files
+    )
+    found = sorted(str(path) for path in scan_files(tree, recursive=True, workers=workers))
+    assert found == expected
+
+
+def test_non_recursive_scan(tree):
+    assert [path.name for path in scan_files(tree)] == ["top.txt"]
+
+
+@pytest.mark.parametrize("workers", [1, 4])
+def test_filters(tree, workers):
+    def scan(**options):
+        return {path.name for path in scan_files(tree, True, ScanFilter(**options), workers)}
+
+    assert scan(extensions=[".TXT"]) == {f"f{i}.txt" for i in range(20)} | {"top.txt", "out.txt"}
+    assert scan(include=["f1*.log"]) == {"f1.log"} | {f"f{i}.log" for i in range(10, 20)}
+    # Excluded directories are pruned, by name or relative path
+    assert "out.txt" not in scan(exclude=["build"])
+    assert not any(name.startswith("f") for name in scan(exclude=["d*/e*"]))
+    assert scan(extensions=[".txt"], min_size=17) == {"f17.txt", "f18.txt", "f19.txt"}
+    assert scan(extensions=[".txt"], max_size=1) == {"f0.txt", "f1.txt"}
+
+
+def test_consumer_can_stop_early(tree):
+    scan = scan_files(tree, recursive=True, workers=4)
+    assert next(scan)
+    scan.close()
+
+
+def test_symlinked_directories_are_not_followed(tree):
+    (tree / "d0" / "loop").symlink_to(tree, target_is_directory=True)
+    found = list(scan_files(tree, recursive=True, workers=4))
+    assert len(found) == 42
+
+
+def test_invalid_arguments(tmp_path):
+    with pytest.raises(ValueError):
+        scan_files(tmp_path / "missing")
+    with pytest.raises(ValueError):
+        scan_files(tmp_path, workers=0)
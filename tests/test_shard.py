@@ -0,0 +1,92 @@
+import json
+import pytest
+from encryptor.core.batch import BatchScheduler
+from encryptor.core.file_ops import FileOperations
+from encryptor.core.shard import (Sharder, build_plan, hash_shard, load_plan, merge_summaries,
+                                  shard_key, write_plan, write_summary)
+from encryptor.core.verify import find_encrypted
+
+
+def _tree(tmp_path, sizes):
+    root = tmp_path / "data"
+    for i, size in enumerate(sizes):
+        path = root / f"d{i % 3}" / f"f{i}.bin"
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_bytes(b"x" * size)
+    return root
+
+
+def test_shard_key_is_relative_to_the_given_directory(tmp_path):
+    root = tmp_path / "data"
+    assert shard_key(root / "a" / "b.txt", root) == "data/a/b.txt"
+    assert shard_key(root / "b.txt") == "b.txt"
+    assert hash_shard("data/a/b.txt", 8) == hash_shard("data/a/b.txt", 8)
+
+
+def test_shards_partition_the_files(tmp_path):
+    root = _tree(tmp_path, [10] * 60)
+    seen = []
+    for index in range(1, 5):
+        tasks = FileOperations.plan_tasks([root], tmp_path / "out", 'encrypt', recursive=True,
+                                          shard=Sharder(index, 4))
+        seen.append({path for path, _ in tasks})
+
+    everything = set(FileOperations.find_files(root, recursive=True))
+    assert set().union(*seen) == everything
+    assert sum(map(len, seen)) == len(everything)
+    assert all(shard for shard in seen)
+
+
+def test_plan_balances_bytes(tmp_path):
+    root = _tree(tmp_path, [1000, 900, 500, 400, 300, 200, 100, 100])
+    entries, totals = build_plan([root], 3, recursive=True)
+
+    assert len(entries) == 8
+    assert sum(totals) == 3500
+    assert max(totals) - min(totals) <= 200
+
+    plan_file = tmp_path / "plan.jsonl"
+    write_plan(plan_file, entries, totals)
+    plan = load_plan(plan_file, 3)
+    sharder = Sharder(2, 3, plan)
+    owned = list(find_encrypted([root], recursive=True, shard=sharder))
+    assert sum(path.stat().st_size for path in owned) == totals[1]
+
+    with pytest.raises(ValueError):
+        load_plan(plan_file, 4)
+
+
+def test_files_missing_from_plan_fall_back_to_hash(tmp_path):
+    sharder = Sharder(1, 2, {"data/known": 2})
+    assert sharder.shard_of("data/known") == 2
+    assert sharder.shard_of("data/new") == hash_shard("data/new", 2)
+
+
+def test_parse_rejects_bad_shards():
+    assert str(Sharder.parse("3/8")) == "3/8"
+    for text in ("0/4", "5/4", "1-4", "x"):
+        with pytest.raises(ValueError):
+            Sharder.parse(text)
+
+
+def test_merge_summaries(tmp_path):
+    root = _tree(tmp_path, [10] * 20)
+    paths = []
+    for index in (1, 2):
+        sharder = Sharder(index, 3)
+        tasks = FileOperations.plan_tasks([root], tmp_path / "out", 'encrypt',
+                                          recursive=True, shard=sharder)
+        summary = BatchScheduler(lambda src, dst, jobs: None, workers=1).run(tasks)
+        paths.append(tmp_path / f"s{index}.json")
+        write_summary(paths[-1], 'encrypt', sharder, summary.as_dict())
+
+    merged = merge_summaries(paths)
+    assert merged['operation'] == 'encrypt'
+    assert merged['completed'] == [1, 2]
+    assert merged['missing'] == [3]
+    assert merged['summary']['files'] == sum(
+        json.loads(path.read_text())['summary']['files'] for path in paths
+    )
+
+    with pytest.raises(ValueError):
+        merge_summaries(paths + paths[:1])
@@ -0,0 +1,130 @@
+import io
+import os
+import pytest
+from encryptor.core.benchmark import cached_bytes
+from encryptor.core.streams import (BufferReader, CacheLimiter, limit_cache, open_chunks,
+                                    preallocate, resolve_io_mode)
+
+
+@pytest.fixture
+def data_file(tmp_path):
+    path = tmp_path / "data.bin"
+    path.write_bytes(os.urandom(10000))
+    return path
+
+
+@pytest.mark.parametrize("io_mode", ["buffered", "readinto", "mmap", "direct", "auto"])
+def test_chunks_match_file(data_file, io_mode):
+    with open(data_file, "rb") as stream, open_chunks(stream, 4096, io_mode) as chunks:
+        assert b"".join(bytes(chunk) for chunk in chunks) == data_file.read_bytes()
+
+
+def test_auto_does_not_map_files(data_file):
+    with open(data_file, "rb") as stream:
+        assert resolve_io_mode(stream, "auto") == "readinto"
+
+
+def test_input_shrinking_during_auto_reads(data_file):
+    # A mapped input that shrinks raises SIGBUS; plain reads just end early
+    data = data_file.read_bytes()
+    with open(data_file, "rb") as stream, open_chunks(stream, 1024, "auto") as chunks:
+        first = bytes(next(chunks))
+        os.truncate(data_file, 2048)
+        read = first + b"".join(bytes(chunk) for chunk in chunks)
+    # Whatever the file object had buffered is still returned
+    assert 2048 <= len(read) < len(data) and data.startswith(read)
+
+
+def test_readinto_reuses_buffers(data_file):
+    with open(data_file, "rb") as stream, open_chunks(stream, 1024, "readinto", buffers=2) as chunks:
+        first, second, third = [chunk.obj for chunk, _ in zip(chunks, range(3))]
+    assert first is third and first is not second
+
+
+def test_non_regular_input_falls_back():
+    stream = io.BytesIO(b"abc")
+    assert resolve_io_mode(stream, "mmap") == "buffered"
+    with open_chunks(stream, 2, "mmap") as chunks:
+        assert list(chunks) == [b"ab", b"c"]
+
+
+def test_pipe_falls_back():
+    read_fd, write_fd = os.pipe()
+    with os.fdopen(read_fd, "rb") as reader:
+        assert resolve_io_mode(reader, "auto") == "buffered"
+    os.close(write_fd)
+
+
+def test_empty_file_mmap(tmp_path):
+    (tmp_path / "empty").write_bytes(b"")
+    with open(tmp_path / "empty", "rb") as stream, open_chunks(stream, 16, "mmap") as chunks:
+        assert list(chunks) == []
+
+
+def test_unknown_io_mode(data_file):
+    with open(data_file, "rb") as stream, pytest.raises(ValueError):
+        resolve_io_mode(stream, "telepathy")
+
+
+def test_buffer_reader():
+    reader = BufferReader(b"0123456789")
+    assert bytes(reader.read(3)) == b"012"
+    reader.seek(-2, 2)
+    assert bytes(reader.read()) == b"89"
+    assert reader.tell() == 10
+
+
+def test_preallocate(tmp_path):
+    with open(tmp_path / "out", "wb") as stream:
+        if preallocate(stream, 1 << 20):
+            assert os.fstat(stream.fileno()).st_size == 1 << 20
+        assert not preallocate(io.BytesIO(), 10)
+
+
+@pytest.mark.parametrize("start", [0, 5, 4096])
+@pytest.mark.parametrize("chunk_size", [1000, 4096, 6000])
+def test_direct_chunks_at_any_offset(data_file, start, chunk_size):
+    with open(data_file, "rb") as stream:
+        stream.seek(start)
+        with open_chunks(stream, chunk_size, "direct", buffers=2) as chunks:
+            sizes, data = zip(*((len(chunk), bytes(chunk)) for chunk in chunks))
+    assert b"".join(data) == data_file.read_bytes()[start:]
+    assert set(sizes[:-1]) <= {chunk_size}
+
+
+def test_direct_falls_back_for_non_files():
+    assert resolve_io_mode(io.BytesIO(b"abc"), "direct") == "buffered"
+
+
+def test_cache_limiter_drops_written_pages(tmp_path):
+    path = tmp_path / "out"
+    with open(path, "wb") as stream:
+        limiter = CacheLimiter(stream, writing=True, window=256 * 1024)
+        for number in range(16):
+            stream.write(os.urandom(64 * 1024))
+            stream.flush()
+            limiter.update()
+            if number == 11 and limiter.enabled:
+                # Everything up to the previous window is written back and dropped
+                assert (cached_bytes(path) or 0) <= 256 * 1024 or _cannot_drop(path)
+        limiter.close()
+    assert path.stat().st_size == 1024 * 1024
+    if cached_bytes(path) is not None and not _cannot_drop(path):
+        assert cached_bytes(path) == 0
+
+
+def _cannot_drop(path):
+    # tmpfs keeps its pages whatever it is advised
+    probe = path.with_name("probe")
+    probe.write_bytes(b"x" * 8192)
+    with open(probe, "rb") as f:
+        os.fsync(f.fileno())
+        os.posix_fadvise(f.fileno(), 0, 0, os.POSIX_FADV_DONTNEED)
+    return cached_bytes(probe) != 0
+
+
+def test_limit_cache_disabled():
+    with limit_cache(io.BytesIO(), io.BytesIO(), enabled=False) as pace:
+        assert pace is None
+    with limit_cache(io.BytesIO(), io.BytesIO()) as pace:
+        pace()
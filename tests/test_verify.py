@@ -0,0 +1,116 @@
+import json
+import os
+import struct
+import pytest
+from encryptor.core.crypto import CryptoManager
+from encryptor.core.file_ops import FileOperations
+from encryptor.core.verify import (CORRUPT, INVALID, OK, TRUNCATED, UNREADABLE, WRONG_KEY,
+                                   build_report, find_encrypted, verify_file, verify_files)
+
+
+@pytest.fixture
+def encrypted(tmp_path):
+    crypto = CryptoManager()
+    source = tmp_path / "data.bin"
+    source.write_bytes(os.urandom(200_000))
+    FileOperations.encrypt_file(source, tmp_path / "data.bin.enc", crypto, 16384,
+                                progress=False)
+    return crypto, tmp_path / "data.bin.enc"
+
+
+def _flip(path, offset):
+    data = bytearray(path.read_bytes())
+    data[offset] ^= 1
+    path.write_bytes(bytes(data))
+
+
+@pytest.mark.parametrize("cipher", ["aes-256-gcm", "chacha20-poly1305", "fernet"])
+@pytest.mark.parametrize("compression", [None, "zlib"])
+def test_intact_files_verify(tmp_path, cipher, compression):
+    crypto = CryptoManager(cipher=cipher)
+    (tmp_path / "a").write_bytes(b"text " * 20000)
+    FileOperations.encrypt_file(tmp_path / "a", tmp_path / "a.enc", crypto, 16384,
+                                progress=False, compression=compression)
+    result = crypto.verify_file(tmp_path / "a.enc", jobs=2)
+    assert result.ok and result.chunks == 7
+    assert not (tmp_path / "a.enc.part").exists()
+
+
+def test_legacy_files_verify(tmp_path):
+    crypto = CryptoManager()
+    with open(tmp_path / "legacy.enc", "wb") as f:
+        f.write(crypto.encrypt_data(os.urandom(65536)))
+        f.write(crypto.encrypt_data(b"tail"))
+    assert verify_file(tmp_path / "legacy.enc", crypto).status == OK
+    assert verify_file(tmp_path / "legacy.enc", CryptoManager()).status == WRONG_KEY
+    _flip(tmp_path / "legacy.enc", 1000)
+    result = verify_file(tmp_path / "legacy.enc", crypto)
+    assert result.status == CORRUPT and result.bad_chunks == (0,)
+
+
+def test_corrupt_chunk_is_located(encrypted):
+    crypto, path = encrypted
+    _flip(path, 16384 * 5)
+    result = verify_file(path, crypto, jobs=3)
+    assert result.status == CORRUPT
+    assert result.chunks == 13 and result.failed_chunks == 1
+    assert result.bad_chunks == (4,)
+
+
+def test_wrong_key(encrypted, tmp_path):
+    _, path = encrypted
+    assert verify_file(path, CryptoManager()).status == WRONG_KEY
+    # Without a data key in the header, every chunk fails instead
+    crypto = CryptoManager(envelope=False)
+    (tmp_path / "b").write_bytes(b"x" * 40000)
+    FileOperations.encrypt_file(tmp_path / "b", tmp_path / "b.enc", crypto, 16384,
+                                progress=False)
+    result = verify_file(tmp_path / "b.enc", CryptoManager())
+    assert result.status == WRONG_KEY and result.failed_chunks == result.chunks == 3
+
+
+@pytest.mark.parametrize("size", [0, 10, 100_000])
+def test_truncated(encrypted, size):
+    crypto, path = encrypted
+    path.write_bytes(path.read_bytes()[:size])
+    assert verify_file(path, crypto).status == TRUNCATED
+
+
+def test_tampered_index_is_corrupt(encrypted):
+    crypto, path = encrypted
+    data = bytearray(path.read_bytes())
+    index_offset, count, _ = struct.unpack(">QI4s", data[-16:])
+    # Shrink the plaintext length of chunk 0, which no tag covers
+    entry = index_offset
+    offset, plain_len = struct.unpack(">QI", data[entry:entry + 12])
+    data[entry:entry + 12] = struct.pack(">QI", offset, plain_len - 1)
+    path.write_bytes(bytes(data))
+    result = verify_file(path, crypto)
+    assert result.status == CORRUPT and "index" in result.error
+
+
+def test_other_files(tmp_path):
+    crypto = CryptoManager()
+    (tmp_path / "plain.txt").write_text("hello")
+    assert verify_file(tmp_path / "plain.txt", crypto).status == INVALID
+    assert verify_file(tmp_path / "missing.enc", crypto).status == UNREADABLE
+
+
+def test_verify_files_reports_every_file(encrypted, tmp_path):
+    crypto, path = encrypted
+    (tmp_path / "sub").mkdir()
+    bad = tmp_path / "sub" / "bad.enc"
+    bad.write_bytes(path.read_bytes()[:-1])
+    (tmp_path / "notes.txt").write_text("not encrypted, not selected")
+
+    seen = []
+    files = find_encrypted([tmp_path], recursive=True, extensions=[".enc"])
+    results, summary = verify_files(files, crypto, workers=2, on_result=seen.append)
+    assert [result.path for result in results] == sorted([str(path), str(bad)])
+    assert len(seen) == 2
+    assert summary.files == 1 and len(summary.errors) == 1
+
+    report = json.loads(json.dumps(build_report(results, summary)))
+    assert report["summary"]["files"] == 2
+    assert report["summary"][OK] == 1 and report["summary"][TRUNCATED] == 1
+    assert {entry["status"] for entry in report["files"]} == {OK, TRUNCATED}
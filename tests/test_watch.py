@@ -0,0 +1,104 @@
+import threading
+import time
+import pytest
+from pathlib import Path
+from encryptor.core.scanner import ScanFilter
+from encryptor.core.watch import Watcher
+
+
+def _copy(input_path, output_path, jobs):
+    Path(output_path).parent.mkdir(parents=True, exist_ok=True)
+    Path(output_path).write_bytes(Path(input_path).read_bytes())
+
+
+def _start(watcher, file_func=_copy):
+    results = {}
+    thread = threading.Thread(
+        target=lambda: results.setdefault('summary', watcher.run(file_func, workers=2))
+    )
+    thread.start()
+    return thread, results
+
+
+def _wait_for(condition, timeout=10.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "timed out"
+        time.sleep(0.05)
+
+
+def test_watch_encrypts_existing_and_new_files(tmp_path):
+    root = tmp_path / "in"
+    (root / "sub").mkdir(parents=True)
+    (root / "old.txt").write_text("old")
+    out = tmp_path / "out"
+    watcher = Watcher([root], out, recursive=True, settle=0.1, polling=True, poll_interval=0.1)
+    thread, results = _start(watcher)
+    try:
+        _wait_for((out / "in" / "old.txt.enc").exists)
+        (root / "sub" / "new.txt").write_text("new")
+        _wait_for((out / "in" / "sub" / "new.txt.enc").exists)
+    finally:
+        watcher.stop()
+        thread.join()
+
+    assert (out / "in" / "sub" / "new.txt.enc").read_text() == "new"
+    summary = results['summary']
+    assert summary.files == 2
+    assert summary.errors == []
+
+
+def test_watch_waits_for_files_to_settle(tmp_path):
+    root = tmp_path / "in"
+    root.mkdir()
+    seen = []
+
+    def record(input_path, output_path, jobs):
+        seen.append(Path(input_path).read_text())
+
+    watcher = Watcher([root], tmp_path / "out", settle=0.5, polling=True, poll_interval=0.05)
+    thread, _ = _start(watcher, record)
+    try:
+        path = root / "growing.txt"
+        for i in range(8):
+            with open(path, 'a') as f:
+                f.write(str(i))
+            time.sleep(0.1)
+        _wait_for(lambda: seen)
+        time.sleep(0.7)
+    finally:
+        watcher.stop()
+        thread.join()
+
+    assert seen == ["01234567"]
+
+
+def test_watch_ignores_output_and_filtered_files(tmp_path):
+    root = tmp_path / "in"
+    root.mkdir()
+    out = root / "encrypted"
+    watcher = Watcher([root], out, recursive=True, scan_filter=ScanFilter(['.txt']),
+                      settle=0.05, polling=True, poll_interval=0.05)
+    seen = []
+
+    def record(input_path, output_path, jobs):
+        seen.append(Path(input_path).name)
+        _copy(input_path, output_path, jobs)
+
+    thread, _ = _start(watcher, record)
+    try:
+        (root / "skip.bin").write_text("x")
+        (root / "a.txt").write_text("a")
+        _wait_for((out / "in" / "a.txt.enc").exists)
+        time.sleep(0.3)
+    finally:
+        watcher.stop()
+        thread.join()
+
+    # The output landed inside the root but was not picked up again
+    assert seen == ["a.txt"]
+
+
+def test_watch_rejects_missing_directory(tmp_path):
+    with pytest.raises(ValueError):
+        Watcher([tmp_path / "missing"], tmp_path / "out", polling=True)